@@ -0,0 +1 @@
+"""Data and rendering helpers used by the Aarekha Streamlit app."""
@@ -0,0 +1,187 @@
+"""Batch report generation: ``python -m aarekha.batch INPUT --out DIR``.
+
+INPUT is a directory of dataset files or a manifest (``.txt`` with one path
+per line, or ``.json`` holding a list of paths). Datasets are processed in
+parallel on a process pool, one output folder each (named after the file
+plus a short hash of its path). Inputs whose content and settings are
+unchanged since the last run are skipped, based on ``.batch_state.json`` in
+the output directory.
+"""
+import argparse
+import hashlib
+import json
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from multiprocessing import get_context
+
+from aarekha.ingest import content_hash
+
+EXTENSIONS = (".csv", ".csv.gz", ".csv.zst", ".xlsx", ".parquet", ".feather", ".arrow")
+# Plans the model did not (fully) produce; such reports are not kept as done
+DEGRADED_PLANS = ("fallback", "partial")
+STATE_FILE = ".batch_state.json"
+SUMMARY_FILE = "batch_summary.json"
+
+
+def discover(source):
+    """Dataset paths named by a directory or manifest, in a stable order."""
+    if os.path.isdir(source):
+        return sorted(
+            os.path.join(source, name) for name in os.listdir(source)
+            if name.lower().endswith(EXTENSIONS)
+        )
+    base = os.path.dirname(os.path.abspath(source))
+    with open(source) as f:
+        if source.lower().endswith(".json"):
+            paths = json.load(f)
+        else:
+            paths = [line.strip() for line in f if line.strip() and not line.startswith("#")]
+    return [p if os.path.isabs(p) else os.path.join(base, p) for p in paths]
+
+
+def output_dir(out_root, path):
+    """``<out_root>/<file stem>-<hash>``; the hash of the absolute path keeps
+    same-named files from different folders apart."""
+    name = os.path.basename(path)
+    stem = os.path.splitext(name)[0]
+    for suffix in sorted(EXTENSIONS, key=len, reverse=True):
+        if name.lower().endswith(suffix):
+            stem = name[:-len(suffix)]
+            break
+    digest = hashlib.blake2b(os.path.abspath(path).encode("utf-8"), digest_size=4).hexdigest()
+    return os.path.join(out_root, f"{stem}-{digest}")
+
+
+def _load_state(out_root):
+    try:
+        with open(os.path.join(out_root, STATE_FILE)) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def _save_state(out_root, state):
+    path = os.path.join(out_root, STATE_FILE)
+    with open(f"{path}.tmp", "w") as f:
+        json.dump(state, f, indent=2)
+    os.replace(f"{path}.tmp", path)
+
+
+def _fingerprint(path, previous):
+    """Size, mtime and content hash; the hash is only recomputed when size/mtime moved."""
+    st = os.stat(path)
+    if previous and previous.get("size") == st.st_size and previous.get("mtime_ns") == st.st_mtime_ns:
+        digest = previous["hash"]
+    else:
+        with open(path, "rb") as f:
+            digest = content_hash(f.read())
+    return {"size": st.st_size, "mtime_ns": st.st_mtime_ns, "hash": digest}
+
+
+def _worker_init(api_key):
+    import openai
+    openai.api_key = api_key
+
+
+def _run_one(path, out_dir, num_charts, regenerate_insights):
+    from aarekha.engine import run_report
+    return run_report(path, out_dir, num_charts, regenerate_insights)
+
+
+def run_batch(paths, out_root, num_charts=5, workers=None, force=False, regenerate_insights=False, log=print):
+    """Process ``paths`` and return the per-dataset summaries (skipped ones included)."""
+    os.makedirs(out_root, exist_ok=True)
+    state = _load_state(out_root)
+    settings = {"charts": num_charts, "regenerate_insights": regenerate_insights}
+    pending = {}
+    results = []
+    for path in paths:
+        abspath = os.path.abspath(path)
+        previous = state.get(abspath)
+        try:
+            fingerprint = _fingerprint(abspath, previous)
+        except OSError as e:
+            results.append({"dataset": path, "status": "error", "error": str(e)})
+            continue
+        unchanged = previous and previous["hash"] == fingerprint["hash"] and previous.get("settings") == settings
+        if unchanged and not force and os.path.exists(os.path.join(output_dir(out_root, path), "timing.json")):
+            previous.update(fingerprint)
+            results.append({"dataset": path, "status": "skipped"})
+            continue
+        pending[abspath] = dict(fingerprint, settings=settings)
+
+    log(f"{len(pending)} to process, {len(results)} skipped or unreadable")
+    started = time.perf_counter()
+    # spawn: kaleido and the LLM pool start threads/subprocesses that must not be forked
+    with ProcessPoolExecutor(
+        max_workers=workers or os.cpu_count(),
+        mp_context=get_context("spawn"),
+        initializer=_worker_init,
+        initargs=(os.environ.get("OPENAI_API_KEY"),),
+    ) as pool:
+        futures = {
+            pool.submit(_run_one, path, output_dir(out_root, path), num_charts, regenerate_insights): path
+            for path in pending
+        }
+        for future in as_completed(futures):
+            path = futures[future]
+            try:
+                summary = future.result()
+                if summary["plan_source"] in DEGRADED_PLANS:
+                    # Written, but left out of the state file so the next run retries it
+                    summary["status"] = "error"
+                    summary["error"] = summary["warnings"][0]
+                    state.pop(path, None)
+                    log(f"error {path}: {summary['error']}")
+                else:
+                    summary["status"] = "ok"
+                    state[path] = pending[path]
+                    log(f"ok    {path} ({summary['total_s']:.2f} s, {summary['charts']} charts)")
+            except Exception as e:
+                summary = {"dataset": path, "status": "error", "error": str(e)}
+                state.pop(path, None)
+                log(f"error {path}: {e}")
+            results.append(summary)
+            # Saved as datasets finish, so an interrupted run resumes where it stopped
+            _save_state(out_root, state)
+    _save_state(out_root, state)
+
+    elapsed = time.perf_counter() - started
+    aggregate = {
+        "processed": sum(r["status"] == "ok" for r in results),
+        "skipped": sum(r["status"] == "skipped" for r in results),
+        "failed": sum(r["status"] == "error" for r in results),
+        "wall_s": round(elapsed, 3),
+        "datasets": results,
+    }
+    with open(os.path.join(out_root, SUMMARY_FILE), "w") as f:
+        json.dump(aggregate, f, indent=2)
+    return aggregate
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m aarekha.batch", description="Generate Aarekha PPT/PDF reports for many datasets.")
+    parser.add_argument("source", help="directory of dataset files (csv, csv.gz, csv.zst, xlsx, parquet, feather, arrow), or a .txt/.json manifest of paths")
+    parser.add_argument("--out", required=True, help="output directory; one sub-folder per dataset")
+    parser.add_argument("--charts", type=int, default=5, help="charts per report (default: 5)")
+    parser.add_argument("--workers", type=int, default=None, help="worker processes (default: CPU count)")
+    parser.add_argument("--force", action="store_true", help="rebuild reports even for unchanged inputs")
+    parser.add_argument("--regenerate-insights", action="store_true", help="ask for a fresh insight per chart from the chart data")
+    args = parser.parse_args(argv)
+
+    if not os.environ.get("OPENAI_API_KEY"):
+        print("OPENAI_API_KEY is not set", file=sys.stderr)
+        return 2
+    paths = discover(args.source)
+    if not paths:
+        print(f"No datasets found in {args.source}", file=sys.stderr)
+        return 2
+    aggregate = run_batch(paths, args.out, args.charts, args.workers, args.force, args.regenerate_insights)
+    print(f"Done in {aggregate['wall_s']:.1f} s: {aggregate['processed']} processed, {aggregate['skipped']} skipped, {aggregate['failed']} failed")
+    return 1 if aggregate["failed"] else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,136 @@
+"""Cardinality-aware binning for count-based charts.
+
+High-cardinality columns are reduced before anything is counted or drawn:
+categoricals keep their most frequent values and fold the rest into an
+"Other" bucket, numeric and date columns are cut into adaptive bins on the
+server, and two-way counts are capped at ``MAX_PIVOT`` labels per axis and
+counted sparsely (as code pairs) before being laid out as a dense grid.
+Every function also takes per-row ``weights``, so already grouped rows (one
+per value or pair, weighted by their row count) bin like the raw rows.
+"""
+import os
+
+import numpy as np
+import pandas as pd
+
+from aarekha import lod
+
+# Labels kept per categorical axis or pie, including "Other".
+TOP_K = int(os.environ.get("AAREKHA_TOP_K", "20"))
+# Labels kept per axis of a heatmap or stacked-bar pivot.
+MAX_PIVOT = int(os.environ.get("AAREKHA_MAX_PIVOT", "50"))
+OTHER = "Other"
+
+
+def _factorize(series):
+    if isinstance(series.dtype, pd.CategoricalDtype):
+        return series.cat.codes.to_numpy(), series.cat.categories
+    codes, uniques = pd.factorize(series)
+    return codes, pd.Index(uniques)
+
+
+def _fmt(value, temporal):
+    if temporal:
+        return pd.Timestamp(value).strftime("%Y-%m-%d")
+    return f"{value:.4g}"
+
+
+def _weights(weights, valid):
+    return None if weights is None else np.asarray(weights, dtype="float64")[valid]
+
+
+def top_k_codes(series, k=TOP_K, weights=None):
+    """Return ``(codes, labels)`` keeping the ``k - 1`` most frequent values.
+
+    The remaining values share the last label, "Other". When at most ``k``
+    values occur, each keeps its own label, in sorted (or categorical)
+    order. Missing values get code -1.
+    """
+    codes, uniques = _factorize(series)
+    valid = codes >= 0
+    counts = np.bincount(codes[valid], weights=_weights(weights, valid), minlength=len(uniques))
+    present = np.flatnonzero(counts)
+    lookup = np.full(len(uniques) + 1, -1, dtype=np.int64)  # last slot: code -1
+    if len(present) <= k:
+        if not isinstance(series.dtype, pd.CategoricalDtype):
+            # pd.factorize numbers values in order of first appearance
+            try:
+                present = present[uniques[present].argsort()]
+            except TypeError:  # values of mixed types keep that order
+                pass
+        lookup[present] = np.arange(len(present))
+        return lookup[codes], list(uniques[present])
+    keep = np.argsort(-counts, kind="stable")[:k - 1]
+    lookup[present] = k - 1
+    lookup[keep] = np.arange(k - 1)
+    return lookup[codes], [str(v) for v in uniques[keep]] + [OTHER]
+
+
+def numeric_bin_codes(series, max_bins):
+    """Return ``(codes, labels)`` for adaptive equal-width bins of a numeric/date column."""
+    temporal = pd.api.types.is_datetime64_any_dtype(series)
+    floats = lod._as_float(series)
+    valid = ~np.isnan(floats)
+    codes = np.full(len(floats), -1, dtype=np.int64)
+    if not valid.any():
+        return codes, []
+    edges = np.histogram_bin_edges(floats[valid], bins="auto")
+    if len(edges) - 1 > max_bins:
+        edges = np.histogram_bin_edges(floats[valid], bins=max_bins)
+    codes[valid] = np.clip(np.searchsorted(edges, floats[valid], side="right") - 1, 0, len(edges) - 2)
+    labels = [f"{_fmt(lo, temporal)} – {_fmt(hi, temporal)}" for lo, hi in zip(edges[:-1], edges[1:])]
+    return codes, labels
+
+
+def bin_codes(series, limit, weights=None):
+    """Codes with at most ``limit`` labels: value bins for numbers/dates, top-K otherwise."""
+    continuous = (
+        (pd.api.types.is_numeric_dtype(series) and not pd.api.types.is_bool_dtype(series))
+        or pd.api.types.is_datetime64_any_dtype(series)
+    )
+    if continuous and series.nunique() > limit:
+        return numeric_bin_codes(series, limit)
+    return top_k_codes(series, limit, weights)
+
+
+def top_k_counts(counts, k=TOP_K):
+    """Collapse a value-counts Series (largest first) to ``k`` entries including "Other"."""
+    if len(counts) <= k:
+        return counts
+    head = counts.iloc[:k - 1]
+    head.index = head.index.astype(str)
+    return pd.concat([head, pd.Series([counts.iloc[k - 1:].sum()], index=[OTHER])]).rename(counts.name)
+
+
+def top_k_sum(df, x, y, k=TOP_K, weights=None):
+    """Sum of ``y`` (as :func:`aarekha.lod.value_column`) per (binned) ``x`` with at most ``k`` x labels."""
+    codes, labels = bin_codes(df[x], k, weights)
+    values = lod._as_float(df[y])
+    valid = (codes >= 0) & ~np.isnan(values)
+    sums = np.bincount(codes[valid], weights=values[valid], minlength=len(labels))
+    return pd.DataFrame({x: labels, lod.value_column(x, y): sums})
+
+
+def count_pairs(x_series, y_series, max_x=MAX_PIVOT, max_y=MAX_PIVOT, weights=None):
+    """Row counts per (x, y) label pair as a ``max_x`` x ``max_y`` (at most) frame.
+
+    Only the pairs that occur are counted, so the cost is independent of
+    the product of the two cardinalities.
+    """
+    x_codes, x_labels = bin_codes(x_series, max_x, weights)
+    y_codes, y_labels = bin_codes(y_series, max_y, weights)
+    valid = (x_codes >= 0) & (y_codes >= 0)
+    pairs = x_codes[valid] * len(y_labels) + y_codes[valid]
+    grid = np.zeros((len(x_labels), len(y_labels)), dtype=np.int64)
+    if weights is None:
+        found, counts = np.unique(pairs, return_counts=True)
+    else:
+        counts = np.bincount(pairs, weights=_weights(weights, valid), minlength=grid.size)
+        found = np.flatnonzero(counts)
+        counts = counts[found]
+    grid[found // len(y_labels), found % len(y_labels)] = counts
+    return pd.DataFrame(
+        grid,
+        index=pd.Index(x_labels, name=x_series.name),
+        columns=pd.Index(y_labels, name=y_series.name),
+    )
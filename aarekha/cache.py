@@ -0,0 +1,321 @@
+"""Process-wide in-memory cache shared by every session.
+
+The dataset, profile, filter-index, rollup, figure and image caches are
+named regions of one :class:`CacheManager`. Entries are keyed by content
+(dataset hash, figure spec, image hash), so sessions that load the same
+file share one copy. All regions count against one ``AAREKHA_CACHE_MB``
+budget and are evicted together in least-recently-used order. In regions
+created with ``spill=True``, a DataFrame is not dropped when it is evicted.
+It is written to an Arrow IPC file under ``CACHE_DIR/spill`` instead, and
+the next lookup memory-maps it back. Spill files are capped by
+``AAREKHA_SPILL_MB``. :func:`stats` reports hits, misses and resident and
+spilled bytes per region.
+
+This module must not import other ``aarekha`` modules: they all import it.
+"""
+import dataclasses
+import hashlib
+import os
+import sys
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+
+CACHE_DIR = os.environ.get("AAREKHA_CACHE_DIR", ".aarekha_cache")
+SPILL_DIR = os.path.join(CACHE_DIR, "spill")
+BUDGET_MB = float(os.environ.get("AAREKHA_CACHE_MB", "2048"))
+SPILL_MB = float(os.environ.get("AAREKHA_SPILL_MB", "8192"))
+_MAX_DEPTH = 6
+
+
+def estimate_size(value, _depth=0):
+    """Approximate resident bytes of a cached value."""
+    if isinstance(value, pd.DataFrame):
+        return int(value.memory_usage(index=True, deep=True).sum())
+    if isinstance(value, (pd.Series, pd.Index)):
+        return int(value.memory_usage(deep=True))
+    if isinstance(value, np.ndarray):
+        return int(value.nbytes)
+    if isinstance(value, (bytes, bytearray, str)):
+        return len(value)
+    if _depth >= _MAX_DEPTH:
+        return sys.getsizeof(value)
+    if hasattr(value, "to_plotly_json"):
+        return estimate_size(value.to_plotly_json(), _depth + 1)
+    if isinstance(value, dict):
+        return sys.getsizeof(value) + sum(estimate_size(k, _depth + 1) + estimate_size(v, _depth + 1) for k, v in value.items())
+    if isinstance(value, (list, tuple, set, frozenset)):
+        return sys.getsizeof(value) + sum(estimate_size(v, _depth + 1) for v in value)
+    if dataclasses.is_dataclass(value) and not isinstance(value, type):
+        return sys.getsizeof(value) + estimate_size(vars(value), _depth + 1)
+    return sys.getsizeof(value)
+
+
+def _write_arrow(df, path):
+    if os.path.exists(path):  # entries are keyed by content, so an earlier spill is still valid
+        return
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    table = pa.Table.from_pandas(df)
+    tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    with pa.OSFile(tmp_path, "wb") as sink, pa.ipc.new_file(sink, table.schema) as writer:
+        writer.write_table(table)
+    os.replace(tmp_path, path)
+
+
+def _read_arrow(path):
+    with pa.memory_map(path) as source:
+        return pa.ipc.open_file(source).read_all().to_pandas()
+
+
+@dataclass
+class _Entry:
+    value: object
+    size: int
+    spill: bool  # the region spills this entry instead of dropping it
+    path: str = None  # Arrow file once spilled, kept after a reload
+    spilled: bool = False
+
+
+@dataclass
+class RegionStats:
+    hits: int = 0
+    spill_hits: int = 0  # hits served from a spill file, also counted in hits
+    misses: int = 0
+    evictions: int = 0
+    spills: int = 0
+
+
+class Region:
+    """One named cache inside a :class:`CacheManager` with a dict-like API."""
+
+    def __init__(self, manager, name, spill=False):
+        self.manager = manager
+        self.name = name
+        self.spill = spill
+        self.counters = RegionStats()
+
+    def get(self, key, default=None):
+        return self.manager._get(self, key, default)
+
+    def put(self, key, value, size=None):
+        """Cache ``value``; ``size`` defaults to :func:`estimate_size`."""
+        self.manager._put(self, key, value, estimate_size(value) if size is None else size)
+
+    def resize(self, key, size):
+        """Re-charge an entry whose value grew or shrank in place."""
+        self.manager._resize(self, key, size)
+
+    def pop(self, key, default=None):
+        return self.manager._pop(self, key, default)
+
+    def clear(self):
+        self.manager._clear(self)
+
+    def __contains__(self, key):
+        return self.manager._contains(self, key)
+
+    def __len__(self):
+        return self.manager._count(self)
+
+
+class CacheManager:
+    """Least-recently-used entries of all regions within one memory budget."""
+
+    def __init__(self, budget_bytes, spill_dir=SPILL_DIR, spill_budget_bytes=None):
+        self.budget_bytes = budget_bytes
+        self.spill_dir = spill_dir
+        self.spill_budget_bytes = spill_budget_bytes if spill_budget_bytes is not None else 4 * budget_bytes
+        self.regions = {}
+        self._entries = OrderedDict()  # (region name, key) -> _Entry, oldest first
+        self._resident = 0
+        self._spilled = 0
+        self._lock = threading.RLock()
+
+    def region(self, name, spill=False):
+        """Return region ``name``, creating it on first use."""
+        with self._lock:
+            region = self.regions.get(name)
+            if region is None:
+                region = self.regions[name] = Region(self, name, spill)
+            return region
+
+    def _spill_path(self, region, key):
+        digest = hashlib.blake2b(repr(key).encode("utf-8"), digest_size=16).hexdigest()
+        return os.path.join(self.spill_dir, f"{region.name}-{digest}.arrow")
+
+    def _forget(self, full_key, entry):
+        # Caller holds the lock
+        del self._entries[full_key]
+        if entry.spilled:
+            self._spilled -= entry.size
+        else:
+            self._resident -= entry.size
+        # Reloaded entries keep their file for a cheap re-spill, so it goes here too
+        if entry.path:
+            try:
+                os.remove(entry.path)
+            except OSError:
+                pass
+
+    def _get(self, region, key, default):
+        full_key = (region.name, key)
+        with self._lock:
+            entry = self._entries.get(full_key)
+            if entry is None:
+                region.counters.misses += 1
+                return default
+            self._entries.move_to_end(full_key)
+            if entry.value is not None:
+                # Also covers an entry whose spill file is still being written
+                region.counters.hits += 1
+                return entry.value
+            path = entry.path
+        try:
+            value = _read_arrow(path)
+        except (OSError, pa.ArrowException):
+            with self._lock:
+                if self._entries.get(full_key) is entry:
+                    self._forget(full_key, entry)
+                region.counters.misses += 1
+            return default
+        with self._lock:
+            region.counters.hits += 1
+            region.counters.spill_hits += 1
+            if self._entries.get(full_key) is entry and entry.spilled:
+                entry.value, entry.spilled = value, False
+                self._spilled -= entry.size
+                self._resident += entry.size
+            victims = self._evict(keep=full_key)
+        self._write_spills(victims)
+        return value
+
+    def _put(self, region, key, value, size):
+        full_key = (region.name, key)
+        spill = region.spill and isinstance(value, pd.DataFrame)
+        with self._lock:
+            old = self._entries.get(full_key)
+            if old is not None:
+                self._forget(full_key, old)
+            self._entries[full_key] = _Entry(value, size, spill)
+            self._resident += size
+            victims = self._evict(keep=full_key)
+        self._write_spills(victims)
+
+    def _resize(self, region, key, size):
+        full_key = (region.name, key)
+        with self._lock:
+            entry = self._entries.get(full_key)
+            if entry is None or entry.spilled:
+                return
+            self._resident += size - entry.size
+            entry.size = size
+            victims = self._evict(keep=full_key)
+        self._write_spills(victims)
+
+    def _evict(self, keep):
+        """Drop or mark for spilling the oldest resident entries until within budget.
+
+        Returns the entries to spill; their files are written outside the lock.
+        """
+        victims = []
+        for full_key, entry in list(self._entries.items()):
+            if self._resident <= self.budget_bytes:
+                break
+            if full_key == keep or entry.spilled:
+                continue
+            region = self.regions[full_key[0]]
+            region.counters.evictions += 1
+            if entry.spill:
+                entry.spilled, entry.path = True, self._spill_path(region, full_key[1])
+                self._resident -= entry.size
+                self._spilled += entry.size
+                region.counters.spills += 1
+                victims.append((full_key, entry))
+            else:
+                self._forget(full_key, entry)
+        for full_key, entry in list(self._entries.items()):
+            if self._spilled <= self.spill_budget_bytes:
+                break
+            if entry.spilled:
+                self._forget(full_key, entry)
+        return victims
+
+    def _write_spills(self, victims):
+        for full_key, entry in victims:
+            try:
+                _write_arrow(entry.value, entry.path)
+            except (OSError, pa.ArrowException, TypeError, ValueError):
+                with self._lock:
+                    if self._entries.get(full_key) is entry and entry.spilled:
+                        entry.path = None
+                        self._forget(full_key, entry)
+                continue
+            with self._lock:
+                # Released only now, so lookups during the write still see the frame
+                if self._entries.get(full_key) is entry and entry.spilled:
+                    entry.value = None
+
+    def _pop(self, region, key, default):
+        full_key = (region.name, key)
+        with self._lock:
+            entry = self._entries.get(full_key)
+            if entry is None:
+                return default
+            self._forget(full_key, entry)
+        return entry.value if entry.value is not None else default
+
+    def _clear(self, region):
+        with self._lock:
+            for full_key, entry in list(self._entries.items()):
+                if full_key[0] == region.name:
+                    self._forget(full_key, entry)
+
+    def _contains(self, region, key):
+        with self._lock:
+            return (region.name, key) in self._entries
+
+    def _count(self, region):
+        with self._lock:
+            return sum(1 for name, _ in self._entries if name == region.name)
+
+    def stats(self):
+        """Budget, resident and spilled bytes, and per-region counters and hit rates."""
+        with self._lock:
+            regions = {}
+            for name, region in self.regions.items():
+                counters = dataclasses.asdict(region.counters)
+                lookups = counters["hits"] + counters["misses"]
+                regions[name] = dict(
+                    counters,
+                    hit_rate=round(counters["hits"] / lookups, 4) if lookups else None,
+                    entries=0, resident_bytes=0, spilled_entries=0, spilled_bytes=0,
+                )
+            for (name, _), entry in self._entries.items():
+                row = regions[name]
+                if entry.spilled:
+                    row["spilled_entries"] += 1
+                    row["spilled_bytes"] += entry.size
+                else:
+                    row["entries"] += 1
+                    row["resident_bytes"] += entry.size
+            return {
+                "budget_bytes": self.budget_bytes,
+                "resident_bytes": self._resident,
+                "spilled_bytes": self._spilled,
+                "regions": regions,
+            }
+
+
+manager = CacheManager(int(BUDGET_MB * 1024 * 1024), SPILL_DIR, int(SPILL_MB * 1024 * 1024))
+
+
+def region(name, spill=False):
+    return manager.region(name, spill)
+
+
+def stats():
+    return manager.stats()
@@ -0,0 +1,364 @@
+"""Chart specs, the chart-type registry and the figure cache.
+
+A :class:`ChartSpec` captures everything a figure depends on, so it doubles
+as the key of the shared figure cache: on a rerun only charts whose spec
+changed are rebuilt. Each chart type is a builder function registered
+with :func:`register`; adding a type needs no changes elsewhere. A type may
+also register a :func:`register_query` counterpart that aggregates in the
+optional DuckDB backend instead of pandas.
+"""
+import dataclasses
+from dataclasses import dataclass
+
+import plotly.express as px
+import plotly.graph_objects as go
+
+from aarekha import binning, cache, duckdb_backend, lod, telemetry, timeseries
+
+DEFAULT_COLOR = "#1f77b4"
+
+_figures = cache.region("figures")
+
+
+@dataclass(frozen=True)
+class ChartSpec:
+    chart_type: str
+    x: str
+    y: str = None
+    color: str = DEFAULT_COLOR
+    mask_id: frozenset = frozenset()  # see FilterEngine.selection_id
+    version: str = None  # dataset content hash
+
+    @property
+    def columns(self):
+        return [self.x] + ([self.y] if self.y else [])
+
+
+@dataclass(frozen=True)
+class ChartType:
+    name: str
+    build: object
+    numeric_y: bool = False  # non-numeric y falls back to a count bar
+    uses_y: bool = True
+    query: object = None  # DuckDB counterpart of build, see register_query
+
+
+_registry = {}
+
+
+def register(name, numeric_y=False, uses_y=True):
+    """Decorator registering ``build(spec, df, dataset, mask) -> figure`` as a chart type.
+
+    ``df`` holds the filtered spec columns and ``mask`` the row mask it was
+    taken with, for builders that aggregate straight from the filter codes.
+    """
+    def decorator(build):
+        _registry[name] = ChartType(name, build, numeric_y, uses_y)
+        return build
+    return decorator
+
+
+def register_query(name):
+    """Decorator adding ``query(spec, table, dataset) -> figure`` to a registered chart type.
+
+    ``table`` is the dataset's :class:`aarekha.duckdb_backend.Table`; the
+    filters to apply are ``spec.mask_id``.
+    """
+    def decorator(query):
+        _registry[name] = dataclasses.replace(_registry[name], query=query)
+        return query
+    return decorator
+
+
+def chart_types():
+    return list(_registry)
+
+
+def get_type(name):
+    return _registry[name]
+
+
+def _count_figure(spec, count_df):
+    return px.bar(count_df, x=spec.x, y='Order Count', color_discrete_sequence=[spec.color], hover_data=[spec.x, 'Order Count'])
+
+
+def count_bar(spec, df):
+    return _count_figure(spec, df.groupby(spec.x, observed=True).size().reset_index(name='Order Count'))
+
+
+def _numeric_y(spec, dataset):
+    return spec.y is not None and spec.y in dataset.profile.numeric_columns
+
+
+def _value(spec, frame):
+    # Reduced frames hold y apart from x when both are the same column
+    value = lod.value_column(spec.x, spec.y)
+    return value if value in frame.columns else spec.y
+
+
+def _series_figure(plot, spec, series_df):
+    value = _value(spec, series_df)
+    return plot(series_df, x=spec.x, y=value, labels={value: spec.y}, color_discrete_sequence=[spec.color], hover_data=[spec.x, value])
+
+
+def _bar_figure(spec, bar_df):
+    return _series_figure(px.bar, spec, bar_df)
+
+
+def _period_figure(plot, spec, series_df, granularity, how):
+    label = f"{spec.y} ({'average' if how == 'mean' else 'total'} per {granularity})"
+    return plot(series_df, x=spec.x, y=spec.y, labels={spec.y: label}, color_discrete_sequence=[spec.color], hover_data=[spec.x, spec.y])
+
+
+def _density_figure(spec, x_bins, y_bins, counts):
+    fig = go.Figure(go.Heatmap(x=x_bins, y=y_bins, z=counts, colorscale=[[0, "#ffffff"], [1, spec.color]], colorbar=dict(title="Rows")))
+    fig.update_layout(xaxis_title=spec.x, yaxis_title=spec.y)
+    return fig
+
+
+def _points_figure(spec, points, size=None):
+    return px.scatter(points, x=spec.x, y=spec.y, size=size, color_discrete_sequence=[spec.color], hover_data=[spec.x, spec.y], render_mode=lod.render_mode(len(points)))
+
+
+def _pie_figure(spec, counts):
+    # The largest slices are kept and the long tail is one "Other" slice
+    pie_data = binning.top_k_counts(counts).reset_index()
+    pie_data.columns = [spec.x, 'count']
+    return px.pie(pie_data, names=spec.x, values='count', color_discrete_sequence=px.colors.qualitative.Set3, hover_data=[spec.x, 'count'])
+
+
+def _top_values_figure(spec, counts):
+    counts = binning.top_k_counts(counts)
+    return px.bar(x=counts.index, y=counts.to_numpy(), labels={"x": spec.x, "y": "count"}, color_discrete_sequence=[spec.color])
+
+
+def _histogram_figure(spec, hist_df, bin_width):
+    fig = px.bar(hist_df, x=spec.x, y='count', color_discrete_sequence=[spec.color], hover_data=[spec.x, 'count'])
+    if bin_width:
+        fig.update_traces(width=bin_width)
+    fig.update_layout(bargap=0)
+    return fig
+
+
+def _heatmap_figure(pivot):
+    return px.imshow(pivot, color_continuous_scale='Viridis', aspect="auto")
+
+
+def _box_figure(spec, box_df):
+    x, y = spec.x, spec.y
+    fig = go.Figure(go.Box(
+        x=box_df[x], q1=box_df["q1"], median=box_df["median"], q3=box_df["q3"],
+        mean=box_df["mean"], lowerfence=box_df["lowerfence"], upperfence=box_df["upperfence"],
+        marker_color=spec.color, name=y
+    ))
+    fig.update_layout(xaxis_title=x, yaxis_title=y)
+    return fig
+
+
+def _stacked_sum_figure(spec, stack_df):
+    value = _value(spec, stack_df)
+    return px.bar(stack_df, x=spec.x, y=value, labels={value: spec.y}, color=spec.x, barmode='stack', color_discrete_sequence=px.colors.qualitative.Pastel, hover_data=[spec.x, value])
+
+
+def _stacked_count_figure(spec, count_df):
+    count_df.columns = count_df.columns.astype(str)
+    count_df = count_df.reset_index()
+    return px.bar(count_df, x=spec.x, y=list(count_df.columns[1:]), barmode='stack', color_discrete_sequence=px.colors.qualitative.Pastel, hover_data=[spec.x])
+
+
+@register("Bar")
+def bar(spec, df, dataset, mask):
+    if not _numeric_y(spec, dataset):
+        return count_bar(spec, df)
+    # Above the point budget, charts are reduced on the server before Plotly sees them
+    return _bar_figure(spec, lod.aggregate(df, spec.x, spec.y) if lod.needs_reduction(df) else df)
+
+
+@register("Line", numeric_y=True)
+def line(spec, df, dataset, mask):
+    if dataset.profile[spec.x].is_temporal:
+        # Drawn from the cached per-period rollups rather than the filtered rows
+        series_df, granularity = timeseries.series(dataset, mask, spec.mask_id, spec.x, spec.y, "mean")
+        return _period_figure(px.line, spec, series_df, granularity, "mean")
+    return _series_figure(px.line, spec, lod.series_points(df, spec.x, spec.y, how="mean"))
+
+
+@register("Scatter", numeric_y=True)
+def scatter(spec, df, dataset, mask):
+    x_profile = dataset.profile[spec.x]
+    if lod.needs_reduction(df) and (x_profile.is_numeric or x_profile.is_temporal):
+        return _density_figure(spec, *lod.density_grid(df, spec.x, spec.y))
+    return _points_figure(spec, lod.sample_rows(df))
+
+
+@register("Pie", uses_y=False)
+def pie(spec, df, dataset, mask):
+    return _pie_figure(spec, dataset.filters.value_counts(spec.x, mask))
+
+
+@register("Histogram", uses_y=False)
+def histogram(spec, df, dataset, mask):
+    x = spec.x
+    x_profile = dataset.profile[x]
+    if not (x_profile.is_numeric or x_profile.is_temporal):
+        return _top_values_figure(spec, dataset.filters.value_counts(x, mask))
+    if not lod.needs_reduction(df):
+        return px.histogram(df, x=x, color_discrete_sequence=[spec.color], hover_data=[x])
+    return _histogram_figure(spec, *lod.histogram_counts(df[x]))
+
+
+@register("Heatmap")
+def heatmap(spec, df, dataset, mask):
+    if not spec.y:
+        return count_bar(spec, df)
+    # Both axes are capped (top-K / value bins) and only occurring pairs are counted
+    return _heatmap_figure(binning.count_pairs(df[spec.x], df[spec.y]))
+
+
+@register("Box", numeric_y=True)
+def box(spec, df, dataset, mask):
+    if not lod.needs_reduction(df):
+        return px.box(df, x=spec.x, y=spec.y, color_discrete_sequence=[spec.color], hover_data=[spec.x, spec.y])
+    return _box_figure(spec, lod.box_stats(df, spec.x, spec.y))
+
+
+@register("Area", numeric_y=True)
+def area(spec, df, dataset, mask):
+    if dataset.profile[spec.x].is_temporal:
+        series_df, granularity = timeseries.series(dataset, mask, spec.mask_id, spec.x, spec.y, "sum")
+        return _period_figure(px.area, spec, series_df, granularity, "sum")
+    area_df = lod.series_points(df, spec.x, spec.y) if lod.needs_reduction(df) else df
+    return _series_figure(px.area, spec, area_df)
+
+
+@register("Bubble", numeric_y=True)
+def bubble(spec, df, dataset, mask):
+    return _points_figure(spec, lod.sample_rows(df), size=spec.y)
+
+
+@register("Stacked Bar")
+def stacked_bar(spec, df, dataset, mask):
+    x, y = spec.x, spec.y
+    if _numeric_y(spec, dataset):
+        # One series per x value, so x is limited to the top values plus "Other"
+        return _stacked_sum_figure(spec, binning.top_k_sum(df, x, y))
+    # One series per y value: y gets the top-K cap, x the pivot cap
+    return _stacked_count_figure(spec, binning.count_pairs(df[x], df[y], max_y=binning.TOP_K))
+
+
+# DuckDB counterparts: the same figures, grouped in SQL. Row-level charts
+# (points, small boxes) draw a reservoir sample of at most lod.MAX_POINTS rows.
+
+def _count_query(spec, table):
+    return _count_figure(spec, table.aggregate(spec.x, 'Order Count', "count", spec.mask_id))
+
+
+@register_query("Bar")
+def bar_query(spec, table, dataset):
+    if not _numeric_y(spec, dataset):
+        return _count_query(spec, table)
+    return _bar_figure(spec, table.aggregate(spec.x, spec.y, "sum", spec.mask_id))
+
+
+@register_query("Line")
+def line_query(spec, table, dataset):
+    if dataset.profile[spec.x].is_temporal:
+        return _period_figure(px.line, spec, *table.periods(spec.x, spec.y, "mean", spec.mask_id), "mean")
+    value = lod.value_column(spec.x, spec.y)
+    line_df = lod.lttb(table.aggregate(spec.x, spec.y, "mean", spec.mask_id), spec.x, value, lod.MAX_POINTS)
+    return _series_figure(px.line, spec, line_df)
+
+
+@register_query("Scatter")
+def scatter_query(spec, table, dataset):
+    x_profile = dataset.profile[spec.x]
+    if (x_profile.is_numeric or x_profile.is_temporal) and table.count(spec.mask_id) > lod.MAX_POINTS:
+        return _density_figure(spec, *table.density_grid(spec.x, spec.y, spec.mask_id, lod.MAX_POINTS))
+    return _points_figure(spec, table.sample(spec.columns, lod.MAX_POINTS, spec.mask_id))
+
+
+@register_query("Pie")
+def pie_query(spec, table, dataset):
+    return _pie_figure(spec, table.value_counts(spec.x, spec.mask_id))
+
+
+@register_query("Histogram")
+def histogram_query(spec, table, dataset):
+    x_profile = dataset.profile[spec.x]
+    if not (x_profile.is_numeric or x_profile.is_temporal):
+        return _top_values_figure(spec, table.value_counts(spec.x, spec.mask_id))
+    return _histogram_figure(spec, *table.histogram(spec.x, spec.mask_id, lod.MAX_HISTOGRAM_BINS))
+
+
+@register_query("Heatmap")
+def heatmap_query(spec, table, dataset):
+    if not spec.y:
+        return _count_query(spec, table)
+    x_values, y_values, rows = table.pair_counts(spec.x, spec.y, spec.mask_id)
+    return _heatmap_figure(binning.count_pairs(x_values, y_values, weights=rows))
+
+
+@register_query("Box")
+def box_query(spec, table, dataset):
+    if table.count(spec.mask_id) <= lod.MAX_POINTS:
+        rows = table.sample(spec.columns, lod.MAX_POINTS, spec.mask_id)
+        return px.box(rows, x=spec.x, y=spec.y, color_discrete_sequence=[spec.color], hover_data=[spec.x, spec.y])
+    return _box_figure(spec, table.box_stats(spec.x, spec.y, spec.mask_id))
+
+
+@register_query("Area")
+def area_query(spec, table, dataset):
+    if dataset.profile[spec.x].is_temporal:
+        return _period_figure(px.area, spec, *table.periods(spec.x, spec.y, "sum", spec.mask_id), "sum")
+    value = lod.value_column(spec.x, spec.y)
+    area_df = lod.lttb(table.aggregate(spec.x, spec.y, "sum", spec.mask_id), spec.x, value, lod.MAX_POINTS)
+    return _series_figure(px.area, spec, area_df)
+
+
+@register_query("Bubble")
+def bubble_query(spec, table, dataset):
+    return _points_figure(spec, table.sample(spec.columns, lod.MAX_POINTS, spec.mask_id), size=spec.y)
+
+
+@register_query("Stacked Bar")
+def stacked_bar_query(spec, table, dataset):
+    if _numeric_y(spec, dataset):
+        stack_df = table.aggregate(spec.x, spec.y, "sum", spec.mask_id)
+        value = lod.value_column(spec.x, spec.y)
+        return _stacked_sum_figure(spec, binning.top_k_sum(stack_df, spec.x, value, weights=stack_df["rows"]))
+    x_values, y_values, rows = table.pair_counts(spec.x, spec.y, spec.mask_id)
+    return _stacked_count_figure(spec, binning.count_pairs(x_values, y_values, max_y=binning.TOP_K, weights=rows))
+
+
+def build_figure(spec, dataset, mask=None, df=None):
+    """Return ``(fig, warning)``; ``warning`` is set when a fallback was used.
+
+    With the DuckDB backend enabled, chart types with a query counterpart
+    are grouped there and ``mask`` and ``df`` are not used.
+    """
+    chart = get_type(spec.chart_type)
+    fallback = chart.numeric_y and not _numeric_y(spec, dataset)
+    warning = f"Y-axis '{spec.y}' is not numeric. Using bar chart instead." if fallback else None
+    if duckdb_backend.ENABLED and chart.query is not None:
+        table = duckdb_backend.table_for(dataset)
+        with telemetry.span("figure.build", chart_type=spec.chart_type, backend="duckdb"):
+            return (_count_query(spec, table) if fallback else chart.query(spec, table, dataset)), warning
+    if df is None:
+        df = dataset.filters.apply(mask, spec.columns)
+    with telemetry.span("figure.build", chart_type=spec.chart_type, rows=len(df)):
+        return (count_bar(spec, df) if fallback else chart.build(spec, df, dataset, mask)), warning
+
+
+def get_figure(spec, dataset, mask=None, df=None):
+    """:func:`build_figure` through the figure cache.
+
+    Cached figures are shared between reruns and sessions; callers must not
+    mutate them.
+    """
+    cached = _figures.get(spec)
+    if cached is not None:
+        telemetry.event("figure.cache_hit", chart_type=spec.chart_type)
+        return cached
+    cached = build_figure(spec, dataset, mask, df)
+    _figures.put(spec, cached)
+    return cached
@@ -0,0 +1,277 @@
+"""Optional DuckDB execution backend for chart filtering and aggregation.
+
+With ``AAREKHA_BACKEND=duckdb`` (and the ``duckdb`` package installed) each
+dataset is registered as a view in one in-process DuckDB database, over the
+cached Parquet file when there is one. A chart's filter selection becomes a
+WHERE clause and the grouping behind its chart type runs as a query: DuckDB
+streams the scan, spills to ``CACHE_DIR/duckdb`` above
+``AAREKHA_DUCKDB_MEMORY``, and only the grouped rows come back as a pandas
+frame. Without the variable the pandas path is used.
+"""
+import math
+import os
+import threading
+from collections import OrderedDict
+
+import numpy as np
+import pandas as pd
+import pyarrow.parquet as pq
+
+try:
+    import duckdb
+except ImportError:  # optional dependency
+    duckdb = None
+
+from aarekha import lod, telemetry, timeseries
+from aarekha.filters import DateRange
+from aarekha.ingest import CACHE_DIR
+
+ENABLED = duckdb is not None and os.environ.get("AAREKHA_BACKEND", "pandas") == "duckdb"
+MEMORY_LIMIT = os.environ.get("AAREKHA_DUCKDB_MEMORY", "1GB")
+SPILL_DIR = os.path.join(CACHE_DIR, "duckdb")
+_TABLE_SLOTS = 16
+
+_con = None
+_tables = OrderedDict()
+_lock = threading.Lock()
+
+
+def quote(name):
+    return '"' + str(name).replace('"', '""') + '"'
+
+
+def _connect():
+    global _con
+    if _con is None:
+        os.makedirs(SPILL_DIR, exist_ok=True)
+        _con = duckdb.connect(config={"memory_limit": MEMORY_LIMIT, "temp_directory": SPILL_DIR})
+    return _con
+
+
+class Table:
+    """A dataset registered in DuckDB.
+
+    Query methods take ``selection``, a ``FilterEngine.selection_id``, and
+    return small pandas frames.
+    """
+
+    def __init__(self, con, name, profile):
+        self.con = con
+        self.name = name
+        self.profile = profile
+
+    def _execute(self, sql, params):
+        # Each query gets its own cursor so pool threads can run them concurrently
+        cursor = self.con.cursor()
+        try:
+            with telemetry.span("duckdb.query"):
+                return cursor.execute(sql, params).df()
+        finally:
+            cursor.close()
+
+    def _where(self, selection, *extra):
+        clauses, params = [], []
+        for col, values in selection:
+            column = quote(col)
+            if isinstance(values, DateRange):
+                if values.start is not None:
+                    clauses.append(f"{column} >= ?")
+                    params.append(values.start.to_pydatetime())
+                if values.stop is not None:
+                    clauses.append(f"{column} < ?")
+                    params.append(values.stop.to_pydatetime())
+            elif values:
+                values = list(values)
+                clauses.append(f"{column} IN ({', '.join('?' * len(values))})")
+                params.extend(values)
+            else:
+                clauses.append("FALSE")
+        clauses.extend(extra)
+        return (" WHERE " + " AND ".join(clauses) if clauses else ""), params
+
+    def _not_null(self, *columns):
+        return [f"{quote(col)} IS NOT NULL" for col in columns]
+
+    def _numeric(self, col):
+        # Dates are measured in nanoseconds, as in lod._as_float
+        if self.profile[col].is_temporal:
+            return f"epoch_ns({quote(col)})::DOUBLE"
+        return f"{quote(col)}::DOUBLE"
+
+    def count(self, selection):
+        where, params = self._where(selection)
+        return int(self._execute(f"SELECT count(*) AS n FROM {self.name}{where}", params)["n"].iloc[0])
+
+    def value_counts(self, col, selection):
+        """Rows per value of ``col``, largest first (as ``FilterEngine.value_counts``)."""
+        where, params = self._where(selection, *self._not_null(col))
+        found = self._execute(
+            f"SELECT {quote(col)} AS value, count(*) AS n FROM {self.name}{where} GROUP BY 1 ORDER BY 2 DESC, 1",
+            params,
+        )
+        return pd.Series(found["n"].to_numpy(), index=pd.Index(found["value"], name=col), name="count")
+
+    def aggregate(self, x, y, how, selection):
+        """``{x, y, "rows"}`` per x value ordered by x; ``how`` is "sum", "mean" or "count" (y is then the row count).
+
+        y is named as :func:`aarekha.lod.value_column`.
+        """
+        value = "count(*)" if how == "count" else f"{'avg' if how == 'mean' else 'sum'}({quote(y)})"
+        where, params = self._where(selection, *self._not_null(x))
+        found = self._execute(
+            f"SELECT {quote(x)} AS x, {value} AS y, count(*) AS n FROM {self.name}{where} GROUP BY 1 ORDER BY 1",
+            params,
+        )
+        return pd.DataFrame({x: found["x"], lod.value_column(x, y): found["y"], "rows": found["n"]})
+
+    def pair_counts(self, x, y, selection):
+        """``(x values, y values, row counts)`` for every (x, y) pair that occurs, ordered by x then y."""
+        where, params = self._where(selection, *self._not_null(x, y))
+        found = self._execute(
+            f"SELECT {quote(x)} AS x, {quote(y)} AS y, count(*) AS n FROM {self.name}{where} GROUP BY 1, 2 ORDER BY 1, 2",
+            params,
+        )
+        return found["x"].rename(x), found["y"].rename(y), found["n"].to_numpy()
+
+    def periods(self, x, y, how, selection, budget=timeseries.POINT_BUDGET):
+        """Return ``(frame, granularity)`` like :func:`aarekha.timeseries.series`."""
+        column = quote(x)
+        where, params = self._where(selection, *self._not_null(x, y))
+        names = list(timeseries.GRANULARITIES)
+        distinct = ", ".join(f"count(DISTINCT date_trunc('{name}', {column})) AS {name}" for name in names)
+        sizes = self._execute(f"SELECT {distinct} FROM {self.name}{where}", params).iloc[0]
+        granularity = next((name for name in names if sizes[name] <= budget), names[-1])
+        agg = "avg" if how == "mean" else "sum"
+        found = self._execute(
+            f"SELECT date_trunc('{granularity}', {column}) AS x, {agg}({quote(y)}) AS y"
+            f" FROM {self.name}{where} GROUP BY 1 ORDER BY 1",
+            params,
+        )
+        return pd.DataFrame({x: pd.to_datetime(found["x"]), y: found["y"]}), granularity
+
+    def _bins(self, col, selection, bins):
+        """``(lo, width, bins, where, params)`` for equal-width bins over a numeric/date column."""
+        where, params = self._where(selection, *self._not_null(col))
+        value = self._numeric(col)
+        lo, hi, n = self._execute(
+            f"SELECT min({value}) AS lo, max({value}) AS hi, count(*) AS n FROM {self.name}{where}", params
+        ).iloc[0]
+        if not n:
+            return None
+        bins = bins(n) if callable(bins) else bins
+        lo = float(lo)
+        width = float(hi - lo) / bins or 1.0
+        return lo, width, bins, where, params
+
+    def _bin_expr(self, col, lo, width, bins):
+        return f"least(floor(({self._numeric(col)} - {lo!r}) / {width!r})::BIGINT, {bins - 1})"
+
+    def histogram(self, col, selection, max_bins):
+        """Counts per equal-width bin, as :func:`aarekha.lod.histogram_counts` (Sturges' bin count)."""
+        binned = self._bins(col, selection, lambda n: max(1, min(max_bins, math.ceil(math.log2(n)) + 1)))
+        if binned is None:
+            return pd.DataFrame({col: [], "count": []}), None
+        lo, width, bins, where, params = binned
+        found = self._execute(
+            f"SELECT {self._bin_expr(col, lo, width, bins)} AS b, count(*) AS n FROM {self.name}{where} GROUP BY 1",
+            params,
+        )
+        counts = np.zeros(bins, dtype=np.int64)
+        counts[found["b"].to_numpy()] = found["n"].to_numpy()
+        centers = lo + (np.arange(bins) + 0.5) * width
+        if self.profile[col].is_temporal:
+            # Plotly date axes use milliseconds
+            return pd.DataFrame({col: pd.to_datetime(centers.astype("int64")), "count": counts}), width / 1e6
+        return pd.DataFrame({col: centers, "count": counts}), width
+
+    def density_grid(self, x, y, selection, max_points):
+        """``(x_centers, y_centers, counts)`` as :func:`aarekha.lod.density_grid`."""
+        bins = max(int(np.sqrt(max_points)), 2)
+        x_bins = self._bins(x, selection, bins)
+        y_bins = self._bins(y, selection, bins)
+        if x_bins is None or y_bins is None:
+            return np.array([]), np.array([]), np.zeros((0, 0))
+        x_lo, x_width, _, _, _ = x_bins
+        y_lo, y_width, _, _, _ = y_bins
+        where, params = self._where(selection, *self._not_null(x, y))
+        found = self._execute(
+            f"SELECT {self._bin_expr(x, x_lo, x_width, bins)} AS bx, {self._bin_expr(y, y_lo, y_width, bins)} AS by,"
+            f" count(*) AS n FROM {self.name}{where} GROUP BY 1, 2",
+            params,
+        )
+        counts = np.zeros((bins, bins))
+        counts[found["by"].to_numpy(), found["bx"].to_numpy()] = found["n"].to_numpy()
+        x_centers = x_lo + (np.arange(bins) + 0.5) * x_width
+        y_centers = y_lo + (np.arange(bins) + 0.5) * y_width
+        if self.profile[x].is_temporal:
+            x_centers = pd.to_datetime(x_centers.astype("int64"))
+        return x_centers, y_centers, counts
+
+    def box_stats(self, x, y, selection):
+        """Per-group quartiles, mean and Tukey whiskers, as :func:`aarekha.lod.box_stats`."""
+        where, params = self._where(selection, *self._not_null(x, y))
+        found = self._execute(
+            f"""
+            WITH d AS (SELECT {quote(x)} AS x, {quote(y)}::DOUBLE AS y FROM {self.name}{where}),
+            s AS (
+                SELECT x, quantile_cont(y, 0.25) AS q1, quantile_cont(y, 0.5) AS "median",
+                       quantile_cont(y, 0.75) AS q3, avg(y) AS "mean"
+                FROM d GROUP BY x
+            )
+            SELECT s.x, s.q1, s."median", s.q3, s."mean",
+                   min(d.y) FILTER (WHERE d.y >= s.q1 - 1.5 * (s.q3 - s.q1)) AS lowerfence,
+                   max(d.y) FILTER (WHERE d.y <= s.q3 + 1.5 * (s.q3 - s.q1)) AS upperfence
+            FROM s JOIN d ON d.x = s.x
+            GROUP BY s.x, s.q1, s."median", s.q3, s."mean"
+            ORDER BY s.x
+            """,
+            params,
+        )
+        return found.rename(columns={"x": x})
+
+    def sample(self, columns, n, selection):
+        """Up to ``n`` surviving rows of ``columns`` (a repeatable reservoir sample)."""
+        where, params = self._where(selection)
+        select = ", ".join(quote(col) for col in dict.fromkeys(columns))
+        # The sample is taken over the filtered subquery; USING SAMPLE on the
+        # table itself would sample before the WHERE clause
+        return self._execute(
+            f"SELECT * FROM (SELECT {select} FROM {self.name}{where}) USING SAMPLE reservoir({int(n)} ROWS) REPEATABLE (0)",
+            params,
+        )
+
+
+def _parquet_path(dataset):
+    """Parquet file holding exactly ``dataset.df``: the dataset cache file, or a copy written once."""
+    columns = [str(c) for c in dataset.df.columns]
+    path = dataset.ingest.path
+    if path and os.path.exists(path) and pq.read_schema(path).names == columns:
+        return path
+    # Not (or not exactly) in the dataset cache, e.g. with an added count column
+    path = os.path.join(SPILL_DIR, f"{dataset.key}.parquet")
+    if not os.path.exists(path):
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        dataset.df.to_parquet(tmp_path, index=False)
+        os.replace(tmp_path, path)
+    return path
+
+
+def table_for(dataset):
+    """Return the DuckDB :class:`Table` of a dataset, registering it on first use."""
+    with _lock:
+        table = _tables.get(dataset.key)
+        if table is not None:
+            _tables.move_to_end(dataset.key)
+            return table
+        con = _connect()
+        name = quote(f"dataset_{dataset.key}")
+        with telemetry.span("duckdb.register", rows=len(dataset.df)):
+            # A view over the file, so queries stream it instead of holding a copy;
+            # views can't take parameters, so the path is inlined as a string literal
+            literal = "'" + _parquet_path(dataset).replace("'", "''") + "'"
+            con.execute(f"CREATE OR REPLACE VIEW {name} AS SELECT * FROM read_parquet({literal})")
+        table = _tables[dataset.key] = Table(con, name, dataset.profile)
+        while len(_tables) > _TABLE_SLOTS:
+            key, _ = _tables.popitem(last=False)
+            con.execute(f"DROP VIEW IF EXISTS {quote(f'dataset_{key}')}")
+        return table
@@ -0,0 +1,292 @@
+"""Headless report pipeline shared by the Streamlit app and the batch CLI.
+
+ingest -> chart plan -> figure build -> insight -> PNG/PPT/PDF export. Each
+stage is a plain function of a :class:`Dataset`, so the app can drive them
+one widget at a time while :func:`run_report` chains them for one file.
+"""
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+from dataclasses import dataclass
+
+import numpy as np
+import pandas as pd
+
+from aarekha import charts, duckdb_backend, export, llm_cache, llm_client, lod, prompts, telemetry
+from aarekha.filters import FilterEngine, get_engine
+from aarekha.ingest import IngestResult, content_hash, list_sheets, load_dataset, read_columns, representative_sample
+from aarekha.llm_client import MODEL
+from aarekha.profiling import DatasetProfile, build_profile, get_profile
+
+PLAN_TEMPERATURE = 0.4
+PLAN_MAX_TOKENS = 1500
+INSIGHT_TEMPERATURE = 0.3
+INSIGHT_MAX_TOKENS = 600
+_UPLOAD_SLOTS = 16
+
+_uploads = OrderedDict()
+_uploads_lock = threading.Lock()
+
+
+@dataclass
+class Dataset:
+    name: str
+    df: pd.DataFrame
+    ingest: IngestResult
+    profile: DatasetProfile
+    filters: FilterEngine
+
+    @property
+    def key(self):
+        return self.ingest.key
+
+
+def inspect_upload(name, data, sheet=None, digest=None):
+    """Return ``(sheet names or None, column names)`` without parsing any rows.
+
+    ``digest`` is the upload's :func:`~aarekha.ingest.content_hash`, computed
+    here when not given.
+    """
+    key = (digest or content_hash(data), sheet)
+    with _uploads_lock:
+        cached = _uploads.get(key)
+    if cached is None:
+        with telemetry.span("ingest.inspect"):
+            cached = (list_sheets(name, data), read_columns(name, data, sheet))
+        with _uploads_lock:
+            _uploads[key] = cached
+            while len(_uploads) > _UPLOAD_SLOTS:
+                _uploads.popitem(last=False)
+    return cached
+
+
+def open_dataset(name, data, sheet=None, columns=None, digest=None):
+    """Load uploaded bytes and build the profile and filter engine for them.
+
+    ``sheet``, ``columns`` and ``digest`` are passed to
+    :func:`aarekha.ingest.load_dataset`.
+    """
+    with telemetry.span("ingest", bytes=len(data)) as attrs:
+        df, ingest = load_dataset(name, data, sheet, columns, digest)
+        attrs.update(status=ingest.status, rows=ingest.rows)
+    # Datasets without numeric columns get a count column to chart against
+    if not any(pd.api.types.is_numeric_dtype(df[col]) for col in df.columns):
+        df['Order Count'] = 1
+    with telemetry.span("profile", columns=len(df.columns)):
+        profile = get_profile(df, ingest.key)
+    return Dataset(name, df, ingest, profile, get_engine(df, ingest.key))
+
+
+def open_path(path, sheet=None, columns=None):
+    with open(path, "rb") as f:
+        return open_dataset(os.path.basename(path), f.read(), sheet, columns)
+
+
+def plan_request(dataset, num_charts):
+    """Return ``(messages, cache key)`` for the chart-plan prompt."""
+    profile = dataset.profile
+    # Compact, token-budgeted summary instead of raw CSV rows
+    descriptor = prompts.describe_dataset(profile, dataset.ingest.sample, total_rows=dataset.ingest.total_rows, stats=dataset.ingest.stats)
+    messages = prompts.plan_messages(descriptor, num_charts)
+    schema = [(col.name, col.dtype) for col in profile.columns.values()]
+    key = llm_cache.fingerprint(MODEL, prompts.PLAN_PROMPT_VERSION, schema, messages[0]["content"], descriptor)
+    return messages, key
+
+
+def stream_plans(messages, on_retry=None, on_skip=None, on_usage=None):
+    return llm_client.stream_json_array(
+        messages,
+        temperature=PLAN_TEMPERATURE,
+        max_tokens=PLAN_MAX_TOKENS,
+        on_retry=on_retry,
+        on_skip=on_skip,
+        label="chart_plan",
+        on_usage=on_usage
+    )
+
+
+def fallback_plans(dataset, num_charts, reason):
+    return [
+        {
+            "chart_type": "Bar",
+            "x": dataset.df.columns[0],
+            "y": "Order Count",
+            "insight": f"- **Key Observation:** Default chart generated.\n- **Business Impact:** Limited analysis due to {reason}.\n- **Recommended Action:** Try again later."
+        }
+    ] * num_charts
+
+
+def plan_charts(dataset, num_charts):
+    """Chart plans from the cache, or from the model (then cached).
+
+    Returns ``(plans, source, error)`` with ``source`` one of ``"cache"``,
+    ``"llm"``, ``"partial"`` (stream cut short) or ``"fallback"``; ``error``
+    is the exception text for the last two and None otherwise.
+    """
+    messages, key = plan_request(dataset, num_charts)
+    plans = llm_cache.get_plan(key, num_charts)
+    if plans:
+        return plans, "cache", None
+    plans = []
+    try:
+        for plan in stream_plans(messages):
+            plans.append(plan)
+    except Exception as e:
+        if not plans:
+            return fallback_plans(dataset, num_charts, "API error"), "fallback", str(e)
+        return plans, "partial", str(e)
+    llm_cache.put_plan(key, plans)
+    return plans, "llm", None
+
+
+def y_axis_options(dataset, chart_type):
+    if charts.get_type(chart_type).numeric_y:
+        return dataset.profile.numeric_columns
+    return dataset.profile.names  # Already deduplicated, in column order
+
+
+def resolve_plan(dataset, plan):
+    """Return ``(chart_type, x, y)`` for a plan, replacing unknown names with defaults.
+
+    ``y`` is ``None`` for chart types without a y axis.
+    """
+    columns = dataset.df.columns
+    chart_type = plan.get('chart_type') if plan.get('chart_type') in charts.chart_types() else "Bar"
+    x_axis = plan.get('x') if plan.get('x') in columns else columns[0]
+    if not charts.get_type(chart_type).uses_y:
+        return chart_type, x_axis, None
+    options = y_axis_options(dataset, chart_type)
+    y_axis = plan.get('y')
+    if y_axis not in options:
+        # Prefer a numeric column, and never the x column when there is another choice
+        numeric = [col for col in dataset.profile.numeric_columns if col in options]
+        others = [col for col in numeric + options if col != x_axis]
+        y_axis = others[0] if others else (options[0] if options else None)
+    return chart_type, x_axis, y_axis
+
+
+def chart_frame(dataset, mask, x_axis, y_axis):
+    """Up to ``lod.MAX_POINTS`` surviving rows of the charted columns (a uniform sample).
+
+    These rows only feed the data preview and the insight prompt. Figures
+    are built from all surviving rows (or grouped in DuckDB) by
+    :func:`aarekha.charts.build_figure`, and only on a figure-cache miss.
+    """
+    columns = [x_axis] + ([y_axis] if y_axis else [])
+    with telemetry.span("filter.materialize") as attrs:
+        rows = np.arange(len(dataset.df)) if mask is None else np.flatnonzero(mask)
+        if len(rows) > lod.MAX_POINTS:
+            rows = np.sort(np.random.default_rng(0).choice(rows, lod.MAX_POINTS, replace=False))
+        chart_df = dataset.df.iloc[rows, [dataset.df.columns.get_loc(c) for c in dict.fromkeys(columns)]]
+        attrs["rows"] = len(chart_df)
+    return chart_df
+
+
+def insight_request(chart_df, chart_type, x_axis, y_axis, total_rows=None):
+    """Return ``(cache key, kwargs for llm_client.complete)`` for one chart.
+
+    ``total_rows`` is the number of surviving rows ``chart_df`` was sampled from.
+    """
+    chart_profile = build_profile(chart_df, None)
+    descriptor = prompts.describe_dataset(chart_profile, representative_sample(chart_df, 10), prompts.INSIGHT_TOKEN_BUDGET, total_rows)
+    messages = prompts.insight_messages(chart_type, x_axis, y_axis, descriptor)
+    key = llm_cache.fingerprint(MODEL, prompts.INSIGHT_PROMPT_VERSION, messages)
+    request = dict(
+        messages=messages,
+        temperature=INSIGHT_TEMPERATURE,
+        max_tokens=INSIGHT_MAX_TOKENS,
+        parse=lambda raw: llm_client.parse_json(raw)["insight"],
+        label="insight"
+    )
+    return key, request
+
+
+@contextmanager
+def _timed(timings, stage):
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        timings[stage] = round(timings.get(stage, 0.0) + time.perf_counter() - started, 4)
+
+
+def run_report(path, out_dir, num_charts=5, regenerate_insights=False):
+    """Build the charts, PNGs, PPTX and PDF for one dataset file into ``out_dir``.
+
+    Writes ``timing.json`` with per-stage wall-clock seconds and returns the
+    same summary dict.
+    """
+    os.makedirs(out_dir, exist_ok=True)
+    timings = {}
+    started = time.perf_counter()
+
+    with _timed(timings, "ingest"):
+        dataset = open_path(path)
+    with _timed(timings, "plan"):
+        plans, plan_source, plan_error = plan_charts(dataset, num_charts)
+
+    figures = []
+    warnings = [f"Chart plan ({plan_source}): {plan_error}"] if plan_error else []
+    with _timed(timings, "figures"):
+        for idx, plan in enumerate(plans):
+            chart_type, x_axis, y_axis = resolve_plan(dataset, plan)
+            chart_df = chart_frame(dataset, None, x_axis, y_axis)
+            spec = charts.ChartSpec(chart_type, x_axis, y_axis, version=dataset.key)
+            try:
+                fig, warning = charts.build_figure(spec, dataset)
+            except Exception as e:
+                fig, warning = None, str(e)
+            if warning:
+                warnings.append(f"Chart {idx+1}: {warning}")
+            if fig is not None:
+                figures.append((idx, fig, chart_df, chart_type, x_axis, y_axis))
+
+    insights = {idx: plans[idx].get("insight", "") for idx, *_ in figures}
+    if regenerate_insights:
+        with _timed(timings, "insights"):
+            jobs = {}
+            keys = {}
+            for idx, _, chart_df, chart_type, x_axis, y_axis in figures:
+                keys[idx], request = insight_request(chart_df, chart_type, x_axis, y_axis, len(dataset.df))
+                cached = llm_cache.get_insight(keys[idx])
+                if cached is not None:
+                    insights[idx] = cached
+                else:
+                    jobs[idx] = request
+            for idx, insight, error in llm_client.run_all(jobs):
+                if error is not None:
+                    warnings.append(f"Chart {idx+1}: insight regeneration failed: {error}")
+                    continue
+                insights[idx] = insight
+                llm_cache.put_insight(keys[idx], insight)
+
+    with _timed(timings, "png"):
+        pages = []
+        for idx, fig, *_ in figures:
+            png = export.rasterize(fig)
+            with open(os.path.join(out_dir, f"chart_{idx+1}.png"), "wb") as f:
+                f.write(png)
+            pages.append((png, insights[idx]))
+    with _timed(timings, "ppt"):
+        with open(os.path.join(out_dir, "Aarekha_Charts_Report.pptx"), "wb") as f:
+            f.write(export.build_ppt(pages))
+    with _timed(timings, "pdf"):
+        with open(os.path.join(out_dir, "Aarekha_Charts_Report.pdf"), "wb") as f:
+            f.write(export.build_pdf(pages))
+
+    summary = {
+        "dataset": path,
+        "key": dataset.key,
+        "rows": dataset.ingest.total_rows,
+        "charts": len(figures),
+        "plan_source": plan_source,
+        "warnings": warnings,
+        "timings": timings,
+        "total_s": round(time.perf_counter() - started, 4),
+    }
+    with open(os.path.join(out_dir, "timing.json"), "w") as f:
+        json.dump(summary, f, indent=2)
+    return summary
@@ -0,0 +1,198 @@
+"""PNG rasterization cache and on-demand PPT/PDF report assembly.
+
+Figures are rasterized by kaleido on a single background worker (kaleido
+keeps its Chromium subprocess warm between calls) and the PNG bytes are
+cached by a hash of the figure spec, so only charts whose spec changed are
+re-rasterized. Reports are assembled from those cached PNGs only when
+requested, as tracked jobs that expose their progress.
+"""
+import hashlib
+import io
+import os
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+from pptx import Presentation
+from pptx.dml.color import RGBColor
+from pptx.util import Inches, Pt
+from reportlab.lib.pagesizes import letter
+from reportlab.lib.utils import ImageReader
+from reportlab.pdfgen import canvas
+
+from aarekha import cache, telemetry
+from aarekha.cache import CACHE_DIR
+
+IMAGE_DIR = os.path.join(CACHE_DIR, "images")
+_REPORT_SLOTS = 16
+
+_images = cache.region("images")
+_reports = OrderedDict()
+_lock = threading.Lock()
+# kaleido is not thread-safe; one worker also keeps a single warm browser.
+_raster_pool = ThreadPoolExecutor(max_workers=1, thread_name_prefix="aarekha-kaleido")
+_report_pool = ThreadPoolExecutor(max_workers=2, thread_name_prefix="aarekha-report")
+
+
+def figure_key(fig):
+    return hashlib.blake2b(fig.to_json().encode("utf-8"), digest_size=16).hexdigest()
+
+
+def cached_image(key):
+    png = _images.get(key)
+    if png is not None:
+        return png
+    path = os.path.join(IMAGE_DIR, f"{key}.png")
+    if os.path.exists(path):
+        with open(path, "rb") as f:
+            png = f.read()
+        _remember_image(key, png)
+        return png
+    return None
+
+
+def _remember_image(key, png):
+    _images.put(key, png)
+
+
+def _rasterize(key, fig):
+    png = cached_image(key)
+    if png is not None:
+        telemetry.event("png.cache_hit")
+        return png
+    with telemetry.span("png.rasterize"):
+        png = fig.to_image(format="png")
+    _remember_image(key, png)
+    try:
+        os.makedirs(IMAGE_DIR, exist_ok=True)
+        tmp_path = os.path.join(IMAGE_DIR, f"{key}.{os.getpid()}.tmp")
+        with open(tmp_path, "wb") as f:
+            f.write(png)
+        os.replace(tmp_path, os.path.join(IMAGE_DIR, f"{key}.png"))
+    except OSError:
+        pass
+    return png
+
+
+def rasterize_async(fig, key=None):
+    """Return ``(key, Future[png bytes])``; cached images resolve immediately."""
+    key = key or figure_key(fig)
+    return key, _raster_pool.submit(telemetry.bind(_rasterize), key, fig)
+
+
+def rasterize(fig):
+    return rasterize_async(fig)[1].result()
+
+
+def build_ppt(items):
+    """PPTX bytes with one slide per ``(png, insight)`` item."""
+    with telemetry.span("report.ppt", slides=len(items)):
+        return _build_ppt(items)
+
+
+def _build_ppt(items):
+    ppt = Presentation()
+    blank_slide_layout = ppt.slide_layouts[6]
+    for png, insight in items:
+        slide = ppt.slides.add_slide(blank_slide_layout)
+        slide.shapes.add_picture(io.BytesIO(png), Inches(1), Inches(0.5), height=Inches(4.5))
+        textbox = slide.shapes.add_textbox(Inches(0.5), Inches(5.2), Inches(8.5), Inches(2.5))
+        tf = textbox.text_frame
+        tf.word_wrap = True
+        run = tf.paragraphs[0].add_run()
+        run.text = insight
+        font = run.font
+        font.size = Pt(12)
+        font.name = 'Arial'
+        font.color.rgb = RGBColor(50, 50, 50)
+    buffer = io.BytesIO()
+    ppt.save(buffer)
+    return buffer.getvalue()
+
+
+def build_pdf(items):
+    """PDF bytes with one page per ``(png, insight)`` item."""
+    with telemetry.span("report.pdf", pages=len(items)):
+        return _build_pdf(items)
+
+
+def _build_pdf(items):
+    buffer = io.BytesIO()
+    c = canvas.Canvas(buffer, pagesize=letter)
+    for png, insight in items:
+        c.drawImage(ImageReader(io.BytesIO(png)), 50, 400, width=500, height=250)
+        c.setFont("Helvetica", 10)
+        c.drawString(50, 380, insight.replace("\n", " ")[:400])
+        c.showPage()
+    c.save()
+    return buffer.getvalue()
+
+
+class ReportJob:
+    """Background PPT + PDF assembly for a fixed list of charts."""
+
+    def __init__(self, key, items):
+        self.key = key
+        self.items = items  # [(image key, png future, insight), ...]
+        self.progress = 0.0
+        self.error = None
+        self.ppt = None
+        self.pdf = None
+        self._future = None
+
+    @property
+    def done(self):
+        return self._future is not None and self._future.done()
+
+    def _run(self):
+        try:
+            pages = []
+            for i, (_, future, insight) in enumerate(self.items):
+                pages.append((future.result(), insight))
+                self.progress = 0.6 * (i + 1) / len(self.items)
+            self.ppt = build_ppt(pages)
+            self.progress = 0.8
+            self.pdf = build_pdf(pages)
+            self.progress = 1.0
+        except Exception as e:
+            self.error = e
+
+    def start(self):
+        self._future = _report_pool.submit(telemetry.bind(self._run))
+        return self
+
+    def wait(self, timeout=None):
+        self._future.result(timeout)
+        return self
+
+
+def report_key(items):
+    digest = hashlib.blake2b(digest_size=16)
+    for image_key, _, insight in items:
+        digest.update(image_key.encode("utf-8"))
+        digest.update(insight.encode("utf-8"))
+    return digest.hexdigest()
+
+
+def get_report(key):
+    with _lock:
+        return _reports.get(key)
+
+
+def start_report(items):
+    """Return the job for these charts, starting it unless one already exists.
+
+    ``items`` is ``[(image key, png future, insight), ...]``. Failed jobs are
+    restarted; finished ones are reused across reruns and sessions.
+    """
+    key = report_key(items)
+    with _lock:
+        job = _reports.get(key)
+        if job is not None and job.error is None:
+            _reports.move_to_end(key)
+            return job
+        job = ReportJob(key, items)
+        _reports[key] = job
+        while len(_reports) > _REPORT_SLOTS:
+            _reports.popitem(last=False)
+    return job.start()
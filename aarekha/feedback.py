@@ -0,0 +1,240 @@
+"""Buffered feedback delivery.
+
+Form submissions are written to a local SQLite queue and return at once. A
+background worker flushes the queue in batches with ``append_rows`` and
+retries with jittered exponential backoff, so a slow or rate-limiting sheet
+neither blocks the form nor loses feedback. The destination is any object
+with ``append_rows(rows)``: :class:`GSheetSink` in production,
+:class:`FakeSheet` or :class:`CsvSheet` for offline runs
+(``AAREKHA_FEEDBACK_SINK=fake`` or ``csv:/path/to/file.csv``).
+"""
+import csv
+import json
+import os
+import random
+import sqlite3
+import threading
+import time
+
+from aarekha import telemetry
+from aarekha.ingest import CACHE_DIR
+
+QUEUE_PATH = os.path.join(CACHE_DIR, "feedback_queue.sqlite")
+SPREADSHEET = "Aarekha Feedback"
+SCOPES = ["https://spreadsheets.google.com/feeds", "https://www.googleapis.com/auth/drive"]
+BATCH_SIZE = 100
+FLUSH_INTERVAL = float(os.environ.get("AAREKHA_FEEDBACK_FLUSH_S", "2"))
+BACKOFF_BASE = 2.0
+BACKOFF_MAX = 300.0
+
+_clients = {}
+_clients_lock = threading.Lock()
+_worker = None
+_worker_lock = threading.Lock()
+
+
+def authorize(credentials_info):
+    """Process-wide gspread client per service account."""
+    key = (credentials_info.get("client_email"), credentials_info.get("private_key_id"))
+    with _clients_lock:
+        client = _clients.get(key)
+        if client is None:
+            import gspread
+            from google.oauth2.service_account import Credentials
+            creds = Credentials.from_service_account_info(credentials_info, scopes=SCOPES)
+            client = _clients[key] = gspread.authorize(creds)
+        return client
+
+
+class GSheetSink:
+    """First worksheet of a Google spreadsheet, opened once and reused."""
+
+    def __init__(self, credentials_info, spreadsheet=SPREADSHEET):
+        self.credentials_info = dict(credentials_info)
+        self.spreadsheet = spreadsheet
+        self._sheet = None
+
+    def append_rows(self, rows):
+        if self._sheet is None:
+            self._sheet = authorize(self.credentials_info).open(self.spreadsheet).sheet1
+        try:
+            self._sheet.append_rows(rows, value_input_option="RAW")
+        except Exception:
+            # Re-open on the next attempt in case the handle went stale
+            self._sheet = None
+            raise
+
+
+class FakeSheet:
+    """In-memory sheet; ``fail_times`` makes the first N appends raise."""
+
+    def __init__(self, fail_times=0):
+        self.rows = []
+        self.calls = 0
+        self.fail_times = fail_times
+
+    def append_rows(self, rows):
+        self.calls += 1
+        if self.calls <= self.fail_times:
+            raise ConnectionError("fake sheet unavailable")
+        self.rows.extend(rows)
+
+
+class CsvSheet:
+    """Appends rows to a local CSV file."""
+
+    def __init__(self, path):
+        self.path = path
+
+    def append_rows(self, rows):
+        os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        with open(self.path, "a", newline="") as f:
+            csv.writer(f).writerows(rows)
+
+
+def sink_from_env(default=None):
+    """Sink named by ``AAREKHA_FEEDBACK_SINK``, else ``default()``."""
+    spec = os.environ.get("AAREKHA_FEEDBACK_SINK", "")
+    if spec == "fake":
+        return FakeSheet()
+    if spec.startswith("csv:"):
+        return CsvSheet(spec[len("csv:"):])
+    return default() if default else None
+
+
+class FeedbackQueue:
+    """Durable FIFO of sheet rows in SQLite."""
+
+    def __init__(self, path=QUEUE_PATH):
+        self.path = path
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        with self._connect() as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS pending (id INTEGER PRIMARY KEY AUTOINCREMENT, row TEXT NOT NULL, created REAL NOT NULL)"
+            )
+
+    def _connect(self):
+        return sqlite3.connect(self.path, timeout=10)
+
+    def put(self, row):
+        conn = self._connect()
+        try:
+            with conn:
+                conn.execute("INSERT INTO pending (row, created) VALUES (?, ?)", (json.dumps(row, default=str), time.time()))
+        finally:
+            conn.close()
+
+    def peek(self, limit=BATCH_SIZE):
+        """Oldest ``(ids, rows)`` without removing them."""
+        conn = self._connect()
+        try:
+            found = conn.execute("SELECT id, row FROM pending ORDER BY id LIMIT ?", (limit,)).fetchall()
+        finally:
+            conn.close()
+        return [i for i, _ in found], [json.loads(r) for _, r in found]
+
+    def remove(self, ids):
+        conn = self._connect()
+        try:
+            with conn:
+                conn.executemany("DELETE FROM pending WHERE id = ?", [(i,) for i in ids])
+        finally:
+            conn.close()
+
+    def __len__(self):
+        conn = self._connect()
+        try:
+            return conn.execute("SELECT COUNT(*) FROM pending").fetchone()[0]
+        finally:
+            conn.close()
+
+
+class FeedbackWorker:
+    """Daemon thread that drains a :class:`FeedbackQueue` into a sink.
+
+    ``sink_factory`` is called lazily (and again after it raises), so missing
+    credentials only delay delivery instead of failing the submit.
+    """
+
+    def __init__(self, queue, sink_factory, batch_size=BATCH_SIZE, interval=FLUSH_INTERVAL):
+        self.queue = queue
+        self.sink_factory = sink_factory
+        self.batch_size = batch_size
+        self.interval = interval
+        self.sink = None
+        self.failures = 0
+        self.last_error = None
+        self._wake = threading.Event()
+        self._idle = threading.Event()
+        self._stop = False
+        self._thread = threading.Thread(target=self._run, name="aarekha-feedback", daemon=True)
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def notify(self):
+        self._wake.set()
+
+    def flush_once(self):
+        """Send up to one batch; return the number of rows delivered."""
+        ids, rows = self.queue.peek(self.batch_size)
+        if not rows:
+            return 0
+        with telemetry.span("feedback.flush", rows=len(rows)):
+            if self.sink is None:
+                self.sink = self.sink_factory()
+            self.sink.append_rows(rows)
+        self.queue.remove(ids)
+        return len(rows)
+
+    def _run(self):
+        while not self._stop:
+            try:
+                while self.flush_once() == self.batch_size:
+                    pass
+                self.failures = 0
+                self.last_error = None
+                delay = self.interval
+            except Exception as e:
+                self.failures += 1
+                self.last_error = e
+                telemetry.event("feedback.retry", attempt=self.failures, error=type(e).__name__)
+                delay = random.uniform(0, min(BACKOFF_MAX, BACKOFF_BASE * 2 ** self.failures))
+            if self.failures == 0 and not len(self.queue):
+                self._idle.set()
+            self._wake.wait(delay)
+            self._wake.clear()
+
+    def flush(self, timeout=10):
+        """Wake the worker and wait until the queue is empty; True on success."""
+        deadline = time.monotonic() + timeout
+        while time.monotonic() < deadline:
+            self._idle.clear()
+            self.notify()
+            if self._idle.wait(max(0.0, deadline - time.monotonic())) and not len(self.queue):
+                return True
+        return False
+
+    def stop(self):
+        self._stop = True
+        self.notify()
+
+
+def start_worker(sink_factory, queue_path=QUEUE_PATH):
+    """Return the process-wide worker, starting it on first use."""
+    global _worker
+    with _worker_lock:
+        if _worker is None:
+            _worker = FeedbackWorker(FeedbackQueue(queue_path), sink_factory).start()
+        return _worker
+
+
+def submit(row, sink_factory):
+    """Queue one sheet row and return immediately; delivery happens in the background."""
+    worker = start_worker(sink_factory)
+    with telemetry.span("feedback.write"):
+        worker.queue.put(row)
+    worker.notify()
+    return worker
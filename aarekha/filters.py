@@ -0,0 +1,185 @@
+"""Boolean-mask filter engine.
+
+Each column is factorized once into integer codes. A filter selection becomes
+a lookup over the column's distinct values that is indexed by those codes, so
+one (column, selection) mask costs a single vectorized gather and is cached.
+Date columns can instead be filtered by a :class:`DateRange`, which is two
+binary searches over the column's sorted :class:`~aarekha.timeseries.TimeIndex`.
+Global and per-chart masks are combined with ``&`` and rows are only
+materialized at the end, projected to the columns a chart needs.
+"""
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass
+
+import numpy as np
+import pandas as pd
+
+from aarekha import cache
+from aarekha.timeseries import TimeIndex
+
+_MASK_SLOTS = 64
+_shared_indexes = cache.region("filters")
+_shared_lock = threading.Lock()
+
+
+@dataclass(frozen=True)
+class DateRange:
+    """Selection ``start <= value < stop`` on a datetime column; None leaves an end open."""
+    start: pd.Timestamp = None
+    stop: pd.Timestamp = None
+
+    @classmethod
+    def between(cls, first_day, last_day):
+        """Range covering whole calendar days ``first_day`` through ``last_day``."""
+        return cls(pd.Timestamp(first_day), pd.Timestamp(last_day) + pd.Timedelta(days=1))
+
+
+def _selection_key(values):
+    return values if isinstance(values, DateRange) else frozenset(values)
+
+
+class _Indexes:
+    """Codes, date indexes and masks of one dataset version, shared by its engines.
+
+    Holds no frame, so the cache charges it only for what has been built.
+    """
+
+    def __init__(self, columns):
+        self.columns = columns
+        self.codes = {}
+        self.times = {}
+        self.masks = OrderedDict()
+        self.lock = threading.Lock()
+
+    def nbytes(self):
+        with self.lock:
+            size = sum(codes.nbytes + uniques.memory_usage(deep=True) for codes, uniques in self.codes.values())
+            size += sum(
+                index.order.nbytes + index.sorted.nbytes + index.day_codes.nbytes + index.day_values.nbytes
+                for index in self.times.values()
+            )
+            return size + sum(mask.nbytes for mask in self.masks.values() if mask is not None)
+
+
+class FilterEngine:
+    def __init__(self, df, version, indexes=None):
+        self.df = df
+        self.version = version
+        self._shared = indexes is not None  # from get_engine, so charged to the cache
+        self._indexes = indexes if indexes is not None else _Indexes(df.columns)
+        self._lock = self._indexes.lock
+
+    def _grew(self):
+        if self._shared:
+            _shared_indexes.resize(self.version, self._indexes.nbytes())
+
+    def codes(self, col):
+        """Return ``(codes, uniques)`` for a column; missing values have code -1."""
+        with self._lock:
+            cached = self._indexes.codes.get(col)
+        if cached is not None:
+            return cached
+        s = self.df[col]
+        if isinstance(s.dtype, pd.CategoricalDtype):
+            codes, uniques = s.cat.codes.to_numpy(), s.cat.categories
+        else:
+            codes, uniques = pd.factorize(s)
+        cached = (codes, pd.Index(uniques))
+        with self._lock:
+            self._indexes.codes[col] = cached
+        self._grew()
+        return cached
+
+    def time_index(self, col):
+        """Return the :class:`TimeIndex` of a datetime column."""
+        with self._lock:
+            index = self._indexes.times.get(col)
+        if index is None:
+            index = TimeIndex(self.df[col])
+            with self._lock:
+                self._indexes.times[col] = index
+            self._grew()
+        return index
+
+    def mask(self, col, values):
+        """Mask for ``col in values`` (or a :class:`DateRange`), None when nothing is excluded."""
+        key = (col, _selection_key(values))
+        masks = self._indexes.masks
+        with self._lock:
+            if key in masks:
+                masks.move_to_end(key)
+                return masks[key]
+        if isinstance(values, DateRange):
+            mask = self.time_index(col).range_mask(values.start, values.stop)
+        else:
+            codes, uniques = self.codes(col)
+            allowed = uniques.isin(list(values))
+            if allowed.all():
+                mask = None
+            else:
+                # The extra False slot catches code -1 (missing values).
+                lookup = np.zeros(len(uniques) + 1, dtype=bool)
+                lookup[:-1] = allowed
+                mask = lookup[codes]
+        with self._lock:
+            masks[key] = mask
+            while len(masks) > _MASK_SLOTS:
+                masks.popitem(last=False)
+        if mask is not None:
+            self._grew()
+        return mask
+
+    def combine(self, selections, base=None):
+        """AND the masks for ``{col: values}`` onto ``base`` (None means all rows)."""
+        mask = base
+        for col, values in selections.items():
+            col_mask = self.mask(col, values)
+            if col_mask is None:
+                continue
+            mask = col_mask if mask is None else mask & col_mask
+        return mask
+
+    def selection_id(self, *selections):
+        """Hashable id of the mask ``combine`` builds from these selections.
+
+        Selections that keep every row are left out, so equal masks get
+        equal ids regardless of how they were spelled.
+        """
+        return frozenset(
+            (col, _selection_key(values))
+            for selection in selections
+            for col, values in selection.items()
+            if self.mask(col, values) is not None
+        )
+
+    def count(self, mask):
+        return len(self.df) if mask is None else int(np.count_nonzero(mask))
+
+    def apply(self, mask, columns=None):
+        """Materialize the surviving rows, optionally only ``columns``."""
+        df = self.df if columns is None else self.df[list(dict.fromkeys(columns))]
+        return df if mask is None else df[mask]
+
+    def value_counts(self, col, mask=None):
+        """Counts per value of ``col`` among surviving rows, largest first."""
+        codes, uniques = self.codes(col)
+        if mask is not None:
+            codes = codes[mask]
+        counts = np.bincount(codes[codes >= 0], minlength=len(uniques))
+        series = pd.Series(counts, index=uniques, name="count")
+        return series[series > 0].sort_values(ascending=False, kind="stable")
+
+
+def get_engine(df, version):
+    """Return an engine for a dataset version, sharing its indexes with other sessions.
+
+    The cached indexes hold no reference to ``df``; the frame stays owned by
+    the dataset cache and the caller.
+    """
+    with _shared_lock:
+        indexes = _shared_indexes.get(version)
+        if indexes is None or not indexes.columns.equals(df.columns):
+            indexes = _Indexes(df.columns)
+            _shared_indexes.put(version, indexes, size=0)
+    return FilterEngine(df, version, indexes)
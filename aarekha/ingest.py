@@ -0,0 +1,383 @@
+"""Content-addressed ingestion cache.
+
+Uploads are parsed once, their dtypes are tightened and the result is written
+as a Parquet artifact named after the hash of the uploaded bytes. Later reruns
+(and other sessions) reopen the artifact instead of re-parsing the file.
+
+Large CSVs are read in chunks. Column statistics are accumulated per chunk and
+a uniform reservoir sample is kept for the chart-recommendation prompt. When
+the parsed rows would not fit in ``RAM_BUDGET_MB`` the dataset degrades to a
+budget-sized uniform sample of the file (``IngestResult.sampled``) and the
+whole-file statistics are kept in ``IngestResult.stats`` for the prompt.
+
+Besides CSV and Excel, uploads may be gzip/zstd-compressed CSV, Parquet or
+Feather/Arrow IPC. Columnar formats are read straight from the upload buffer
+through Arrow without an intermediate copy, and every reader can be limited
+to a subset of columns (and, for Excel, a specific sheet).
+"""
+import gzip
+import hashlib
+import io
+import json
+import os
+import warnings
+from dataclasses import asdict, dataclass, field
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.feather as feather
+import pyarrow.parquet as pq
+
+try:
+    import python_calamine  # noqa: F401  (Rust Excel reader, much faster than openpyxl)
+    EXCEL_ENGINE = "calamine"
+except ImportError:
+    EXCEL_ENGINE = None  # pandas' default, openpyxl
+
+from aarekha import cache
+from aarekha.cache import CACHE_DIR
+
+DATASET_DIR = os.path.join(CACHE_DIR, "datasets")
+
+# CSV uploads above this size are streamed in chunks of CHUNK_ROWS rows.
+STREAM_THRESHOLD_MB = int(os.environ.get("AAREKHA_STREAM_THRESHOLD_MB", "64"))
+CHUNK_ROWS = int(os.environ.get("AAREKHA_CHUNK_ROWS", "100000"))
+# Upper bound for the in-memory size of one parsed dataset.
+RAM_BUDGET_MB = int(os.environ.get("AAREKHA_RAM_BUDGET_MB", "1024"))
+# Rows handed to the LLM as the data sample.
+SAMPLE_ROWS = 100
+
+# Strings with at most this many distinct values (and repeating often enough)
+# are stored as categoricals.
+CATEGORY_MAX_UNIQUE = 1000
+CATEGORY_MAX_RATIO = 0.5
+DATE_SAMPLE_SIZE = 500
+DATE_MIN_PARSED = 0.9
+# Distinct values tracked per column while streaming.
+DISTINCT_CAP = 10000
+
+# File extensions accepted by the uploader (matched on the last suffix).
+UPLOAD_TYPES = ["csv", "gz", "zst", "xlsx", "parquet", "feather", "arrow"]
+# Compressed CSVs expand several-fold; used to decide when to stream them.
+COMPRESSION_RATIO = 5
+
+# Parsed frames, shared by every session that loads the same content; cold
+# ones spill to memory-mapped Arrow files instead of being re-parsed.
+_datasets = cache.region("datasets", spill=True)
+_dataset_meta = cache.region("dataset_meta")
+
+
+@dataclass
+class ColumnStats:
+    count: int = 0
+    nulls: int = 0
+    distinct: int = 0
+    distinct_capped: bool = False
+    min: float = None
+    max: float = None
+    sum: float = 0.0
+    _seen: set = field(default_factory=set, repr=False)
+
+    def update(self, series):
+        valid = series.dropna()
+        self.count += len(valid)
+        self.nulls += len(series) - len(valid)
+        if pd.api.types.is_numeric_dtype(valid) and not pd.api.types.is_bool_dtype(valid) and len(valid):
+            lo, hi = float(valid.min()), float(valid.max())
+            self.min = lo if self.min is None else min(self.min, lo)
+            self.max = hi if self.max is None else max(self.max, hi)
+            self.sum += float(valid.sum())
+        if not self.distinct_capped:
+            self._seen.update(valid.unique().tolist())
+            if len(self._seen) > DISTINCT_CAP:
+                self.distinct_capped = True
+                self._seen = set()
+        self.distinct = DISTINCT_CAP if self.distinct_capped else len(self._seen)
+
+    def to_dict(self):
+        data = asdict(self)
+        data.pop("_seen")
+        return data
+
+    @classmethod
+    def from_dict(cls, data):
+        return cls(**data)
+
+
+@dataclass
+class IngestResult:
+    key: str
+    status: str  # "memory", "disk" or "miss"
+    rows: int
+    path: str
+    total_rows: int = 0
+    sampled: bool = False
+    stats: dict = field(default_factory=dict, repr=False)  # whole-file ColumnStats, sampled datasets only
+    sample: pd.DataFrame = field(default=None, repr=False)
+
+
+def content_hash(data):
+    return hashlib.blake2b(data, digest_size=16).hexdigest()
+
+
+def dataset_key(data, sheet=None, columns=None, digest=None):
+    """Cache key of an upload read with the given sheet and column projection.
+
+    ``digest`` is the upload's :func:`content_hash` when the caller already has it.
+    """
+    key = digest or content_hash(data)
+    if sheet is None and columns is None:
+        return key
+    options = json.dumps({"sheet": sheet, "columns": columns}, sort_keys=True, default=str)
+    return hashlib.blake2b(f"{key}:{options}".encode("utf-8"), digest_size=16).hexdigest()
+
+
+def file_format(name):
+    """Return ``(kind, compression)`` for an upload name; kind is csv, excel, parquet or arrow."""
+    lower = name.lower()
+    for suffix, compression in ((".gz", "gzip"), (".zst", "zstd")):
+        if lower.endswith(suffix):
+            return "csv", compression
+    if lower.endswith((".xlsx", ".xlsm", ".xls")):
+        return "excel", None
+    if lower.endswith(".parquet"):
+        return "parquet", None
+    if lower.endswith((".feather", ".arrow", ".ipc")):
+        return "arrow", None
+    return "csv", None
+
+
+def _csv_source(data, compression):
+    if compression == "gzip":
+        return gzip.GzipFile(fileobj=io.BytesIO(data))
+    if compression == "zstd":
+        # Arrow's codec, so no extra zstandard dependency is needed
+        return pa.CompressedInputStream(pa.BufferReader(data), "zstd")
+    return io.BytesIO(data)
+
+
+def list_sheets(name, data):
+    """Sheet names of an Excel upload, or None for other formats."""
+    if file_format(name)[0] != "excel":
+        return None
+    with pd.ExcelFile(io.BytesIO(data), engine=EXCEL_ENGINE) as book:
+        return [str(s) for s in book.sheet_names]
+
+
+def read_columns(name, data, sheet=None):
+    """Column names of an upload without parsing its rows (beyond the header)."""
+    kind, compression = file_format(name)
+    if kind == "parquet":
+        return list(pq.read_schema(pa.BufferReader(data)).names)
+    if kind == "arrow":
+        return list(pa.ipc.open_file(pa.BufferReader(data)).schema.names)
+    if kind == "excel":
+        header = pd.read_excel(io.BytesIO(data), sheet_name=sheet or 0, nrows=0, engine=EXCEL_ENGINE)
+    else:
+        header = pd.read_csv(_csv_source(data, compression), encoding="latin1", nrows=0)
+    return [str(c) for c in header.columns]
+
+
+def _arrow_to_pandas(table):
+    # split_blocks + self_destruct let Arrow hand over numeric buffers without a
+    # consolidating copy and free each column as soon as it is converted
+    return table.to_pandas(split_blocks=True, self_destruct=True)
+
+
+def _looks_like_dates(series):
+    sample = series.dropna()
+    if sample.empty:
+        return False
+    sample = sample.sample(min(len(sample), DATE_SAMPLE_SIZE), random_state=0).astype(str)
+    # Plain numbers ("2021", "3.5") parse as dates too; leave them alone.
+    if pd.to_numeric(sample, errors="coerce").notna().mean() > 0.5:
+        return False
+    with warnings.catch_warnings():
+        warnings.simplefilter("ignore")
+        parsed = pd.to_datetime(sample, errors="coerce")
+    return parsed.notna().mean() >= DATE_MIN_PARSED
+
+
+def optimize_dtypes(df):
+    """Downcast numerics, parse date-like strings and categorize repetitive text."""
+    out = {}
+    for col in df.columns:
+        s = df[col]
+        if pd.api.types.is_integer_dtype(s):
+            s = pd.to_numeric(s, downcast="integer")
+        elif pd.api.types.is_float_dtype(s):
+            small = s.astype("float32")
+            # Only keep float32 when no precision is lost.
+            if ((small.astype("float64") == s) | s.isna()).all():
+                s = small
+        elif pd.api.types.is_object_dtype(s):
+            if _looks_like_dates(s):
+                with warnings.catch_warnings():
+                    warnings.simplefilter("ignore")
+                    s = pd.to_datetime(s, errors="coerce")
+            else:
+                n_unique = s.nunique(dropna=True)
+                if n_unique <= CATEGORY_MAX_UNIQUE and n_unique <= CATEGORY_MAX_RATIO * max(len(s), 1):
+                    s = s.astype("category")
+        out[col] = s
+    return pd.DataFrame(out, index=df.index)
+
+
+def representative_sample(df, n=SAMPLE_ROWS):
+    """Uniform random rows (in file order) so sorted files don't skew the prompt."""
+    if len(df) <= n:
+        return df
+    return df.sample(n, random_state=0).sort_index()
+
+
+def _top_priority(df, priority, n):
+    if len(df) <= n:
+        return df, priority
+    keep = np.argpartition(-priority, n - 1)[:n]
+    return df.iloc[keep], priority[keep]
+
+
+def stream_csv(buffer, chunk_rows=CHUNK_ROWS, ram_budget_mb=RAM_BUDGET_MB, columns=None):
+    """Read a CSV in chunks within a memory budget.
+
+    Every row gets a random priority; the rows with the highest priorities form
+    a uniform sample no matter how the file is sorted. While the parsed rows fit
+    in the budget all chunks are kept, otherwise only the top-priority rows that
+    fit are retained. Returns ``(df, stats, total_rows, sampled)``.
+    """
+    budget = ram_budget_mb * 1024 * 1024
+    rng = np.random.default_rng(0)
+    stats = {}
+    chunks, priorities = [], []
+    kept_bytes, total_rows = 0, 0
+    reservoir, reservoir_priority, cap_rows = None, None, None
+
+    for chunk in pd.read_csv(buffer, encoding="latin1", chunksize=chunk_rows, usecols=columns):
+        chunk.columns = [str(c) for c in chunk.columns]
+        for col in chunk.columns:
+            stats.setdefault(col, ColumnStats()).update(chunk[col])
+        total_rows += len(chunk)
+        priority = rng.random(len(chunk))
+
+        if reservoir is None:
+            chunks.append(chunk)
+            priorities.append(priority)
+            kept_bytes += int(chunk.memory_usage(deep=True).sum())
+            if kept_bytes <= budget:
+                continue
+            # Over budget: switch to a fixed-size reservoir of the rows that fit.
+            row_bytes = kept_bytes / sum(len(c) for c in chunks)
+            cap_rows = max(SAMPLE_ROWS, int(budget * 0.5 / row_bytes))
+            chunk = pd.concat(chunks)
+            priority = np.concatenate(priorities)
+            chunks, priorities = [], []
+            reservoir, reservoir_priority = chunk.iloc[:0], priority[:0]
+
+        # The chunk index is the row number in the file, kept to restore order.
+        merged = pd.concat([reservoir, chunk])
+        merged_priority = np.concatenate([reservoir_priority, priority])
+        reservoir, reservoir_priority = _top_priority(merged, merged_priority, cap_rows)
+
+    sampled = reservoir is not None
+    if not sampled:
+        df = pd.concat(chunks, ignore_index=True) if chunks else pd.DataFrame()
+    else:
+        df = reservoir.sort_index().reset_index(drop=True)
+    return optimize_dtypes(df), stats, total_rows, sampled
+
+
+def parse_bytes(name, data, sheet=None, columns=None):
+    kind, compression = file_format(name)
+    if kind == "parquet":
+        return _arrow_to_pandas(pq.read_table(pa.BufferReader(data), columns=columns))
+    if kind == "arrow":
+        return _arrow_to_pandas(feather.read_table(pa.BufferReader(data), columns=columns, memory_map=False))
+    if kind == "excel":
+        return pd.read_excel(io.BytesIO(data), sheet_name=sheet or 0, usecols=columns, engine=EXCEL_ENGINE)
+    return pd.read_csv(_csv_source(data, compression), encoding="latin1", usecols=columns)
+
+
+def _parse(name, data, sheet=None, columns=None):
+    """Return ``(df, stats, total_rows, sampled)`` for an upload."""
+    kind, compression = file_format(name)
+    expanded = len(data) * (COMPRESSION_RATIO if compression else 1)
+    if kind == "csv" and expanded > STREAM_THRESHOLD_MB * 1024 * 1024:
+        return stream_csv(_csv_source(data, compression), CHUNK_ROWS, RAM_BUDGET_MB, columns)
+    df = parse_bytes(name, data, sheet, columns)
+    df.columns = [str(c) for c in df.columns]
+    df = optimize_dtypes(df)
+    # Statistics of the whole file would only repeat the frame's own
+    return df, {}, len(df), False
+
+
+def _remember(key, df, meta):
+    _dataset_meta.put(key, meta)
+    _datasets.put(key, df)
+
+
+def _result(key, status, path, df, meta):
+    return IngestResult(
+        key, status, len(df), path,
+        total_rows=meta["total_rows"],
+        sampled=meta["sampled"],
+        stats={col: ColumnStats.from_dict(s) for col, s in meta["stats"].items()},
+        sample=representative_sample(df),
+    )
+
+
+def load_dataset(name, data, sheet=None, columns=None, digest=None):
+    """Return ``(df, IngestResult)`` for an uploaded file's name and bytes.
+
+    ``sheet`` picks an Excel sheet (default: the first) and ``columns``
+    limits which columns are read (default: all). ``digest`` saves hashing
+    the bytes again when the caller has it. The returned frame is a
+    shallow copy so callers may add columns without touching the cached
+    version.
+    """
+    key = dataset_key(data, sheet, columns, digest)
+    path = os.path.join(DATASET_DIR, f"{key}.parquet")
+    meta_path = os.path.join(DATASET_DIR, f"{key}.json")
+
+    df = _datasets.get(key)
+    if df is not None:
+        meta = _dataset_meta.get(key)
+        if meta is None and os.path.exists(meta_path):
+            # The small meta entry can be evicted while the frame sits in a spill file
+            with open(meta_path) as f:
+                meta = json.load(f)
+            _dataset_meta.put(key, meta)
+        if meta is not None:
+            return df.copy(deep=False), _result(key, "memory", path, df, meta)
+
+    if os.path.exists(path) and os.path.exists(meta_path):
+        try:
+            df = pd.read_parquet(path, memory_map=True)
+            with open(meta_path) as f:
+                meta = json.load(f)
+            _remember(key, df, meta)
+            return df.copy(deep=False), _result(key, "disk", path, df, meta)
+        except Exception:
+            # A truncated or stale artifact is simply rebuilt below.
+            pass
+
+    df, stats, total_rows, sampled = _parse(name, data, sheet, columns)
+    meta = {
+        "total_rows": total_rows,
+        "sampled": sampled,
+        # Only a sample's statistics differ from the frame's
+        "stats": {col: s.to_dict() for col, s in stats.items()} if sampled else {},
+    }
+    try:
+        os.makedirs(DATASET_DIR, exist_ok=True)
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        df.to_parquet(tmp_path, index=False)
+        os.replace(tmp_path, path)
+        with open(f"{meta_path}.{os.getpid()}.tmp", "w") as f:
+            json.dump(meta, f)
+        os.replace(f"{meta_path}.{os.getpid()}.tmp", meta_path)
+    except Exception:
+        # Caching is best effort; the parsed frame is still usable.
+        pass
+    _remember(key, df, meta)
+    return df.copy(deep=False), _result(key, "miss", path, df, meta)
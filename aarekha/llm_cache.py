@@ -0,0 +1,140 @@
+"""Persistent cache for LLM responses.
+
+Chart plans and regenerated insights are stored in a SQLite file so they
+survive new sessions, browser refreshes and restarts. Entries expire after
+``TTL_DAYS`` and the least recently used ones are evicted once the cache
+grows past ``MAX_MB``. A plan cached for N charts also answers requests for
+fewer charts with its first entries.
+"""
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+
+from aarekha.ingest import CACHE_DIR
+
+DB_PATH = os.path.join(CACHE_DIR, "llm_cache.sqlite")
+MAX_MB = float(os.environ.get("AAREKHA_LLM_CACHE_MB", "50"))
+TTL_DAYS = float(os.environ.get("AAREKHA_LLM_CACHE_TTL_DAYS", "30"))
+
+_lock = threading.Lock()
+_initialized = set()
+
+
+def fingerprint(*parts):
+    """Stable hash of the strings/JSON-able values that determine a prompt."""
+    digest = hashlib.blake2b(digest_size=16)
+    for part in parts:
+        if not isinstance(part, str):
+            part = json.dumps(part, sort_keys=True, default=str)
+        digest.update(part.encode("utf-8"))
+        digest.update(b"\x00")
+    return digest.hexdigest()
+
+
+def _connect(path=None):
+    path = path or DB_PATH
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    conn = sqlite3.connect(path, timeout=10)
+    if path not in _initialized:
+        with _lock:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute(
+                """CREATE TABLE IF NOT EXISTS entries (
+                    kind TEXT NOT NULL,
+                    key TEXT NOT NULL,
+                    chart_count INTEGER NOT NULL DEFAULT 0,
+                    value TEXT NOT NULL,
+                    size INTEGER NOT NULL,
+                    created REAL NOT NULL,
+                    accessed REAL NOT NULL,
+                    PRIMARY KEY (kind, key, chart_count)
+                )"""
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS entries_accessed ON entries (accessed)")
+            conn.commit()
+            _initialized.add(path)
+    return conn
+
+
+def _get(kind, key, min_count=0, path=None):
+    cutoff = time.time() - TTL_DAYS * 86400
+    conn = _connect(path)
+    try:
+        row = conn.execute(
+            "SELECT chart_count, value FROM entries WHERE kind = ? AND key = ? AND chart_count >= ? "
+            "AND created >= ? ORDER BY chart_count LIMIT 1",
+            (kind, key, min_count, cutoff),
+        ).fetchone()
+        if row is None:
+            return None
+        conn.execute(
+            "UPDATE entries SET accessed = ? WHERE kind = ? AND key = ? AND chart_count = ?",
+            (time.time(), kind, key, row[0]),
+        )
+        conn.commit()
+        return json.loads(row[1])
+    finally:
+        conn.close()
+
+
+def _put(kind, key, value, chart_count=0, path=None):
+    data = json.dumps(value)
+    now = time.time()
+    conn = _connect(path)
+    try:
+        conn.execute(
+            "INSERT OR REPLACE INTO entries (kind, key, chart_count, value, size, created, accessed) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?)",
+            (kind, key, chart_count, data, len(data), now, now),
+        )
+        _evict(conn, now)
+        conn.commit()
+    finally:
+        conn.close()
+
+
+def _evict(conn, now):
+    conn.execute("DELETE FROM entries WHERE created < ?", (now - TTL_DAYS * 86400,))
+    budget = MAX_MB * 1024 * 1024
+    total = conn.execute("SELECT COALESCE(SUM(size), 0) FROM entries").fetchone()[0]
+    if total <= budget:
+        return
+    rows = conn.execute("SELECT kind, key, chart_count, size FROM entries ORDER BY accessed").fetchall()
+    for kind, key, chart_count, size in rows:
+        if total <= budget:
+            break
+        conn.execute(
+            "DELETE FROM entries WHERE kind = ? AND key = ? AND chart_count = ?",
+            (kind, key, chart_count),
+        )
+        total -= size
+
+
+def get_plan(key, num_charts, path=None):
+    """Cached chart plans for ``key``, reusing a prefix of a larger plan."""
+    plans = _get("plan", key, num_charts, path)
+    return plans[:num_charts] if plans else None
+
+
+def put_plan(key, plans, path=None):
+    _put("plan", key, plans, len(plans), path)
+
+
+def get_insight(key, path=None):
+    return _get("insight", key, 0, path)
+
+
+def put_insight(key, insight, path=None):
+    _put("insight", key, insight, 0, path)
+
+
+def clear(path=None):
+    conn = _connect(path)
+    try:
+        conn.execute("DELETE FROM entries")
+        conn.commit()
+    finally:
+        conn.close()
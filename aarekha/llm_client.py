@@ -0,0 +1,265 @@
+"""OpenAI chat client with retries, backoff and a bounded worker pool.
+
+Failed calls are retried with exponential backoff and full jitter instead of
+a fixed sleep, every HTTP request has its own timeout, and several requests
+(e.g. one insight per chart) can run concurrently on a process-wide pool.
+"""
+import json
+import os
+import random
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+import openai
+from openai import error as openai_error
+from requests.exceptions import RequestException
+
+from aarekha import telemetry
+from aarekha.ingest import CACHE_DIR
+from aarekha.prompts import count_message_tokens, count_tokens
+
+MODEL = "gpt-3.5-turbo"
+MAX_RETRIES = 3
+BACKOFF_BASE = 1.0
+BACKOFF_MAX = 20.0
+REQUEST_TIMEOUT = float(os.environ.get("AAREKHA_LLM_TIMEOUT", "30"))
+MAX_CONCURRENCY = int(os.environ.get("AAREKHA_LLM_CONCURRENCY", "10"))
+USAGE_LOG = os.path.join(CACHE_DIR, "llm_usage.jsonl")
+
+# Transient failures worth another attempt; auth and bad-request errors are not.
+RETRYABLE = (
+    openai_error.Timeout,
+    openai_error.APIConnectionError,
+    openai_error.RateLimitError,
+    openai_error.ServiceUnavailableError,
+    openai_error.TryAgain,
+    openai_error.APIError,
+    RequestException,
+    json.JSONDecodeError,
+)
+
+_pool = None
+_pool_lock = threading.Lock()
+_usage_lock = threading.Lock()
+# Most recent calls, newest last; each entry is also appended to USAGE_LOG.
+usage_log = deque(maxlen=200)
+
+
+def _executor():
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = ThreadPoolExecutor(max_workers=MAX_CONCURRENCY, thread_name_prefix="aarekha-llm")
+        return _pool
+
+
+def record_usage(label, model, messages, completion, usage, latency):
+    """Log tokens sent/received and latency for one call.
+
+    Uses the API's ``usage`` block when present (streamed responses have
+    none) and counts tokens locally otherwise.
+    """
+    usage = usage or {}
+    entry = {
+        "time": time.time(),
+        "label": label,
+        "model": model,
+        "prompt_tokens": usage.get("prompt_tokens") or count_message_tokens(messages, model),
+        "completion_tokens": usage.get("completion_tokens") or count_tokens(completion, model),
+        "latency_s": round(latency, 3),
+    }
+    usage_log.append(entry)
+    try:
+        with _usage_lock:
+            os.makedirs(os.path.dirname(USAGE_LOG), exist_ok=True)
+            with open(USAGE_LOG, "a") as f:
+                f.write(json.dumps(entry) + "\n")
+    except OSError:
+        pass
+    return entry
+
+
+def backoff_delay(attempt):
+    """Full-jitter exponential backoff for the given 1-based attempt."""
+    return random.uniform(0, min(BACKOFF_MAX, BACKOFF_BASE * 2 ** attempt))
+
+
+def clean_response(raw):
+    """Strip code fences and control characters the model likes to add."""
+    raw = raw.strip()
+    if raw.startswith("```"):
+        raw = raw.split("\n", 1)[1].rsplit("\n", 1)[0]
+    return raw.replace("\r", "").replace("\t", " ")
+
+
+def parse_json(raw):
+    return json.loads(clean_response(raw))
+
+
+def complete(messages, temperature, max_tokens, parse=None, model=MODEL, retries=MAX_RETRIES, on_retry=None, label="chat"):
+    """Run one chat completion, retrying transient and parse failures.
+
+    ``parse`` turns the response text into the returned value; a parse error
+    counts as a failed attempt. ``on_retry(attempt, exc, delay)`` is called
+    before each backoff sleep. The last error is raised when all attempts fail.
+    """
+    for attempt in range(1, retries + 1):
+        try:
+            started = time.perf_counter()
+            with telemetry.span("llm.request", label=label, attempt=attempt):
+                res = openai.ChatCompletion.create(
+                    model=model,
+                    messages=messages,
+                    temperature=temperature,
+                    max_tokens=max_tokens,
+                    request_timeout=REQUEST_TIMEOUT,
+                )
+            content = res.choices[0].message.content
+            record_usage(label, model, messages, content, getattr(res, "usage", None), time.perf_counter() - started)
+            return parse(content) if parse else content
+        except RETRYABLE as e:
+            if attempt == retries:
+                raise
+            delay = backoff_delay(attempt)
+            telemetry.event("llm.retry", label=label, attempt=attempt, error=type(e).__name__, delay=round(delay, 3))
+            if on_retry:
+                on_retry(attempt, e, delay)
+            time.sleep(delay)
+
+
+class JsonArrayParser:
+    """Incremental parser for a streamed top-level JSON array of objects.
+
+    :meth:`feed` returns every object completed by the new text. Text before
+    the opening bracket (e.g. a code fence) is ignored, and an element that
+    fails to parse is recorded in ``errors`` and skipped.
+    """
+
+    def __init__(self):
+        self.started = False
+        self.depth = 0
+        self.in_string = False
+        self.escape = False
+        self.current = []
+        self.errors = []
+
+    def feed(self, text):
+        items = []
+        for ch in text:
+            if not self.started:
+                self.started = ch == "["
+                continue
+            if self.depth > 0:
+                self.current.append(ch)
+            if self.in_string:
+                if self.escape:
+                    self.escape = False
+                elif ch == "\\":
+                    self.escape = True
+                elif ch == '"':
+                    self.in_string = False
+            elif ch == '"':
+                self.in_string = True
+            elif ch == "{":
+                if self.depth == 0:
+                    self.current = [ch]
+                self.depth += 1
+            elif ch == "}" and self.depth > 0:
+                self.depth -= 1
+                if self.depth == 0:
+                    raw = "".join(self.current).replace("\r", "").replace("\t", " ")
+                    try:
+                        items.append(json.loads(raw, strict=False))
+                    except json.JSONDecodeError as e:
+                        self.errors.append(e)
+        return items
+
+
+def stream(messages, temperature, max_tokens, model=MODEL, label="stream", on_usage=None):
+    """Yield the response text of a streamed chat completion as it arrives.
+
+    ``on_usage(entry)`` receives this call's :func:`record_usage` entry once
+    the stream is exhausted.
+    """
+    # Only time spent waiting on the API counts as latency, not the caller's
+    # work between chunks.
+    started = time.perf_counter()
+    chunks = iter(openai.ChatCompletion.create(
+        model=model,
+        messages=messages,
+        temperature=temperature,
+        max_tokens=max_tokens,
+        request_timeout=REQUEST_TIMEOUT,
+        stream=True,
+    ))
+    waited = time.perf_counter() - started
+    received = []
+    while True:
+        started = time.perf_counter()
+        chunk = next(chunks, None)
+        waited += time.perf_counter() - started
+        if chunk is None:
+            break
+        delta = chunk["choices"][0].get("delta", {}).get("content")
+        if delta:
+            received.append(delta)
+            yield delta
+    entry = record_usage(label, model, messages, "".join(received), None, waited)
+    # The stream is consumed interleaved with the caller's work, so only API wait time is reported
+    telemetry.event("llm.stream", label=label, waited_s=entry["latency_s"], completion_tokens=entry["completion_tokens"])
+    if on_usage:
+        on_usage(entry)
+
+
+def stream_json_array(messages, temperature, max_tokens, model=MODEL, retries=MAX_RETRIES, on_retry=None, on_skip=None, label="stream", on_usage=None):
+    """Stream a JSON-array response and yield each object once it is complete.
+
+    Malformed elements are skipped (``on_skip(error)``) rather than failing
+    the whole response. ``on_usage`` is passed to :func:`stream`. Attempts are retried with backoff only while nothing
+    has been yielded yet; an error after that is raised to the caller, which
+    keeps the objects it already received.
+    """
+    for attempt in range(1, retries + 1):
+        parser = JsonArrayParser()
+        produced = 0
+        try:
+            for delta in stream(messages, temperature, max_tokens, model, label, on_usage):
+                for item in parser.feed(delta):
+                    produced += 1
+                    yield item
+            if on_skip:
+                for error in parser.errors:
+                    on_skip(error)
+            if produced:
+                return
+            raise parser.errors[-1] if parser.errors else json.JSONDecodeError("No JSON object in response", "", 0)
+        except RETRYABLE as e:
+            if produced or attempt == retries:
+                raise
+            delay = backoff_delay(attempt)
+            telemetry.event("llm.retry", label=label, attempt=attempt, error=type(e).__name__, delay=round(delay, 3))
+            if on_retry:
+                on_retry(attempt, e, delay)
+            time.sleep(delay)
+
+
+def submit(messages, temperature, max_tokens, parse=None, model=MODEL, retries=MAX_RETRIES, label="chat"):
+    """Schedule :func:`complete` on the shared pool and return its Future."""
+    return _executor().submit(telemetry.bind(complete), messages, temperature, max_tokens, parse, model, retries, None, label)
+
+
+def run_all(jobs):
+    """Run ``{key: kwargs-for-complete}`` concurrently.
+
+    Yields ``(key, result, error)`` as each request finishes, so callers can
+    show results progressively; exactly one of ``result``/``error`` is set.
+    """
+    futures = {submit(**kwargs): key for key, kwargs in jobs.items()}
+    for future in as_completed(futures):
+        key = futures[future]
+        try:
+            yield key, future.result(), None
+        except Exception as e:
+            yield key, None, e
@@ -0,0 +1,132 @@
+"""Server-side aggregation and level-of-detail downsampling.
+
+Charts whose filtered data exceeds ``MAX_POINTS`` rows are reduced before the
+Plotly figure is built, so the browser and kaleido only receive what can be
+seen: group totals for bars and areas, precomputed quartiles for box plots,
+LTTB for ordered series and 2D density bins (or a sample) for scatter plots.
+"""
+import os
+
+import numpy as np
+import pandas as pd
+
+MAX_POINTS = int(os.environ.get("AAREKHA_MAX_POINTS", "5000"))
+# Point traces above this size are drawn with WebGL (scattergl).
+WEBGL_THRESHOLD = int(os.environ.get("AAREKHA_WEBGL_THRESHOLD", "1000"))
+MAX_HISTOGRAM_BINS = 100
+
+
+def needs_reduction(df, max_points=MAX_POINTS):
+    return len(df) > max_points
+
+
+def render_mode(n_points):
+    return "webgl" if n_points > WEBGL_THRESHOLD else "svg"
+
+
+def _as_float(values):
+    if pd.api.types.is_datetime64_any_dtype(values):
+        # NaT would otherwise become int64-min rather than NaN
+        ns = values.to_numpy().astype("datetime64[ns]").astype("int64").astype("float64")
+        return np.where(pd.isna(values), np.nan, ns)
+    return pd.to_numeric(values, errors="coerce").to_numpy(dtype="float64")
+
+
+def value_column(x, y):
+    """Column holding y in reduced frames; it needs its own name when y is also the x axis."""
+    return y if y != x else f"{y} (value)"
+
+
+def aggregate(df, x, y, how="sum"):
+    """One row per x value with ``how`` applied to y (as :func:`value_column`), ordered by x."""
+    grouped = df[y].groupby(df[x], observed=True, sort=True).agg(how)
+    return grouped.rename(value_column(x, y)).reset_index()
+
+
+def lttb(df, x, y, n_out):
+    """Largest-Triangle-Three-Buckets downsampling of an x-ordered frame."""
+    n = len(df)
+    if n_out >= n or n_out < 3:
+        return df
+    xs, ys = _as_float(df[x]), _as_float(df[y])
+    every = (n - 2) / (n_out - 2)
+    keep = np.empty(n_out, dtype=np.int64)
+    keep[0], keep[-1] = 0, n - 1
+    a = 0
+    for i in range(n_out - 2):
+        # Average of the next bucket is the third triangle vertex.
+        next_lo = int((i + 1) * every) + 1
+        next_hi = min(int((i + 2) * every) + 1, n)
+        avg_x, avg_y = xs[next_lo:next_hi].mean(), ys[next_lo:next_hi].mean()
+        lo, hi = int(i * every) + 1, int((i + 1) * every) + 1
+        area = np.abs((xs[a] - avg_x) * (ys[lo:hi] - ys[a]) - (xs[a] - xs[lo:hi]) * (avg_y - ys[a]))
+        a = lo + int(np.argmax(area))
+        keep[i + 1] = a
+    return df.iloc[keep]
+
+
+def series_points(df, x, y, max_points=MAX_POINTS, how="sum"):
+    """Aggregate duplicate x values, then LTTB down to ``max_points``."""
+    data = aggregate(df.dropna(subset=[x, y]), x, y, how)
+    return lttb(data, x, value_column(x, y), max_points)
+
+
+def box_stats(df, x, y):
+    """Per-group quartiles, mean and Tukey whiskers (outliers are not shipped)."""
+    # x and y may be one column, which is then selected once
+    data = df[list(dict.fromkeys([x, y]))].dropna()
+    grouped = data[y].groupby(data[x], observed=True, sort=True)
+    stats = grouped.quantile([0.25, 0.5, 0.75]).unstack()
+    stats.columns = ["q1", "median", "q3"]
+    stats["mean"] = grouped.mean()
+    iqr = stats["q3"] - stats["q1"]
+    lo = (stats["q1"] - 1.5 * iqr).rename("lo")
+    hi = (stats["q3"] + 1.5 * iqr).rename("hi")
+    bounds = data.join(lo, on=x).join(hi, on=x)
+    inside = bounds[(bounds[y] >= bounds["lo"]) & (bounds[y] <= bounds["hi"])]
+    inside_grouped = inside[y].groupby(inside[x], observed=True)
+    stats["lowerfence"] = inside_grouped.min()
+    stats["upperfence"] = inside_grouped.max()
+    return stats.reset_index()
+
+
+def density_grid(df, x, y, max_points=MAX_POINTS):
+    """2D histogram with at most ``max_points`` cells; returns (x_centers, y_centers, counts)."""
+    data = df[list(dict.fromkeys([x, y]))].dropna()
+    xs, ys = _as_float(data[x]), _as_float(data[y])
+    bins = max(int(np.sqrt(max_points)), 2)
+    counts, x_edges, y_edges = np.histogram2d(xs, ys, bins=bins)
+    x_centers = (x_edges[:-1] + x_edges[1:]) / 2
+    y_centers = (y_edges[:-1] + y_edges[1:]) / 2
+    if pd.api.types.is_datetime64_any_dtype(data[x]):
+        x_centers = pd.to_datetime(x_centers.astype("int64"))
+    # histogram2d is indexed [x, y]; heatmaps expect rows along y.
+    return x_centers, y_centers, counts.T
+
+
+def sample_rows(df, max_points=MAX_POINTS):
+    if len(df) <= max_points:
+        return df
+    return df.sample(max_points, random_state=0).sort_index()
+
+
+def histogram_counts(series, max_bins=MAX_HISTOGRAM_BINS):
+    """Counts per bin for numeric/date columns or per value for the rest."""
+    values = series.dropna()
+    if pd.api.types.is_bool_dtype(values) or not (
+        pd.api.types.is_numeric_dtype(values) or pd.api.types.is_datetime64_any_dtype(values)
+    ):
+        counts = values.value_counts(sort=False)
+        counts = counts[counts > 0]
+        return pd.DataFrame({series.name: counts.index, "count": counts.to_numpy()}), None
+    floats = _as_float(values)
+    edges = np.histogram_bin_edges(floats, bins="auto")
+    if len(edges) - 1 > max_bins:
+        edges = np.histogram_bin_edges(floats, bins=max_bins)
+    counts, edges = np.histogram(floats, bins=edges)
+    centers = (edges[:-1] + edges[1:]) / 2
+    width = float(edges[1] - edges[0]) if len(edges) > 1 else None
+    if pd.api.types.is_datetime64_any_dtype(values):
+        centers = pd.to_datetime(centers.astype("int64"))
+        width = width / 1e6 if width else None  # Plotly date axes use milliseconds
+    return pd.DataFrame({series.name: centers, "count": counts}), width
@@ -0,0 +1,126 @@
+"""One-pass column profile shared by filters and axis pickers.
+
+A profile is computed once per dataset version and cached, so widgets read
+cardinality and unique values from it instead of rescanning the frame on
+every rerun and for every chart.
+"""
+from dataclasses import dataclass, field
+
+import pandas as pd
+
+from aarekha import cache
+
+# Unique values are kept for columns with at most this many distinct values.
+UNIQUE_VALUES_CAP = 10000
+TOP_VALUES = 5
+
+_cache = cache.region("profiles")
+
+
+@dataclass
+class ColumnProfile:
+    name: str
+    dtype: str
+    kind: str  # "numeric", "temporal", "categorical" or "text"
+    cardinality: int
+    nulls: int
+    min: object = None
+    max: object = None
+    quantiles: dict = None  # {0.25: ..., 0.5: ..., 0.75: ...} for numeric columns
+    top_values: list = field(default=None, repr=False)  # [(value, count), ...] most frequent first
+    unique_values: list = field(default=None, repr=False)
+
+    @property
+    def is_numeric(self):
+        return self.kind == "numeric"
+
+    @property
+    def is_temporal(self):
+        return self.kind == "temporal"
+
+    @property
+    def is_categorical(self):
+        return self.kind in ("categorical", "text")
+
+
+@dataclass
+class DatasetProfile:
+    version: str
+    rows: int
+    columns: dict
+
+    def __getitem__(self, name):
+        return self.columns[name]
+
+    def __contains__(self, name):
+        return name in self.columns
+
+    @property
+    def names(self):
+        return list(self.columns)
+
+    @property
+    def numeric_columns(self):
+        return [name for name, col in self.columns.items() if col.is_numeric]
+
+    @property
+    def temporal_columns(self):
+        return [name for name, col in self.columns.items() if col.is_temporal]
+
+    def filterable_columns(self, max_unique=20):
+        """Low-cardinality text/categorical columns offered as per-chart filters."""
+        return [
+            name for name, col in self.columns.items()
+            if col.is_categorical and col.cardinality < max_unique
+        ]
+
+
+def _classify(series):
+    if pd.api.types.is_numeric_dtype(series):
+        return "numeric"
+    if pd.api.types.is_datetime64_any_dtype(series):
+        return "temporal"
+    if isinstance(series.dtype, pd.CategoricalDtype):
+        return "categorical"
+    return "text"
+
+
+def profile_column(name, series):
+    kind = _classify(series)
+    valid = series.dropna()
+    uniques = valid.unique()
+    col = ColumnProfile(
+        name=name,
+        dtype=str(series.dtype),
+        kind=kind,
+        cardinality=len(uniques),
+        nulls=len(series) - len(valid),
+    )
+    if len(uniques) <= UNIQUE_VALUES_CAP:
+        col.unique_values = uniques.tolist()
+    if kind in ("numeric", "temporal") and len(valid):
+        col.min, col.max = valid.min(), valid.max()
+    if kind == "numeric" and len(valid) and not pd.api.types.is_bool_dtype(valid):
+        col.quantiles = valid.quantile([0.25, 0.5, 0.75]).to_dict()
+    if kind in ("categorical", "text") and len(valid):
+        top = valid.value_counts().head(TOP_VALUES)
+        top = top[top > 0]
+        col.top_values = list(zip(top.index.tolist(), top.tolist()))
+    return col
+
+
+def build_profile(df, version):
+    return DatasetProfile(
+        version=version,
+        rows=len(df),
+        columns={str(name): profile_column(str(name), df[name]) for name in dict.fromkeys(df.columns)},
+    )
+
+
+def get_profile(df, version):
+    """Return the cached profile for ``version``, building it on first use."""
+    profile = _cache.get(version)
+    if profile is None:
+        profile = build_profile(df, version)
+        _cache.put(version, profile)
+    return profile
@@ -0,0 +1,152 @@
+"""Prompt templates and the token-budgeted dataset descriptor.
+
+Instead of pasting 100 raw CSV rows, prompts describe the data with a compact
+per-column summary (type, cardinality, top values, quantiles, date range)
+plus a few sampled rows, trimmed until it fits ``PLAN_TOKEN_BUDGET`` /
+``INSIGHT_TOKEN_BUDGET`` tokens.
+"""
+import os
+
+import pandas as pd
+
+try:
+    import tiktoken
+except ImportError:  # optional; falls back to a character-based estimate
+    tiktoken = None
+
+# Bump when a prompt changes so cached LLM responses are not reused
+PLAN_PROMPT_VERSION = 2
+INSIGHT_PROMPT_VERSION = 2
+
+PLAN_TOKEN_BUDGET = int(os.environ.get("AAREKHA_PLAN_TOKEN_BUDGET", "1500"))
+INSIGHT_TOKEN_BUDGET = int(os.environ.get("AAREKHA_INSIGHT_TOKEN_BUDGET", "600"))
+SAMPLE_ROW_STEPS = (10, 5, 3, 0)
+TOP_VALUE_STEPS = (5, 3, 1)
+
+SYSTEM_PROMPT = """
+You are a senior data analyst helping businesses understand their data through effective visual storytelling.
+Based on the dataset summary provided, intelligently recommend the most appropriate charts and write a meaningful, user-friendly insight for each.
+For each chart:
+- Choose the most suitable chart type from this list: Bar, Line, Scatter, Pie, Histogram, Heatmap, Box, Area, Bubble, Stacked Bar.
+- Pick logical x-axis and y-axis columns based on data patterns (e.g., time series, categories, quantities, numerical values).
+- If the dataset lacks numeric columns, use count-based aggregations (e.g., count of orders by category, date, or other categorical columns) for y-axis or values, and prioritize Bar, Pie, Histogram, or Heatmap charts.
+- For Line, Scatter, Box, Area, and Bubble charts, ensure the y-axis is a numeric column (e.g., sales, revenue, quantity, or aggregated counts). If no numeric columns exist, avoid these chart types.
+- Write the insight as **three clearly separated bullet points** in a brief tone:
+  - **Key Observation:** A brief summary of what the chart reveals (e.g., trend, peak, dip, comparison, correlation).
+  - **Business Impact:** What this trend or insight means for the business. Focus on how it helps or hurts growth, revenue, efficiency, etc.
+  - **Recommended Action:** Suggest a clear, practical step the business can take based on the insight (e.g., optimize, investigate, invest, improve, explore further).
+Respond only in this valid JSON list format, ensuring proper escaping of special characters (e.g., newlines, tabs):
+[
+  {
+    "chart_type": "Bar",
+    "x": "column_name",
+    "y": "Order Count",
+    "insight": "- **Key Observation:** Description.\\n- **Business Impact:** Description.\\n- **Recommended Action:** Description."
+  }
+]
+"""
+
+_encoding = None
+
+
+def count_tokens(text, model="gpt-3.5-turbo"):
+    """Exact count with tiktoken when installed, otherwise ~4 characters per token."""
+    global _encoding
+    if tiktoken is not None:
+        if _encoding is None:
+            _encoding = tiktoken.encoding_for_model(model)
+        return len(_encoding.encode(text))
+    return (len(text) + 3) // 4
+
+
+def count_message_tokens(messages, model="gpt-3.5-turbo"):
+    # Each chat message carries a few tokens of framing.
+    return sum(count_tokens(m["content"], model) + 4 for m in messages) + 2
+
+
+def _fmt(value):
+    if isinstance(value, float):
+        return f"{value:.4g}"
+    if isinstance(value, pd.Timestamp):
+        return value.strftime("%Y-%m-%d") if value == value.normalize() else str(value)
+    text = str(value)
+    return text if len(text) <= 40 else text[:37] + "..."
+
+
+def _column_line(col, top_values, totals=None):
+    # ``totals`` (whole-file ingest stats of a sampled dataset) replace the
+    # sample's cardinality, null count and numeric range; date ranges (parsed
+    # only after sampling) stay the sample's
+    cardinality, nulls, lo, hi = col.cardinality, col.nulls, col.min, col.max
+    if totals is not None:
+        cardinality = f"over {totals.distinct:,}" if totals.distinct_capped else totals.distinct
+        nulls = totals.nulls
+        if col.is_numeric and totals.min is not None:
+            lo, hi = totals.min, totals.max
+    line = f"- {col.name} ({col.kind}, {col.dtype}): {cardinality} distinct, {nulls} nulls"
+    if col.is_numeric and lo is not None:
+        q = col.quantiles or {}
+        parts = [f"min {_fmt(lo)}"]
+        parts += [f"{label} {_fmt(q[p])}" for p, label in ((0.25, "p25"), (0.5, "median"), (0.75, "p75")) if p in q]
+        parts.append(f"max {_fmt(hi)}")
+        line += ", " + ", ".join(parts)
+    elif col.is_temporal and col.min is not None:
+        line += f", range {_fmt(col.min)} to {_fmt(col.max)}"
+    elif col.top_values and top_values:
+        line += ", top: " + ", ".join(f"{_fmt(v)} ({n})" for v, n in col.top_values[:top_values])
+    return line
+
+
+def describe_dataset(profile, sample, token_budget=PLAN_TOKEN_BUDGET, total_rows=None, stats=None):
+    """Compact text description of a dataset that fits ``token_budget`` tokens.
+
+    ``stats`` are the whole-file :class:`~aarekha.ingest.ColumnStats` of a
+    sampled dataset. Sampled rows are dropped first, then top values are
+    shortened, and as a last resort trailing columns are summarized as a count.
+    """
+    stats = stats or {}
+    header = f"Rows: {profile.rows:,}"
+    if total_rows and total_rows != profile.rows:
+        kept = "quantiles, top values and date ranges" if stats else "statistics"
+        header = f"Rows: {total_rows:,} ({kept} below are from a uniform sample of {profile.rows:,} rows)"
+    columns = list(profile.columns.values())
+    for top_values in TOP_VALUE_STEPS:
+        lines = [_column_line(col, top_values, stats.get(col.name)) for col in columns]
+        for n_rows in SAMPLE_ROW_STEPS:
+            text = "\n".join([header, "Columns:"] + lines)
+            if n_rows and len(sample):
+                rows = sample.head(n_rows).to_csv(index=False).strip()
+                text += f"\nSample rows (CSV):\n{rows}"
+            if count_tokens(text) <= token_budget:
+                return text
+    # Very wide tables: keep as many column lines as fit.
+    kept = [header, "Columns:"]
+    for i, line in enumerate(lines):
+        tail = f"... and {len(lines) - i} more columns"
+        if count_tokens("\n".join(kept + [line, tail])) > token_budget:
+            return "\n".join(kept + [tail])
+        kept.append(line)
+    return "\n".join(kept)
+
+
+def plan_messages(descriptor, num_charts):
+    return [
+        {"role": "system", "content": SYSTEM_PROMPT},
+        {"role": "user", "content": f"Here is a dataset summary:\n{descriptor}\n\nGenerate {num_charts} intelligent chart recommendations."},
+    ]
+
+
+def insight_messages(chart_type, x_axis, y_axis, descriptor):
+    prompt = f"""
+Given this chart config with x={x_axis}, y={y_axis or 'count'}, type={chart_type}, generate a business insight using the 3-bullet format in a brief tone.
+Data summary:
+{descriptor}
+Respond in valid JSON format, ensuring proper escaping of special characters:
+{{
+  "insight": "- **Key Observation:** Description.\\n- **Business Impact:** Description.\\n- **Recommended Action:** Description."
+}}
+"""
+    return [
+        {"role": "system", "content": SYSTEM_PROMPT},
+        {"role": "user", "content": prompt},
+    ]
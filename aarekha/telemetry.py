@@ -0,0 +1,223 @@
+"""Hot-path instrumentation: named timing spans and memory high-water marks.
+
+Wrap a stage in ``with span("figure.build", chart_type=...)``. Every finished
+span is appended to a rotating JSONL log, aggregated into per-name histograms
+that are written out in the Prometheus text format, and collected into the
+current :class:`Trace` (one per app rerun) for the in-app debug panel.
+Set ``AAREKHA_TELEMETRY=0`` to turn it all off.
+"""
+import contextvars
+import json
+import logging
+import os
+import threading
+import time
+from contextlib import contextmanager
+from dataclasses import asdict, dataclass, field
+from logging.handlers import RotatingFileHandler
+
+try:
+    import resource
+except ImportError:  # not available on Windows
+    resource = None
+
+from aarekha import cache
+from aarekha.cache import CACHE_DIR
+
+ENABLED = os.environ.get("AAREKHA_TELEMETRY", "1") != "0"
+TELEMETRY_DIR = os.path.join(CACHE_DIR, "telemetry")
+SPAN_LOG = os.path.join(TELEMETRY_DIR, "spans.jsonl")
+METRICS_FILE = os.path.join(TELEMETRY_DIR, "metrics.prom")
+LOG_MB = float(os.environ.get("AAREKHA_TELEMETRY_LOG_MB", "10"))
+LOG_BACKUPS = 5
+# Histogram bucket bounds in seconds.
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+_current = contextvars.ContextVar("aarekha_trace", default=None)
+_stats = {}
+_lock = threading.Lock()
+_logger = None
+
+
+def peak_rss_mb():
+    """Process resident-memory high-water mark, in MB (None where unsupported)."""
+    if resource is None:
+        return None
+    # ru_maxrss is KiB on Linux
+    return round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1)
+
+
+@dataclass
+class Span:
+    name: str
+    start: float
+    duration: float
+    attrs: dict = field(default_factory=dict)
+    peak_rss_mb: float = None
+    thread: str = None
+    error: str = None
+
+
+class Trace:
+    """Spans recorded while this trace is current, e.g. during one rerun."""
+
+    def __init__(self, label):
+        self.label = label
+        self.started = time.time()
+        self.spans = []
+        self._lock = threading.Lock()
+
+    def add(self, span):
+        with self._lock:
+            self.spans.append(span)
+
+    def slowest(self, n=15):
+        with self._lock:
+            return sorted(self.spans, key=lambda s: s.duration, reverse=True)[:n]
+
+    @property
+    def peak_rss_mb(self):
+        peaks = [s.peak_rss_mb for s in self.spans if s.peak_rss_mb is not None]
+        return max(peaks) if peaks else peak_rss_mb()
+
+
+def _span_logger():
+    global _logger
+    if _logger is None:
+        logger = logging.getLogger("aarekha.telemetry")
+        logger.propagate = False
+        logger.setLevel(logging.INFO)
+        try:
+            os.makedirs(TELEMETRY_DIR, exist_ok=True)
+            handler = RotatingFileHandler(SPAN_LOG, maxBytes=int(LOG_MB * 1024 * 1024), backupCount=LOG_BACKUPS)
+            handler.setFormatter(logging.Formatter("%(message)s"))
+            logger.addHandler(handler)
+        except OSError:
+            logger.addHandler(logging.NullHandler())
+        _logger = logger
+    return _logger
+
+
+def _record(span):
+    trace = _current.get()
+    if trace is not None:
+        trace.add(span)
+    with _lock:
+        stats = _stats.setdefault(span.name, {"count": 0, "sum": 0.0, "errors": 0, "buckets": [0] * len(BUCKETS)})
+        stats["count"] += 1
+        stats["sum"] += span.duration
+        stats["errors"] += span.error is not None
+        for i, bound in enumerate(BUCKETS):
+            if span.duration <= bound:
+                stats["buckets"][i] += 1
+    entry = asdict(span)
+    if trace is not None:
+        entry["trace"] = trace.label
+    _span_logger().info(json.dumps(entry, default=str))
+
+
+@contextmanager
+def span(name, **attrs):
+    """Time the block as span ``name``; the yielded dict accepts extra attributes."""
+    if not ENABLED:
+        yield attrs
+        return
+    start = time.time()
+    started = time.perf_counter()
+    error = None
+    try:
+        yield attrs
+    except BaseException as e:
+        error = type(e).__name__
+        raise
+    finally:
+        _record(Span(
+            name, start, time.perf_counter() - started, attrs,
+            peak_rss_mb(), threading.current_thread().name, error,
+        ))
+
+
+def event(name, **attrs):
+    """Record a zero-length span, e.g. for a retry."""
+    if ENABLED:
+        _record(Span(name, time.time(), 0.0, attrs, peak_rss_mb(), threading.current_thread().name))
+
+
+def start_trace(label):
+    trace = Trace(label)
+    _current.set(trace)
+    return trace
+
+
+def current_trace():
+    return _current.get()
+
+
+def bind(fn):
+    """Run ``fn`` in a copy of the caller's context, so pool threads report to its trace."""
+    context = contextvars.copy_context()
+    return lambda *args, **kwargs: context.run(fn, *args, **kwargs)
+
+
+def finish_trace(trace):
+    if _current.get() is trace:
+        _current.set(None)
+    if ENABLED:
+        write_prometheus()
+
+
+def _label(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def prometheus_text():
+    with _lock:
+        stats = {name: dict(s, buckets=list(s["buckets"])) for name, s in _stats.items()}
+    lines = [
+        "# HELP aarekha_span_seconds Wall-clock time of instrumented stages.",
+        "# TYPE aarekha_span_seconds histogram",
+    ]
+    for name, s in sorted(stats.items()):
+        label = _label(name)
+        for bound, count in zip(BUCKETS, s["buckets"]):
+            lines.append(f'aarekha_span_seconds_bucket{{span="{label}",le="{bound}"}} {count}')
+        lines.append(f'aarekha_span_seconds_bucket{{span="{label}",le="+Inf"}} {s["count"]}')
+        lines.append(f'aarekha_span_seconds_sum{{span="{label}"}} {s["sum"]:.6f}')
+        lines.append(f'aarekha_span_seconds_count{{span="{label}"}} {s["count"]}')
+    lines += [
+        "# HELP aarekha_span_errors_total Instrumented stages that raised.",
+        "# TYPE aarekha_span_errors_total counter",
+    ]
+    lines += [f'aarekha_span_errors_total{{span="{_label(name)}"}} {s["errors"]}' for name, s in sorted(stats.items())]
+    regions = cache.stats()["regions"]
+    for metric, kind, help_text, field_name in (
+        ("aarekha_cache_hits_total", "counter", "Shared cache lookups that found an entry.", "hits"),
+        ("aarekha_cache_spill_hits_total", "counter", "Shared cache hits read back from a spill file.", "spill_hits"),
+        ("aarekha_cache_misses_total", "counter", "Shared cache lookups that found nothing.", "misses"),
+        ("aarekha_cache_evictions_total", "counter", "Entries evicted from memory (dropped or spilled).", "evictions"),
+        ("aarekha_cache_resident_bytes", "gauge", "Estimated bytes held in memory per cache region.", "resident_bytes"),
+        ("aarekha_cache_spilled_bytes", "gauge", "Bytes spilled to memory-mapped files per cache region.", "spilled_bytes"),
+    ):
+        lines += [f"# HELP {metric} {help_text}", f"# TYPE {metric} {kind}"]
+        lines += [f'{metric}{{region="{_label(name)}"}} {row[field_name]}' for name, row in sorted(regions.items())]
+    peak = peak_rss_mb()
+    if peak is not None:
+        lines += [
+            "# HELP aarekha_peak_rss_bytes Resident-memory high-water mark of the process.",
+            "# TYPE aarekha_peak_rss_bytes gauge",
+            f"aarekha_peak_rss_bytes {int(peak * 1024 * 1024)}",
+        ]
+    return "\n".join(lines) + "\n"
+
+
+def write_prometheus(path=None):
+    """Write the metrics for a node-exporter style textfile collector."""
+    path = path or METRICS_FILE
+    try:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, "w") as f:
+            f.write(prometheus_text())
+        os.replace(tmp_path, path)
+    except OSError:
+        pass
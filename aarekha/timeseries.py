@@ -0,0 +1,153 @@
+"""Date indexes and per-period rollups for time-series charts.
+
+Each datetime column gets a :class:`TimeIndex` once per dataset version: the
+row order sorted by time (so a date range is two binary searches) and a day
+code per row. Line and Area charts over a date axis are served from rollup
+cubes (row count, sum and non-null count of every numeric column per day,
+week, month and quarter) that are built together for a (dataset version,
+filter mask, column) and cached; the finest granularity within
+``POINT_BUDGET`` points is drawn.
+"""
+import os
+from dataclasses import dataclass
+
+import numpy as np
+import pandas as pd
+
+from aarekha import cache, lod, telemetry
+
+# Most periods drawn for one series; coarser granularities are used above it.
+POINT_BUDGET = int(os.environ.get("AAREKHA_SERIES_POINTS", "1000"))
+# Finest first; values are pandas period frequencies.
+GRANULARITIES = {"day": None, "week": "W", "month": "M", "quarter": "Q"}
+DAY_NS = 86_400 * 10**9
+_NAT = np.iinfo(np.int64).min
+
+_rollups = cache.region("rollups")
+
+
+def _naive(series):
+    # Time zones are dropped in favour of wall-clock time, which is what
+    # date pickers and period boundaries are expressed in
+    if getattr(series.dtype, "tz", None) is not None:
+        series = series.dt.tz_localize(None)
+    return series.to_numpy(dtype="datetime64[ns]").view("int64")
+
+
+class TimeIndex:
+    """Rows of one datetime column sorted by time, plus a day code per row."""
+
+    def __init__(self, series):
+        ns = _naive(series)
+        self.size = len(ns)
+        rows = np.flatnonzero(ns != _NAT)
+        self.order = rows[np.argsort(ns[rows], kind="stable")]
+        self.sorted = ns[self.order]
+        # Days are numbered along the sorted order; missing timestamps get -1
+        sorted_days = self.sorted // DAY_NS
+        starts = np.flatnonzero(np.diff(sorted_days)) + 1
+        self.day_values = sorted_days[np.concatenate(([0], starts))] if len(sorted_days) else sorted_days
+        self.day_codes = np.full(self.size, -1, dtype=np.int64)
+        self.day_codes[self.order] = np.cumsum(np.diff(sorted_days, prepend=sorted_days[:1]) != 0)
+
+    @staticmethod
+    def _ns(value):
+        value = pd.Timestamp(value)
+        return (value.tz_localize(None) if value.tz is not None else value).value
+
+    def range_mask(self, start=None, stop=None):
+        """Mask for ``start <= t < stop`` (either end open when None).
+
+        None is returned when every timestamp is inside the range, so a
+        range spanning the whole column keeps rows without a date, like an
+        unrestricted multiselect does.
+        """
+        lo = 0 if start is None else int(np.searchsorted(self.sorted, self._ns(start), side="left"))
+        hi = len(self.sorted) if stop is None else int(np.searchsorted(self.sorted, self._ns(stop), side="left"))
+        if lo == 0 and hi == len(self.sorted):
+            return None
+        mask = np.zeros(self.size, dtype=bool)
+        mask[self.order[lo:hi]] = True
+        return mask
+
+
+@dataclass
+class Rollup:
+    granularity: str
+    rows: pd.Series  # rows per period, indexed by period start
+    sums: pd.DataFrame  # per numeric column
+    counts: pd.DataFrame  # non-null values per numeric column
+
+    def __len__(self):
+        return len(self.rows)
+
+    def series(self, x, y, how="sum"):
+        """``{x: period start, y: sum or mean}`` for periods where ``y`` has values."""
+        present = self.counts[y] > 0
+        values = self.sums[y] if how == "sum" else self.sums[y] / self.counts[y]
+        values = values[present]
+        return pd.DataFrame({x: values.index, y: values.to_numpy()})
+
+
+def _day_rollup(index, df, columns, mask):
+    codes = index.day_codes if mask is None else np.where(mask, index.day_codes, -1)
+    keep = codes >= 0
+    codes = codes[keep]
+    n = len(index.day_values)
+    rows = np.bincount(codes, minlength=n)
+    sums, counts = {}, {}
+    for col in columns:
+        values = lod._as_float(df[col])[keep]
+        valid = ~np.isnan(values)
+        sums[col] = np.bincount(codes[valid], weights=values[valid], minlength=n)
+        counts[col] = np.bincount(codes[valid], minlength=n)
+    present = rows > 0
+    days = pd.DatetimeIndex((index.day_values[present] * DAY_NS).astype("datetime64[ns]"))
+    return Rollup(
+        "day",
+        pd.Series(rows[present], index=days),
+        pd.DataFrame({col: v[present] for col, v in sums.items()}, index=days, columns=columns),
+        pd.DataFrame({col: v[present] for col, v in counts.items()}, index=days, columns=columns),
+    )
+
+
+def _coarsen(day, granularity, freq):
+    starts = day.rows.index.to_period(freq).start_time
+    return Rollup(
+        granularity,
+        day.rows.groupby(starts).sum(),
+        day.sums.groupby(starts).sum(),
+        day.counts.groupby(starts).sum(),
+    )
+
+
+def rollups(dataset, mask, mask_id, x):
+    """Rollups of every granularity for column ``x`` under ``mask``, finest first.
+
+    ``mask_id`` identifies ``mask`` (see ``FilterEngine.selection_id``) and is
+    part of the cache key together with the dataset version.
+    """
+    key = (dataset.key, mask_id, x)
+    cached = _rollups.get(key)
+    if cached is not None:
+        return cached
+    with telemetry.span("timeseries.rollup", column=x) as attrs:
+        day = _day_rollup(dataset.filters.time_index(x), dataset.df, dataset.profile.numeric_columns, mask)
+        cached = [day] + [_coarsen(day, name, freq) for name, freq in GRANULARITIES.items() if freq]
+        attrs["days"] = len(day)
+    _rollups.put(key, cached)
+    return cached
+
+
+def pick(levels, budget=POINT_BUDGET):
+    """Finest rollup with at most ``budget`` periods (the coarsest if none fits)."""
+    for rollup in levels:
+        if len(rollup) <= budget:
+            return rollup
+    return levels[-1]
+
+
+def series(dataset, mask, mask_id, x, y, how="sum", budget=POINT_BUDGET):
+    """Return ``(frame, granularity)`` for a Line/Area chart of ``y`` over date column ``x``."""
+    rollup = pick(rollups(dataset, mask, mask_id, x), budget)
+    return rollup.series(x, y, how), rollup.granularity
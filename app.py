@@ -1,22 +1,14 @@
 import streamlit as st
-import pandas as pd
-import plotly.express as px
 import openai
 import json
-import io
-from pptx import Presentation
-from pptx.util import Inches, Pt
-from pptx.dml.color import RGBColor
-from reportlab.pdfgen import canvas
-from reportlab.lib.pagesizes import letter
-from reportlab.lib.utils import ImageReader
 import datetime
 import uuid
-import gspread
 import time
-import requests
-from requests.exceptions import RequestException
-from google.oauth2.service_account import Credentials
+from aarekha import charts, engine, export, llm_cache, llm_client, telemetry
+from aarekha import cache as shared_cache
+from aarekha import feedback as feedback_sink
+from aarekha.filters import DateRange
+from aarekha import ingest as ingest_formats
 
 # Validate OpenAI API key
 if not st.secrets.get("OPENAI_API_KEY"):
@@ -33,6 +25,9 @@ if "user_id" not in st.session_state:
 # --- Streamlit Page Config ---
 st.set_page_config(page_title="Aarekha AI Charts", layout="wide")
 
+# Every instrumented stage of this rerun is collected for the debug panel
+rerun_trace = telemetry.start_trace(f"rerun:{st.session_state.user_id[:8]}")
+
 # --- Set Full Background Color and Customize Styling ---
 st.markdown(
     """
@@ -169,42 +164,54 @@ st.markdown("""
 
 # --- Upload Section ---
 st.markdown("<h2 style='color: #1e40af; margin-bottom: 10px;'>📂 Upload Your Dataset</h2>", unsafe_allow_html=True)
-st.markdown("<p style='color: #4b5563; margin-bottom: 15px;'>Upload a .csv or .xlsx file to get started. Aarekha will analyze your data and generate smart charts & insights for you.</p>", unsafe_allow_html=True)
+st.markdown("<p style='color: #4b5563; margin-bottom: 15px;'>Upload a CSV (optionally .gz/.zst compressed), Excel, Parquet or Feather/Arrow file to get started. Aarekha will analyze your data and generate smart charts & insights for you.</p>", unsafe_allow_html=True)
 
-file = st.file_uploader("Upload CSV or Excel file", type=["csv", "xlsx"])
+file = st.file_uploader("Upload CSV, Excel, Parquet or Arrow file", type=ingest_formats.UPLOAD_TYPES)
 
 # --- Helper Functions ---
-def auto_group_large_data(df, x_col):
-    if df[x_col].nunique() > 50:
-        return df.groupby(x_col).size().sort_values(ascending=False).head(20).index.tolist()
-    return df[x_col].unique()
+def feedback_destination():
+    # Secrets are read here, on the script thread; the sink itself is built by the worker
+    credentials = st.secrets.get("gspread")
+    return lambda: feedback_sink.sink_from_env(lambda: feedback_sink.GSheetSink(credentials))
 
 def save_feedback_to_gsheet(email, feedback):
+    # Queued locally and appended to the sheet in batches by a background worker
     try:
-        scope = ["https://spreadsheets.google.com/feeds", "https://www.googleapis.com/auth/drive"]
-        creds = Credentials.from_service_account_info(st.secrets["gspread"], scopes=scope)
-        client = gspread.authorize(creds)
-        sheet = client.open("Aarekha Feedback").sheet1
         timestamp = datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S")
         chart_count = st.session_state.get("chart_count", "N/A")
-        sheet.append_row([timestamp, email, chart_count, feedback])
+        feedback_sink.submit([timestamp, email, chart_count, feedback], feedback_destination())
     except Exception as e:
         st.error(f"❌ Failed to save feedback: {e}")
 
 # --- Main Logic ---
 if file:
     try:
-        df = pd.read_csv(file, encoding='latin1') if file.name.endswith(".csv") else pd.read_excel(file)
+        data = file.getvalue()
+        # The upload is hashed once, not on every rerun
+        if st.session_state.get("upload_id") != file.file_id:
+            st.session_state.upload_digest = ingest_formats.content_hash(data)
+            st.session_state.upload_id = file.file_id
+        digest = st.session_state.upload_digest
+        sheets, all_columns = engine.inspect_upload(file.name, data, digest=digest)
+        with st.expander("⚙️ Load options"):
+            sheet = None
+            if sheets and len(sheets) > 1:
+                sheet = st.selectbox("Sheet", sheets, key="load_sheet")
+                all_columns = engine.inspect_upload(file.name, data, sheet, digest)[1]
+            # Only the selected columns are read from the file
+            load_columns = st.multiselect("Columns to load", all_columns, default=all_columns, key="load_columns")
+        if not load_columns:
+            st.warning("⚠️ Select at least one column to load.")
+            st.stop()
+        dataset = engine.open_dataset(file.name, data, sheet, None if len(load_columns) == len(all_columns) else load_columns, digest)
     except Exception as e:
         st.error(f"❌ Failed to load file: {e}")
         st.stop()
+    df, ingest, profile = dataset.df, dataset.ingest, dataset.profile
+    st.caption(f"⚡ Dataset cache: {ingest.status} ({ingest.rows:,} rows, key {ingest.key[:12]})")
+    if ingest.sampled:
+        st.warning(f"⚠️ This file is larger than the memory budget. Charts use a uniform sample of {ingest.rows:,} out of {ingest.total_rows:,} rows.")
 
-    # Preprocess: Create a count-based column for datasets without numeric columns
-    numeric_columns = [col for col in df.columns if pd.api.types.is_numeric_dtype(df[col])]
-    if not numeric_columns:
-        df['Order Count'] = 1
-        numeric_columns = ['Order Count']
-    
     st.dataframe(df.head(), use_container_width=True)
 
     st.sidebar.header("🔍 Global Filters")
@@ -212,235 +219,118 @@ if file:
     filter_values = {}
 
     for col in filter_columns:
-        if col in df.columns:
-            unique_vals = df[col].dropna().unique()
+        if col in profile and profile[col].is_temporal and profile[col].min is not None:
+            # Date columns filter by range over the sorted time index instead of by value
+            first_day, last_day = profile[col].min.date(), profile[col].max.date()
+            picked = st.sidebar.date_input(f"Filter by {col}", value=(first_day, last_day), min_value=first_day, max_value=last_day, key=f"global_filter_{col}")
+            # Until both ends are picked the range stays open
+            if isinstance(picked, (list, tuple)) and len(picked) == 2:
+                filter_values[col] = DateRange.between(*picked)
+        elif col in profile:
+            unique_vals = profile[col].unique_values
+            if unique_vals is None:
+                unique_vals = df[col].dropna().unique().tolist()
             selection = st.sidebar.multiselect(f"Filter by {col}", options=unique_vals, default=unique_vals, key=f"global_filter_{col}")
             filter_values[col] = selection
 
-    filtered_df = df.copy()
-    for col, vals in filter_values.items():
-        filtered_df = filtered_df[filtered_df[col].isin(vals)]
+    # One cached mask per (column, selection); no copies of the frame are made here
+    with telemetry.span("filter.global"):
+        global_mask = dataset.filters.combine(filter_values)
 
     num_charts = st.slider("How many charts to auto-generate?", 1, 10, 5)
 
-    if "chart_plans" not in st.session_state or "data_hash" not in st.session_state or st.session_state.data_hash != hash(df.head(100).to_csv(index=False)) or st.session_state.chart_count != num_charts:
-        system_msg = """
-You are a senior data analyst helping businesses understand their data through effective visual storytelling.
-Based on the sample dataset provided, intelligently recommend the most appropriate charts and write a meaningful, user-friendly insight for each.
-For each chart:
-- Choose the most suitable chart type from this list: Bar, Line, Scatter, Pie, Histogram, Heatmap, Box, Area, Bubble, Stacked Bar.
-- Pick logical x-axis and y-axis columns based on data patterns (e.g., time series, categories, quantities, numerical values).
-- If the dataset lacks numeric columns, use count-based aggregations (e.g., count of orders by category, date, or other categorical columns) for y-axis or values, and prioritize Bar, Pie, Histogram, or Heatmap charts.
-- For Line, Scatter, Box, Area, and Bubble charts, ensure the y-axis is a numeric column (e.g., sales, revenue, quantity, or aggregated counts). If no numeric columns exist, avoid these chart types.
-- Write the insight as **three clearly separated bullet points** in a brief tone:
-  - **Key Observation:** A brief summary of what the chart reveals (e.g., trend, peak, dip, comparison, correlation).
-  - **Business Impact:** What this trend or insight means for the business. Focus on how it helps or hurts growth, revenue, efficiency, etc.
-  - **Recommended Action:** Suggest a clear, practical step the business can take based on the insight (e.g., optimize, investigate, invest, improve, explore further).
-Respond only in this valid JSON list format, ensuring proper escaping of special characters (e.g., newlines, tabs):
-[
-  {
-    "chart_type": "Bar",
-    "x": "column_name",
-    "y": "Order Count",
-    "insight": "- **Key Observation:** Description.\\n- **Business Impact:** Description.\\n- **Recommended Action:** Description."
-  }
-]
-"""
-        sample = df.head(100).to_csv(index=False)
+    plan_request, plan_key = engine.plan_request(dataset, num_charts)
+
+    plans_stale = "chart_plans" not in st.session_state or "data_hash" not in st.session_state or st.session_state.data_hash != ingest.key or st.session_state.chart_count != num_charts
+    if plans_stale:
+        cached_plans = llm_cache.get_plan(plan_key, num_charts)
+        if cached_plans:
+            st.session_state.chart_plans = cached_plans
+            st.session_state.insights = [plan.get("insight", "") for plan in cached_plans]
+            st.session_state.data_hash = ingest.key
+            st.session_state.chart_count = num_charts
+            plans_stale = False
+            st.caption("⚡ Chart recommendations served from cache")
+
+    chart_type_options = charts.chart_types()
+
+    def render_insight(slot, text):
+        slot.markdown(f"<div class='custom-card' style='padding: 10px; font-size: 14px; color: #333'><strong>Insight:</strong><br>{text.replace(chr(10), '<br>')}</div>", unsafe_allow_html=True)
+
+    regenerate_all = st.button("🔁 Regenerate All Insights", key="regen_all")
+    insight_jobs = {}
+    insight_slots = {}
+
+    # Kept in session state so the report fragment sees PNGs re-exported by chart fragments
+    png_jobs = st.session_state.setdefault("png_jobs", {})
+    png_slots = {}
+    rendered_charts = set()
+    # While the full script runs, PNG buttons are filled after every chart is drawn;
+    # a fragment rerun of a single chart fills its own button straight away.
+    # "Regenerate All" also only applies to the full run that sends its batch.
+    page = {"full_run": True, "regenerate_all": regenerate_all}
+
+    def fill_png(idx):
         try:
-            with st.spinner("🤖 Analyzing data & generating chart recommendations..."):
-                max_retries = 3
-                for attempt in range(max_retries):
-                    try:
-                        res = openai.ChatCompletion.create(
-                            model="gpt-3.5-turbo",
-                            messages=[
-                                {"role": "system", "content": system_msg},
-                                {"role": "user", "content": f"Here is a data sample:\n{sample}\n\nGenerate {num_charts} intelligent chart recommendations."}
-                            ],
-                            temperature=0.4,
-                            max_tokens=1500,
-                            timeout=30
-                        )
-                        # Clean the response to remove code block markers and control characters
-                        raw_response = res.choices[0].message.content.strip()
-                        if raw_response.startswith("```"):
-                            raw_response = raw_response.split("\n", 1)[1].rsplit("\n", 1)[0]
-                        raw_response = raw_response.replace("\r", "").replace("\t", " ")
-                        # Log raw response for debugging
-                        # with open("api_response_log.txt", "a") as f:
-                        #     f.write(f"{datetime.datetime.now()} | Attempt {attempt + 1} | Response: {raw_response[:500]}...\n")
-                        st.session_state.chart_plans = json.loads(raw_response)
-                        st.session_state.insights = [plan.get("insight", "") for plan in st.session_state.chart_plans]
-                        st.session_state.data_hash = hash(sample)
-                        st.session_state.chart_count = num_charts
-                        break
-                    except json.JSONDecodeError as je:
-                        # with open("api_response_log.txt", "a") as f:
-                        #     f.write(f"{datetime.datetime.now()} | JSON Error: {je} | Raw Response: {raw_response[:500]}...\n")
-                        if attempt < max_retries - 1:
-                            st.warning(f"⚠️ Attempt {attempt + 1} failed due to invalid JSON response: {je}. Retrying in 5 seconds...")
-                            time.sleep(5)
-                        else:
-                            st.error(f"❌ AI chart recommendation failed after {max_retries} attempts due to invalid JSON response: {je}. Falling back to default charts.")
-                            st.session_state.chart_plans = [
-                                {
-                                    "chart_type": "Bar",
-                                    "x": df.columns[0],
-                                    "y": "Order Count",
-                                    "insight": "- **Key Observation:** Default chart generated.\n- **Business Impact:** Limited analysis due to API error.\n- **Recommended Action:** Try again later."
-                                }
-                            ] * num_charts
-                            st.session_state.insights = [plan["insight"] for plan in st.session_state.chart_plans]
-                    except requests.exceptions.RequestException as re:
-                        if attempt < max_retries - 1:
-                            st.warning(f"⚠️ Attempt {attempt + 1} failed due to network issue: {re}. Retrying in 5 seconds...")
-                            time.sleep(5)
-                        else:
-                            st.error(f"❌ AI chart recommendation failed after {max_retries} attempts: {re}. Check your internet connection, API key, or OpenAI status.")
-                            st.session_state.chart_plans = [
-                                {
-                                    "chart_type": "Bar",
-                                    "x": df.columns[0],
-                                    "y": "Order Count",
-                                    "insight": "- **Key Observation:** Default chart generated.\n- **Business Impact:** Limited analysis due to API error.\n- **Recommended Action:** Try again later."
-                                }
-                            ] * num_charts
-                            st.session_state.insights = [plan["insight"] for plan in st.session_state.chart_plans]
+            png_slots[idx].download_button(
+                label="Download PNG",
+                data=png_jobs[idx][1].result(),
+                file_name=f"chart_{idx+1}.png",
+                mime="image/png",
+                key=f"dl_chart_{idx}"
+            )
         except Exception as e:
-            st.error(f"❌ Unexpected error during chart generation: {e}")
-            # with open("error_log.txt", "a") as f:
-            #     f.write(f"{datetime.datetime.now()} | Error: {e} | Raw Response: {raw_response[:500] if 'raw_response' in locals() else 'N/A'}...\n")
-            st.session_state.chart_plans = [
-                {
-                    "chart_type": "Bar",
-                    "x": df.columns[0],
-                    "y": "Order Count",
-                    "insight": "- **Key Observation:** Default chart generated.\n- **Business Impact:** Limited analysis due to error.\n- **Recommended Action:** Try again later."
-                }
-            ] * num_charts
-            st.session_state.insights = [plan["insight"] for plan in st.session_state.chart_plans]
-
-    chart_plans = st.session_state.chart_plans
-    insights = st.session_state.insights
-
-    chart_type_options = ["Bar", "Line", "Scatter", "Pie", "Histogram", "Heatmap", "Box", "Area", "Bubble", "Stacked Bar"]
-    color_palette = px.colors.qualitative.Set3
+            png_slots[idx].warning(f"⚠️ PNG export for Chart {idx+1} failed: {e}")
 
-    ppt = Presentation()
-    blank_slide_layout = ppt.slide_layouts[6]
-    pdf_buffer = io.BytesIO()
-    c = canvas.Canvas(pdf_buffer, pagesize=letter)
-
-    for idx, plan in enumerate(chart_plans):
+    @st.experimental_fragment
+    def render_chart(idx, plan):
+        # Widget changes inside a chart card rerun only this function, not the page
+        png_jobs.pop(idx, None)
         with st.container():
             st.markdown(f"### Chart {idx+1}")
             col1, col2, col3 = st.columns(3)
 
-            default_chart = plan['chart_type'] if plan['chart_type'] in chart_type_options else "Bar"
-            default_x = plan.get('x') if plan.get('x') in df.columns else df.columns[0]
-            default_y = plan.get('y') if plan.get('y') in df.columns else numeric_columns[0]
+            default_chart, default_x, default_y = engine.resolve_plan(dataset, plan)
 
             chart_type = col1.selectbox(f"Chart Type {idx+1}", chart_type_options, index=chart_type_options.index(default_chart), key=f"type_{idx}")
             x_axis = col2.selectbox(f"X-axis {idx+1}", df.columns, index=df.columns.get_loc(default_x), key=f"x_{idx}")
             
             # Deduplicate y_axis_options to prevent multiple 'Order Count'
-            if chart_type in ["Line", "Scatter", "Box", "Area", "Bubble"]:
-                y_axis_options = numeric_columns
-            else:
-                y_axis_options = list(dict.fromkeys(df.columns.tolist()))  # Remove duplicates while preserving order
+            y_axis_options = engine.y_axis_options(dataset, chart_type)
             y_axis = col3.selectbox(
                 f"Y-axis {idx+1}",
                 y_axis_options,
                 index=y_axis_options.index(default_y) if default_y in y_axis_options else 0,
                 key=f"y_{idx}"
-            ) if chart_type not in ["Pie", "Histogram"] else None
+            ) if charts.get_type(chart_type).uses_y else None
             
-            color = col1.color_picker(f"Pick a chart color for Chart {idx+1}", value="#1f77b4", key=f"color_{idx}")
+            color = col1.color_picker(f"Pick a chart color for Chart {idx+1}", value=charts.DEFAULT_COLOR, key=f"color_{idx}")
 
             with st.expander(f"🔧 Optional Filters for Chart {idx+1}"):
                 perchart_filters = {}
-                for col in df.columns:
-                    if df[col].nunique() < 20 and df[col].dtype == "object":
-                        selected = st.multiselect(f"Filter {col}", df[col].unique(), default=df[col].unique(), key=f"filter_{col}_{idx}")
-                        perchart_filters[col] = selected
-
-                chart_df = filtered_df.copy()
-                for col, vals in perchart_filters.items():
-                    chart_df = chart_df[chart_df[col].isin(vals)]
-
-                if chart_df.empty:
+                for col in profile.filterable_columns():
+                    options = profile[col].unique_values
+                    selected = st.multiselect(f"Filter {col}", options, default=options, key=f"filter_{col}_{idx}")
+                    perchart_filters[col] = selected
+
+                with telemetry.span("filter.chart", chart=idx + 1):
+                    chart_mask = dataset.filters.combine(perchart_filters, base=global_mask)
+                surviving = dataset.filters.count(chart_mask)
+                if surviving == 0:
                     st.warning(f"⚠️ Chart {idx+1} has no data after filtering. Please adjust filters.")
-                    continue
+                    return
+                # A bounded sample for the preview and insight; the figure reads the mask itself
+                chart_df = engine.chart_frame(dataset, chart_mask, x_axis, y_axis)
 
-            fig = None
             try:
-                if chart_type == "Bar":
-                    if y_axis and y_axis in numeric_columns:
-                        fig = px.bar(chart_df, x=x_axis, y=y_axis, color_discrete_sequence=[color], hover_data=[x_axis, y_axis])
-                    else:
-                        count_df = chart_df.groupby(x_axis).size().reset_index(name='Order Count')
-                        fig = px.bar(count_df, x=x_axis, y='Order Count', color_discrete_sequence=[color], hover_data=[x_axis, 'Order Count'])
-                elif chart_type == "Histogram":
-                    fig = px.histogram(chart_df, x=x_axis, color_discrete_sequence=[color], hover_data=[x_axis])
-                elif chart_type == "Scatter":
-                    if y_axis and y_axis in numeric_columns:
-                        fig = px.scatter(chart_df, x=x_axis, y=y_axis, color_discrete_sequence=[color], hover_data=[x_axis, y_axis])
-                    else:
-                        st.warning(f"⚠️ Chart {idx+1} failed: Y-axis '{y_axis}' is not numeric. Using bar chart instead.")
-                        count_df = chart_df.groupby(x_axis).size().reset_index(name='Order Count')
-                        fig = px.bar(count_df, x=x_axis, y='Order Count', color_discrete_sequence=[color], hover_data=[x_axis, 'Order Count'])
-                elif chart_type == "Line":
-                    if y_axis and y_axis in numeric_columns:
-                        if chart_df[x_axis].nunique() > 20:
-                            chart_df = chart_df.groupby(x_axis).agg({y_axis: 'mean'}).reset_index()
-                        chart_df = chart_df.nlargest(10, y_axis)
-                        fig = px.line(chart_df, x=x_axis, y=y_axis, color_discrete_sequence=[color], hover_data=[x_axis, y_axis])
-                    else:
-                        st.warning(f"⚠️ Chart {idx+1} failed: Y-axis '{y_axis}' is not numeric. Using bar chart instead.")
-                        count_df = chart_df.groupby(x_axis).size().reset_index(name='Order Count')
-                        fig = px.bar(count_df, x=x_axis, y='Order Count', color_discrete_sequence=[color], hover_data=[x_axis, 'Order Count'])
-                elif chart_type == "Box":
-                    if y_axis and y_axis in numeric_columns:
-                        fig = px.box(chart_df, x=x_axis, y=y_axis, color_discrete_sequence=[color], hover_data=[x_axis, y_axis])
-                    else:
-                        st.warning(f"⚠️ Chart {idx+1} failed: Y-axis '{y_axis}' is not numeric. Using bar chart instead.")
-                        count_df = chart_df.groupby(x_axis).size().reset_index(name='Order Count')
-                        fig = px.bar(count_df, x=x_axis, y='Order Count', color_discrete_sequence=[color], hover_data=[x_axis, 'Order Count'])
-                elif chart_type == "Pie":
-                    pie_data = chart_df[x_axis].value_counts().reset_index()
-                    pie_data.columns = [x_axis, 'count']
-                    fig = px.pie(pie_data, names=x_axis, values='count', color_discrete_sequence=px.colors.qualitative.Set3, hover_data=[x_axis, 'count'])
-                elif chart_type == "Area":
-                    if y_axis and y_axis in numeric_columns:
-                        fig = px.area(chart_df, x=x_axis, y=y_axis, color_discrete_sequence=[color], hover_data=[x_axis, y_axis])
-                    else:
-                        st.warning(f"⚠️ Chart {idx+1} failed: Y-axis '{y_axis}' is not numeric. Using bar chart instead.")
-                        count_df = chart_df.groupby(x_axis).size().reset_index(name='Order Count')
-                        fig = px.bar(count_df, x=x_axis, y='Order Count', color_discrete_sequence=[color], hover_data=[x_axis, 'Order Count'])
-                elif chart_type == "Heatmap":
-                    if y_axis:
-                        pivot = chart_df.pivot_table(index=x_axis, columns=y_axis, aggfunc='size', fill_value=0)
-                        fig = px.imshow(pivot, color_continuous_scale='Viridis', hover_data=None)
-                    else:
-                        count_df = chart_df.groupby(x_axis).size().reset_index(name='Order Count')
-                        fig = px.bar(count_df, x=x_axis, y='Order Count', color_discrete_sequence=[color], hover_data=[x_axis, 'Order Count'])
-                elif chart_type == "Bubble":
-                    if y_axis and y_axis in numeric_columns:
-                        fig = px.scatter(chart_df, x=x_axis, y=y_axis, size=y_axis, color_discrete_sequence=[color], hover_data=[x_axis, y_axis])
-                    else:
-                        st.warning(f"⚠️ Chart {idx+1} failed: Y-axis '{y_axis}' is not numeric. Using bar chart instead.")
-                        count_df = chart_df.groupby(x_axis).size().reset_index(name='Order Count')
-                        fig = px.bar(count_df, x=x_axis, y='Order Count', color_discrete_sequence=[color], hover_data=[x_axis, 'Order Count'])
-                elif chart_type == "Stacked Bar":
-                    if y_axis and y_axis in numeric_columns:
-                        fig = px.bar(chart_df, x=x_axis, y=y_axis, color=x_axis, barmode='stack', color_discrete_sequence=px.colors.qualitative.Pastel, hover_data=[x_axis, y_axis])
-                    else:
-                        count_df = chart_df.groupby([x_axis, y_axis]).size().unstack(fill_value=0).reset_index()
-                        fig = px.bar(count_df, x=x_axis, y=count_df.columns[1:], barmode='stack', color_discrete_sequence=px.colors.qualitative.Pastel, hover_data=[x_axis])
+                # Unchanged charts come straight from the figure cache
+                spec = charts.ChartSpec(chart_type, x_axis, y_axis, color, dataset.filters.selection_id(filter_values, perchart_filters), ingest.key)
+                fig, fallback = charts.get_figure(spec, dataset, chart_mask)
+                if fallback:
+                    st.warning(f"⚠️ Chart {idx+1} failed: {fallback}")
 
                 if fig:
-                    st.plotly_chart(fig, use_container_width=True, key=f"plotly_chart_{idx}_{uuid.uuid4()}")
+                    st.plotly_chart(fig, use_container_width=True, key=f"plotly_chart_{idx}")
 
                 with st.expander(f"🔎 Show Data for Chart {idx+1}"):
                     display_cols = [x_axis] + ([y_axis] if y_axis and y_axis in chart_df.columns else [])
@@ -448,90 +338,147 @@ Respond only in this valid JSON list format, ensuring proper escaping of special
 
                 regenerate = st.button(f"🔁 Regenerate Insight for Chart {idx+1}", key=f"regen_{idx}")
 
-                if regenerate:
-                    try:
-                        prompt = f"""
-                        Given this chart config with x={x_axis}, y={y_axis or 'count'}, type={chart_type}, generate a business insight using the 3-bullet format in a brief tone.
-                        Data sample:\n{chart_df.head(100).to_csv(index=False)}
-                        Respond in valid JSON format, ensuring proper escaping of special characters:
-                        {
-                          "insight": "- **Key Observation:** Description.\\n- **Business Impact:** Description.\\n- **Recommended Action:** Description."
-                        }
-                        """
-                        result = openai.ChatCompletion.create(
-                            model="gpt-3.5-turbo",
-                            messages=[
-                                {"role": "system", "content": system_msg},
-                                {"role": "user", "content": prompt}
-                            ],
-                            temperature=0.3,
-                            max_tokens=600,
-                            timeout=30
-                        )
-                        # Clean the insight response
-                        raw_insight = result.choices[0].message.content.strip()
-                        if raw_insight.startswith("```"):
-                            raw_insight = raw_insight.split("\n", 1)[1].rsplit("\n", 1)[0]
-                        raw_insight = raw_insight.replace("\r", "").replace("\t", " ")
-                        insight_data = json.loads(raw_insight)
-                        insights[idx] = insight_data["insight"]
+                if regenerate or page["regenerate_all"]:
+                    insight_key, insight_request = engine.insight_request(chart_df, chart_type, x_axis, y_axis, surviving)
+                    cached_insight = llm_cache.get_insight(insight_key)
+                    if cached_insight is not None:
+                        insights[idx] = cached_insight
                         st.session_state.insights = insights
-                    except json.JSONDecodeError as je:
-                        st.warning(f"⚠️ Insight regeneration for Chart {idx+1} failed due to invalid JSON: {je}. Keeping previous insight.")
-                        # with open("api_response_log.txt", "a") as f:
-                        #     f.write(f"{datetime.datetime.now()} | Insight JSON Error: {je} | Raw Insight: {raw_insight[:500]}...\n")
-                    except requests.exceptions.RequestException as re:
-                        st.warning(f"⚠️ Insight regeneration for Chart {idx+1} failed due to network issue: {re}. Keeping previous insight.")
-                    except Exception as e:
-                        st.warning(f"⚠️ Insight regeneration for Chart {idx+1} failed: {e}. Keeping previous insight.")
-                        # with open("error_log.txt", "a") as f:
-                        #     f.write(f"{datetime.datetime.now()} | Insight Error: {e} | Raw Insight: {raw_insight[:500] if 'raw_insight' in locals() else 'N/A'}...\n")
-
-                st.markdown(f"<div class='custom-card' style='padding: 10px; font-size: 14px; color: #333'><strong>Insight:</strong><br>{insights[idx].replace(chr(10), '<br>')}</div>", unsafe_allow_html=True)
+                    elif page["regenerate_all"]:
+                        # Sent together after the loop so all charts are requested in parallel
+                        insight_jobs[idx] = (insight_key, insight_request)
+                    else:
+                        try:
+                            insights[idx] = llm_client.complete(**insight_request)
+                            llm_cache.put_insight(insight_key, insights[idx])
+                            st.session_state.insights = insights
+                        except json.JSONDecodeError as je:
+                            st.warning(f"⚠️ Insight regeneration for Chart {idx+1} failed due to invalid JSON: {je}. Keeping previous insight.")
+                        except llm_client.RETRYABLE as re:
+                            st.warning(f"⚠️ Insight regeneration for Chart {idx+1} failed due to network issue: {re}. Keeping previous insight.")
+                        except Exception as e:
+                            st.warning(f"⚠️ Insight regeneration for Chart {idx+1} failed: {e}. Keeping previous insight.")
+                            # with open("error_log.txt", "a") as f:
+                            #     f.write(f"{datetime.datetime.now()} | Insight Error: {e}\n")
+
+                insight_slots[idx] = st.empty()
+                render_insight(insight_slots[idx], insights[idx])
 
                 if fig:
-                    img_bytes = fig.to_image(format="png")
-                    st.download_button(
-                        label="Download PNG",
-                        data=img_bytes,
-                        file_name=f"chart_{idx+1}.png",
-                        mime="image/png",
-                        key=f"dl_chart_{idx}"
-                    )
-
-                    slide = ppt.slides.add_slide(blank_slide_layout)
-                    image_stream = io.BytesIO(img_bytes)
-                    slide.shapes.add_picture(image_stream, Inches(1), Inches(0.5), height=Inches(4.5))
-                    textbox = slide.shapes.add_textbox(Inches(0.5), Inches(5.2), Inches(8.5), Inches(2.5))
-                    tf = textbox.text_frame
-                    tf.word_wrap = True
-                    p = tf.paragraphs[0]
-                    run = p.add_run()
-                    run.text = insights[idx].replace("\n", "\n")
-                    font = run.font
-                    font.size = Pt(12)
-                    font.name = 'Arial'
-                    font.color.rgb = RGBColor(50, 50, 50)
-
-                    image_stream.seek(0)
-                    img_reader = ImageReader(image_stream)
-                    c.drawImage(img_reader, 50, 400, width=500, height=250)
-                    c.setFont("Helvetica", 10)
-                    c.drawString(50, 380, insights[idx].replace("\n", " ")[:400])
-                    c.showPage()
+                    # Rasterized on the background worker; the PNG button is filled in after the page is drawn
+                    png_jobs[idx] = export.rasterize_async(fig)
+                    png_slots[idx] = st.empty()
+                    if not page["full_run"]:
+                        fill_png(idx)
 
             except Exception as e:
                 st.warning(f"⚠️ Chart {idx+1} failed: {e}")
 
-    ppt_buffer = io.BytesIO()
-    ppt.save(ppt_buffer)
-    st.download_button("📊 Download Full Report as PPT", data=ppt_buffer.getvalue(), file_name="Aarekha_Charts_Report.pptx", mime="application/vnd.openxmlformats-officedocument.presentationml.presentation")
+    if plans_stale:
+        def warn_retry(attempt, exc, delay):
+            reason = "invalid JSON response" if isinstance(exc, json.JSONDecodeError) else "network issue"
+            st.warning(f"⚠️ Attempt {attempt} failed due to {reason}: {exc}. Retrying in {delay:.1f} seconds...")
 
-    c.save()
-    pdf_buffer.seek(0)
-    st.download_button("📄 Download Full Report as PDF", data=pdf_buffer, file_name="Aarekha_Charts_Report.pdf", mime="application/pdf")
+        def warn_skip(error):
+            st.warning(f"⚠️ Skipped one malformed chart recommendation: {error}")
+
+        # This call's usage; the process-wide log also holds other sessions' calls
+        plan_usage = {}
+
+        # Each chart is rendered as soon as its object in the streamed JSON array is complete
+        plans = st.session_state.chart_plans = []
+        insights = st.session_state.insights = []
+        status = st.empty()
+        status.info("🤖 Analyzing data & generating chart recommendations...")
+        try:
+            for plan in engine.stream_plans(plan_request, on_retry=warn_retry, on_skip=warn_skip, on_usage=plan_usage.update):
+                status.empty()
+                plans.append(plan)
+                insights.append(plan.get("insight", ""))
+                render_chart(len(plans) - 1, plan)
+                rendered_charts.add(len(plans) - 1)
+            llm_cache.put_plan(plan_key, plans)
+            if plan_usage:
+                st.caption(f"🧮 Chart plan: {plan_usage['prompt_tokens']} prompt tokens, {plan_usage['completion_tokens']} completion tokens, {plan_usage['latency_s']} s")
+            st.session_state.data_hash = ingest.key
+            st.session_state.chart_count = num_charts
+        except json.JSONDecodeError as je:
+            st.error(f"❌ AI chart recommendation failed after {llm_client.MAX_RETRIES} attempts due to invalid JSON response: {je}. Falling back to default charts.")
+            st.session_state.chart_plans = engine.fallback_plans(dataset, num_charts, "API error")
+            st.session_state.insights = [plan["insight"] for plan in st.session_state.chart_plans]
+        except llm_client.RETRYABLE as re:
+            if plans:
+                st.warning(f"⚠️ The recommendation stream was interrupted after {len(plans)} charts: {re}")
+                st.session_state.data_hash = ingest.key
+                st.session_state.chart_count = num_charts
+            else:
+                st.error(f"❌ AI chart recommendation failed after {llm_client.MAX_RETRIES} attempts: {re}. Check your internet connection, API key, or OpenAI status.")
+                st.session_state.chart_plans = engine.fallback_plans(dataset, num_charts, "API error")
+                st.session_state.insights = [plan["insight"] for plan in st.session_state.chart_plans]
+        except Exception as e:
+            st.error(f"❌ Unexpected error during chart generation: {e}")
+            # with open("error_log.txt", "a") as f:
+            #     f.write(f"{datetime.datetime.now()} | Error: {e}\n")
+            if not plans:
+                st.session_state.chart_plans = engine.fallback_plans(dataset, num_charts, "error")
+                st.session_state.insights = [plan["insight"] for plan in st.session_state.chart_plans]
+        status.empty()
+
+    chart_plans = st.session_state.chart_plans
+    insights = st.session_state.insights
+    for idx, plan in enumerate(chart_plans):
+        if idx not in rendered_charts:
+            render_chart(idx, plan)
+
+    if insight_jobs:
+        # Fill each chart's insight in as its request finishes, then rerun so the reports pick them up
+        with st.spinner(f"🤖 Regenerating {len(insight_jobs)} insights..."):
+            jobs = {idx: request for idx, (_, request) in insight_jobs.items()}
+            for idx, insight, error in llm_client.run_all(jobs):
+                if error is not None:
+                    st.warning(f"⚠️ Insight regeneration for Chart {idx+1} failed: {error}. Keeping previous insight.")
+                    continue
+                insights[idx] = insight
+                llm_cache.put_insight(insight_jobs[idx][0], insight)
+                render_insight(insight_slots[idx], insight)
+        st.session_state.insights = insights
+    page["regenerate_all"] = False
+
+    for idx in list(png_jobs):
+        if idx >= len(chart_plans):
+            del png_jobs[idx]
+        elif idx in png_slots:
+            fill_png(idx)
+    page["full_run"] = False
+
+    @st.experimental_fragment
+    def render_report():
+        # Reports are only assembled on request, from the cached PNGs
+        report_items = [(png_jobs[idx][0], png_jobs[idx][1], insights[idx]) for idx in sorted(png_jobs)]
+        if not report_items:
+            return
+        report = export.get_report(export.report_key(report_items))
+        # A failed job stays shared across sessions, so the button also offers a retry
+        if (report is None or report.error is not None) and st.button("📑 Prepare PPT & PDF Report", key="prepare_report"):
+            report = export.start_report(report_items)
+        if report is not None:
+            if not report.done:
+                progress = st.progress(0.0, text="📑 Assembling report...")
+                while not report.done:
+                    progress.progress(report.progress, text="📑 Assembling report...")
+                    time.sleep(0.2)
+                progress.empty()
+            if report.error is not None:
+                st.error(f"❌ Report generation failed: {report.error}")
+            else:
+                st.download_button("📊 Download Full Report as PPT", data=report.ppt, file_name="Aarekha_Charts_Report.pptx", mime="application/vnd.openxmlformats-officedocument.presentationml.presentation", key="dl_report_ppt")
+                st.download_button("📄 Download Full Report as PDF", data=report.pdf, file_name="Aarekha_Charts_Report.pdf", mime="application/pdf", key="dl_report_pdf")
+
+    render_report()
 
 # --- Unified Email + Feedback Section ---
+# Started on every page load so rows queued before a restart are delivered too
+feedback_sink.start_worker(feedback_destination())
 st.markdown("<h2 style='color: #1e40af; margin-bottom: 10px;'>📬 Please Share Feedback</h2>", unsafe_allow_html=True)
 with st.form("email_feedback_form"):
     email = st.text_input("📧 Enter your email (required to use the app):", key="user_email")
@@ -545,3 +492,24 @@ with st.form("email_feedback_form"):
             #     f.write(f"{datetime.datetime.now()} | Session ID: {st.session_state.user_id} | Email: {email} | Charts Generated: {st.session_state.get('chart_count', 'N/A')} | Feedback: {feedback}\n")
         else:
             st.warning("⚠️ Please enter your email to continue.")
+
+# --- Performance Debug Panel ---
+if st.sidebar.checkbox("🛠 Show performance debug panel", key="debug_panel"):
+    with st.expander("🛠 Slowest stages in this rerun", expanded=True):
+        slowest = rerun_trace.slowest()
+        if slowest:
+            st.dataframe(
+                [{"stage": s.name, "ms": round(s.duration * 1000, 1), "details": ", ".join(f"{k}={v}" for k, v in s.attrs.items()), "peak RSS (MB)": s.peak_rss_mb} for s in slowest],
+                use_container_width=True
+            )
+        st.caption(f"Peak memory: {rerun_trace.peak_rss_mb} MB · {len(rerun_trace.spans)} spans · metrics in {telemetry.METRICS_FILE}")
+    with st.expander("🗄 Shared cache"):
+        cache_stats = shared_cache.stats()
+        st.dataframe(
+            [{"cache": name, "hit rate": row["hit_rate"], "hits": row["hits"], "misses": row["misses"], "entries": row["entries"],
+              "resident (MB)": round(row["resident_bytes"] / 2**20, 1), "spilled (MB)": round(row["spilled_bytes"] / 2**20, 1)}
+             for name, row in cache_stats["regions"].items()],
+            use_container_width=True
+        )
+        st.caption(f"{cache_stats['resident_bytes'] / 2**20:,.1f} of {cache_stats['budget_bytes'] / 2**20:,.0f} MB budget in memory · {cache_stats['spilled_bytes'] / 2**20:,.1f} MB spilled")
+telemetry.finish_trace(rerun_trace)
@@ -0,0 +1 @@
+"""Offline performance benchmarks for Aarekha (``python -m benchmarks.run``)."""
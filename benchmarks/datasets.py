@@ -0,0 +1,80 @@
+"""Synthetic datasets shaped like typical Aarekha uploads.
+
+Every dataset is generated from a seed, so the same variant and row count
+always produce the same bytes.
+"""
+import io
+from dataclasses import dataclass
+
+import numpy as np
+import pandas as pd
+
+REGIONS = ["North", "South", "East", "West", "Central"]
+WIDE_EXTRA_COLUMNS = 50
+LOW_CARDINALITY = 12
+HIGH_CARDINALITY = 50000
+
+
+@dataclass(frozen=True)
+class Variant:
+    name: str
+    wide: bool = False
+    high_cardinality: bool = False
+    numeric: bool = True
+    dates: bool = True
+
+
+VARIANTS = {
+    v.name: v for v in [
+        Variant("narrow"),
+        Variant("wide", wide=True),
+        Variant("high_card", high_cardinality=True),
+        Variant("no_numeric", numeric=False),
+        Variant("no_dates", dates=False),
+        Variant("categorical_only", numeric=False, dates=False),
+    ]
+}
+
+
+def _labels(prefix, codes, n_unique):
+    categories = [f"{prefix} {i:05d}" for i in range(n_unique)]
+    return pd.Categorical.from_codes(codes, categories=categories)
+
+
+def make_frame(rows, variant, seed=0):
+    rng = np.random.default_rng(seed)
+    n_categories = HIGH_CARDINALITY if variant.high_cardinality else LOW_CARDINALITY
+    n_categories = max(1, min(n_categories, rows))
+    data = {}
+    if variant.dates:
+        start = np.datetime64("2022-01-01")
+        data["Date"] = start + rng.integers(0, 3 * 365, rows).astype("timedelta64[D]")
+    data["Region"] = pd.Categorical.from_codes(rng.integers(0, len(REGIONS), rows), categories=REGIONS)
+    # Zipf-like skew so top-K grouping has something to do
+    weights = 1.0 / np.arange(1, n_categories + 1)
+    data["Category"] = _labels("Category", rng.choice(n_categories, rows, p=weights / weights.sum()), n_categories)
+    data["Product"] = _labels("Product", rng.integers(0, max(1, min(n_categories * 4, rows)), rows), max(1, min(n_categories * 4, rows)))
+    if variant.numeric:
+        data["Sales"] = np.round(rng.lognormal(4, 1, rows), 2)
+        data["Qty"] = rng.integers(1, 50, rows)
+    if variant.wide:
+        for i in range(WIDE_EXTRA_COLUMNS):
+            if variant.numeric and i % 2 == 0:
+                data[f"metric_{i:02d}"] = np.round(rng.normal(100, 25, rows), 3)
+            else:
+                data[f"attr_{i:02d}"] = _labels(f"v{i}", rng.integers(0, 8, rows), 8)
+    return pd.DataFrame(data)
+
+
+def make_csv(rows, variant, seed=0):
+    """Return ``(file name, CSV bytes)`` for a variant."""
+    buffer = io.BytesIO()
+    make_frame(rows, variant, seed).to_csv(buffer, index=False)
+    return f"{variant.name}_{rows}.csv", buffer.getvalue()
+
+
+def parse_rows(text):
+    """Parse ``1k``/``100k``/``10M`` style row counts."""
+    text = text.strip().lower()
+    scale = {"k": 1000, "m": 1000000}.get(text[-1:], 1)
+    return int(float(text.rstrip("km")) * scale)
@@ -0,0 +1,68 @@
+"""Offline stand-in for ``openai.ChatCompletion.create``.
+
+Answers chart-plan requests with a canned plan (streamed in small chunks when
+``stream=True``) and insight requests with a canned insight, after a
+configurable latency, so benchmarks need neither network nor an API key.
+"""
+import json
+import time
+import types
+
+import openai
+
+INSIGHT = "- **Key Observation:** Benchmark insight.\n- **Business Impact:** None.\n- **Recommended Action:** None."
+CHUNK_CHARS = 40
+
+
+class FakeChatCompletion:
+    def __init__(self, plans=None, latency=0.0, chunk_latency=0.0):
+        self.plans = plans or []
+        self.latency = latency
+        self.chunk_latency = chunk_latency
+        self.calls = 0
+
+    def _message(self, content):
+        message = types.SimpleNamespace(content=content)
+        return types.SimpleNamespace(choices=[types.SimpleNamespace(message=message)], usage=None)
+
+    def _chunks(self, text):
+        for i in range(0, len(text), CHUNK_CHARS):
+            if self.chunk_latency:
+                time.sleep(self.chunk_latency)
+            yield {"choices": [{"delta": {"content": text[i:i + CHUNK_CHARS]}}]}
+
+    def create(self, messages, stream=False, **kwargs):
+        self.calls += 1
+        if self.latency:
+            time.sleep(self.latency)
+        if "chart config" in messages[-1]["content"]:
+            return self._message(json.dumps({"insight": INSIGHT}))
+        text = json.dumps(self.plans)
+        return self._chunks(text) if stream else self._message(text)
+
+
+def install(plans=None, latency=0.0, chunk_latency=0.0):
+    """Patch ``openai.ChatCompletion.create`` and return the fake."""
+    fake = FakeChatCompletion(plans, latency, chunk_latency)
+    openai.api_key = "benchmark"
+    openai.ChatCompletion.create = fake.create
+    return fake
+
+
+def canned_plans(columns, numeric_columns, chart_types):
+    """One plan per chart type over the given columns."""
+    x_default = "Category" if "Category" in columns else columns[0]
+    y_numeric = numeric_columns[0] if numeric_columns else "Order Count"
+    plans = []
+    for chart_type in chart_types:
+        x, y = x_default, y_numeric
+        if chart_type in ("Line", "Area") and "Date" in columns:
+            x = "Date"
+        elif chart_type in ("Scatter", "Bubble") and len(numeric_columns) > 1:
+            x = numeric_columns[1]
+        elif chart_type == "Histogram":
+            x, y = y_numeric if numeric_columns else x_default, None
+        elif chart_type in ("Heatmap", "Stacked Bar"):
+            x, y = "Region" if "Region" in columns else x_default, x_default
+        plans.append({"chart_type": chart_type, "x": x, "y": y, "insight": INSIGHT})
+    return plans
@@ -0,0 +1,228 @@
+"""Aarekha performance benchmarks.
+
+    python -m benchmarks.run                       # 1k..1M rows, all variants at 100k
+    python -m benchmarks.run --sizes 1k,10k,100k,1M,10M --check
+    python -m benchmarks.run --baseline benchmarks/results/latest.json --check
+
+Runs offline: LLM calls go to ``benchmarks.fake_openai`` and every cache
+lives in a throwaway directory. Each stage is timed ``--repeat`` times and
+the median is written to a JSON results file together with the limit it was
+checked against (``thresholds.json``, or ``--baseline`` results plus
+``--tolerance``). With ``--check`` the exit status is 1 when any stage is
+over its limit.
+"""
+import argparse
+import datetime
+import fnmatch
+import json
+import os
+import platform
+import resource
+import shutil
+import statistics
+import sys
+import tempfile
+import time
+
+from benchmarks import fake_openai
+from benchmarks.datasets import REGIONS, VARIANTS, make_csv, parse_rows
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+DEFAULT_THRESHOLDS = os.path.join(HERE, "thresholds.json")
+DEFAULT_OUT = os.path.join(HERE, "results", "latest.json")
+# Timings below this are noise for baseline comparisons.
+MIN_SLACK_S = 0.02
+
+
+def measure(fn, repeat, setup=None):
+    """Median wall-clock seconds of ``fn()`` over ``repeat`` runs, and its last result."""
+    times = []
+    result = None
+    for _ in range(repeat):
+        if setup:
+            setup()
+        started = time.perf_counter()
+        result = fn()
+        times.append(time.perf_counter() - started)
+    return statistics.median(times), result
+
+
+def peak_rss_mb():
+    # ru_maxrss is KiB on Linux
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def warm_up():
+    """Pay one-off costs (Plotly template loading, kaleido's browser start) before timing."""
+    import plotly.express as px
+
+    from aarekha import export
+    export.rasterize(px.bar(x=["a"], y=[1]))
+
+
+def bench_dataset(variant, rows, args, record):
+    # Imported late so AAREKHA_CACHE_DIR (set in main) is picked up
+    from aarekha import charts, engine, export, ingest, llm_cache, profiling
+    from aarekha.filters import FilterEngine
+
+    name, data = make_csv(rows, variant)
+    key = ingest.content_hash(data)
+
+    def forget_memory():
+        ingest._datasets.clear()
+        ingest._dataset_meta.clear()
+
+    def forget_all():
+        forget_memory()
+        for suffix in (".parquet", ".json"):
+            path = os.path.join(ingest.DATASET_DIR, key + suffix)
+            if os.path.exists(path):
+                os.remove(path)
+
+    t, _ = measure(lambda: engine.open_dataset(name, data), args.repeat, forget_all)
+    record("ingest_cold", t)
+    t, _ = measure(lambda: engine.open_dataset(name, data), args.repeat, forget_memory)
+    record("ingest_disk", t)
+    t, dataset = measure(lambda: engine.open_dataset(name, data), args.repeat)
+    record("ingest_memory", t)
+    t, _ = measure(lambda: profiling.build_profile(dataset.df, None), args.repeat)
+    record("profile", t)
+
+    fake = fake_openai.install(
+        fake_openai.canned_plans(list(dataset.df.columns), dataset.profile.numeric_columns, charts.chart_types()),
+        latency=args.llm_latency,
+    )
+    t, (plans, _, _) = measure(lambda: engine.plan_charts(dataset, len(charts.chart_types())), args.repeat, llm_cache.clear)
+    record("plan", t)
+    fake.plans = []
+
+    df = dataset.df
+    top_categories = df["Category"].value_counts().index[: max(1, df["Category"].nunique() // 2)].tolist()
+    selection = {"Region": REGIONS[:3], "Category": top_categories}
+    t, _ = measure(lambda: FilterEngine(df, key).combine(selection), args.repeat)
+    record("filter_global_cold", t)
+    filters = dataset.filters
+    t, global_mask = measure(lambda: filters.combine(selection), args.repeat)
+    record("filter_global_warm", t)
+    products = df["Product"].unique().tolist()[::2]
+    t, _ = measure(lambda: filters.apply(filters.combine({"Product": products}, base=global_mask), ["Category", "Region"]), args.repeat)
+    record("filter_chart", t)
+
+    figures = []
+    for plan in plans:
+        chart_type, x_axis, y_axis = engine.resolve_plan(dataset, plan)
+        spec = charts.ChartSpec(chart_type, x_axis, y_axis, version=key)
+        chart_df = dataset.filters.apply(None, spec.columns)
+        t, (fig, _) = measure(lambda: charts.build_figure(spec, dataset, df=chart_df), args.repeat)
+        record(f"figure/{chart_type}", t)
+        figures.append((chart_type, fig))
+
+    if args.skip_png:
+        return
+
+    def forget_images():
+        export._images.clear()
+        shutil.rmtree(export.IMAGE_DIR, ignore_errors=True)
+
+    pngs = []
+    for chart_type, fig in figures:
+        t, png = measure(lambda: export.rasterize(fig), args.repeat, forget_images)
+        record(f"png/{chart_type}", t)
+        pngs.append((png, fake_openai.INSIGHT))
+    t, _ = measure(lambda: export.build_ppt(pngs), args.repeat)
+    record("ppt", t)
+    t, _ = measure(lambda: export.build_pdf(pngs), args.repeat)
+    record("pdf", t)
+
+
+def load_limits(args):
+    """Return ``(pattern limits, baseline seconds by name, tolerance)``."""
+    with open(args.thresholds) as f:
+        config = json.load(f)
+    tolerance = args.tolerance if args.tolerance is not None else config.get("tolerance", 0.25)
+    baseline = {}
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = {r["name"]: r["seconds"] for r in json.load(f)["results"]}
+    return config.get("limits", {}), baseline, tolerance
+
+
+def limit_for(name, limits, baseline, tolerance):
+    if name in baseline:
+        return baseline[name] * (1 + tolerance) + MIN_SLACK_S
+    for pattern, seconds in limits.items():
+        if fnmatch.fnmatchcase(name, pattern):
+            return seconds
+    return None
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m benchmarks.run", description=__doc__.split("\n\n")[0])
+    parser.add_argument("--sizes", default="1k,10k,100k,1M", help="row counts for the narrow variant (default: 1k,10k,100k,1M)")
+    parser.add_argument("--variants", default=",".join(VARIANTS), help="variants to run at --variant-rows")
+    parser.add_argument("--variant-rows", default="100k", help="row count for the non-narrow variants (default: 100k)")
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--llm-latency", type=float, default=0.0, help="seconds the fake OpenAI waits per call")
+    parser.add_argument("--skip-png", action="store_true", help="skip kaleido rasterization and PPT/PDF assembly")
+    parser.add_argument("--out", default=DEFAULT_OUT)
+    parser.add_argument("--thresholds", default=DEFAULT_THRESHOLDS)
+    parser.add_argument("--baseline", help="earlier results file; its timings become the limits")
+    parser.add_argument("--tolerance", type=float, default=None, help="allowed slowdown over --baseline (default from thresholds file)")
+    parser.add_argument("--check", action="store_true", help="exit 1 if any stage exceeds its limit")
+    args = parser.parse_args(argv)
+
+    cache_dir = tempfile.mkdtemp(prefix="aarekha-bench-")
+    os.environ["AAREKHA_CACHE_DIR"] = cache_dir
+    limits, baseline, tolerance = load_limits(args)
+    warm_up()
+
+    runs = [(VARIANTS["narrow"], parse_rows(size)) for size in args.sizes.split(",")]
+    variant_rows = parse_rows(args.variant_rows)
+    runs += [(VARIANTS[name], variant_rows) for name in args.variants.split(",") if name != "narrow"]
+
+    results = []
+    datasets = []
+    try:
+        for variant, rows in runs:
+            print(f"{variant.name} / {rows:,} rows", flush=True)
+
+            def record(stage, seconds):
+                name = f"{variant.name}/{rows}/{stage}"
+                limit = limit_for(name, limits, baseline, tolerance)
+                status = "ok" if limit is None or seconds <= limit else "slow"
+                results.append({
+                    "name": name, "variant": variant.name, "rows": rows, "stage": stage,
+                    "seconds": round(seconds, 6), "limit": limit and round(limit, 6), "status": status,
+                })
+                print(f"  {stage:<24} {seconds * 1000:10.1f} ms{'  SLOW' if status == 'slow' else ''}", flush=True)
+
+            bench_dataset(variant, rows, args, record)
+            # Process-wide high-water mark so far, so only growth is attributable to this dataset
+            datasets.append({"variant": variant.name, "rows": rows, "peak_rss_mb": round(peak_rss_mb(), 1)})
+        from aarekha import cache
+        cache_stats = cache.stats()
+    finally:
+        shutil.rmtree(cache_dir, ignore_errors=True)
+
+    report = {
+        "created": datetime.datetime.now().isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "repeat": args.repeat,
+        "llm_latency": args.llm_latency,
+        "tolerance": tolerance,
+        "baseline": args.baseline,
+        "datasets": datasets,
+        "results": results,
+        "cache": cache_stats,
+    }
+    os.makedirs(os.path.dirname(os.path.abspath(args.out)), exist_ok=True)
+    with open(args.out, "w") as f:
+        json.dump(report, f, indent=2)
+    slow = [r for r in results if r["status"] == "slow"]
+    print(f"{len(results)} measurements written to {args.out}; {len(slow)} over limit")
+    return 1 if args.check and slow else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
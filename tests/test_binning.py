@@ -0,0 +1,58 @@
+import numpy as np
+import pandas as pd
+
+from aarekha import binning
+
+
+def test_top_k_codes_folds_the_tail_into_other():
+    series = pd.Series(["a"] * 5 + ["b"] * 4 + ["c"] * 3 + ["d", "e"])
+    codes, labels = binning.top_k_codes(series, k=3)
+    assert labels == ["a", "b", binning.OTHER]
+    assert np.bincount(codes).tolist() == [5, 4, 5]
+
+
+def test_top_k_codes_sorts_labels_when_nothing_is_folded():
+    codes, labels = binning.top_k_codes(pd.Series([5, 3, 9, 1, None, 3]))
+    assert labels == [1, 3, 5, 9]
+    assert codes.tolist() == [2, 1, 3, 0, -1, 1]
+
+
+def test_top_k_codes_keeps_categorical_order():
+    series = pd.Series(pd.Categorical(["z", "a", "z"], categories=["z", "a"]))
+    assert binning.top_k_codes(series)[1] == ["z", "a"]
+
+
+def test_numeric_bin_codes_skips_missing_dates():
+    dates = pd.Series(pd.date_range("2024-01-01", periods=200, freq="D"))
+    dates[::9] = pd.NaT
+    codes, labels = binning.numeric_bin_codes(dates, 10)
+    assert (codes[dates.isna().to_numpy()] == -1).all()
+    assert (codes[dates.notna().to_numpy()] >= 0).all()
+    assert labels[0].startswith("2024-01-0")
+
+
+def test_count_pairs_over_a_high_cardinality_date_axis_with_nat():
+    n = 500
+    dates = pd.Series(pd.date_range("2024-01-01", periods=n, freq="D"))
+    dates[::7] = pd.NaT
+    regions = pd.Series(np.resize(["North", "South", "East"], n))
+    grid = binning.count_pairs(dates, regions, max_x=10)
+    assert grid.shape == (10, 3)
+    assert grid.to_numpy().sum() == dates.notna().sum()
+    assert list(grid.columns) == ["East", "North", "South"]
+
+
+def test_count_pairs_weights_match_raw_rows():
+    x = pd.Series(["a", "a", "b", "b", "b"])
+    y = pd.Series(["u", "v", "u", "u", "v"])
+    grouped = pd.DataFrame({"x": x, "y": y}).value_counts().reset_index()
+    raw = binning.count_pairs(x, y)
+    weighted = binning.count_pairs(grouped["x"], grouped["y"], weights=grouped["count"])
+    assert raw.equals(weighted)
+
+
+def test_top_k_sum_caps_x_labels():
+    df = pd.DataFrame({"x": list("aabbcd"), "y": [1.0, 2.0, 3.0, np.nan, 5.0, 6.0]})
+    result = binning.top_k_sum(df, "x", "y", k=3)
+    assert result["x"].tolist() == ["a", "b", binning.OTHER]
+    assert result["y"].tolist() == [3.0, 3.0, 11.0]
@@ -0,0 +1,131 @@
+import os
+
+import pandas as pd
+
+from aarekha.cache import CacheManager
+
+
+def _frame(n=10):
+    return pd.DataFrame({"a": range(n), "b": [f"row {i}" for i in range(n)]})
+
+
+def test_least_recently_used_entries_are_evicted_first(tmp_path):
+    manager = CacheManager(100, str(tmp_path))
+    region = manager.region("figures")
+    region.put("a", "A", size=40)
+    region.put("b", "B", size=40)
+    assert region.get("a") == "A"  # "b" is now the oldest
+    region.put("c", "C", size=40)
+    assert "b" not in region
+    assert region.get("a") == "A" and region.get("c") == "C"
+    assert region.counters.evictions == 1
+    assert manager.stats()["resident_bytes"] == 80
+
+
+def test_regions_share_one_budget(tmp_path):
+    manager = CacheManager(100, str(tmp_path))
+    images, figures = manager.region("images"), manager.region("figures")
+    images.put("img", b"x", size=60)
+    figures.put("fig", "f", size=60)
+    assert "img" not in images
+    assert images.counters.evictions == 1 and figures.counters.evictions == 0
+
+
+def test_an_entry_larger_than_the_budget_is_kept_until_the_next_put(tmp_path):
+    manager = CacheManager(100, str(tmp_path))
+    region = manager.region("figures")
+    region.put("big", "B", size=500)
+    assert region.get("big") == "B"
+    region.put("small", "s", size=10)
+    assert "big" not in region
+
+
+def test_evicted_frames_spill_to_arrow_and_reload(tmp_path):
+    manager = CacheManager(100, str(tmp_path))
+    datasets = manager.region("datasets", spill=True)
+    df = _frame()
+    datasets.put("first", df, size=80)
+    datasets.put("second", _frame(3), size=80)
+    assert datasets.counters.spills == 1
+    assert len(list(tmp_path.glob("datasets-*.arrow"))) == 1
+    stats = manager.stats()
+    assert stats["spilled_bytes"] == 80
+    assert stats["regions"]["datasets"]["spilled_entries"] == 1
+
+    reloaded = datasets.get("first")
+    pd.testing.assert_frame_equal(reloaded, df)
+    assert datasets.counters.spill_hits == 1 and datasets.counters.hits == 1
+    # Reloading it pushed "second" out to disk in turn
+    assert manager.stats()["regions"]["datasets"]["spilled_entries"] == 1
+
+
+def test_only_dataframes_spill(tmp_path):
+    manager = CacheManager(100, str(tmp_path))
+    region = manager.region("profiles", spill=True)
+    region.put("profile", {"rows": 10}, size=80)
+    region.put("frame", _frame(), size=80)
+    assert "profile" not in region
+    assert region.counters.spills == 0
+    assert list(tmp_path.iterdir()) == []
+
+
+def test_spill_budget_drops_the_oldest_spilled_entries(tmp_path):
+    manager = CacheManager(100, str(tmp_path), spill_budget_bytes=100)
+    region = manager.region("datasets", spill=True)
+    for key in "abc":
+        region.put(key, _frame(), size=80)
+    assert "a" not in region
+    assert "b" in region and "c" in region
+    assert manager.stats()["spilled_bytes"] == 80
+    assert len(list(tmp_path.glob("*.arrow"))) == 1
+
+
+def test_clear_and_pop_remove_spill_files(tmp_path):
+    manager = CacheManager(100, str(tmp_path))
+    region = manager.region("datasets", spill=True)
+    for key in "abc":
+        region.put(key, _frame(), size=80)
+    assert len(list(tmp_path.glob("*.arrow"))) == 2
+    region.pop("a")
+    assert len(list(tmp_path.glob("*.arrow"))) == 1
+    region.clear()
+    assert len(region) == 0
+    assert list(tmp_path.glob("*.arrow")) == []
+    assert manager.stats()["resident_bytes"] == 0 and manager.stats()["spilled_bytes"] == 0
+
+
+def test_an_unreadable_spill_file_is_a_miss(tmp_path):
+    manager = CacheManager(100, str(tmp_path))
+    region = manager.region("datasets", spill=True)
+    region.put("a", _frame(), size=80)
+    region.put("b", _frame(), size=80)
+    (path,) = tmp_path.glob("*.arrow")
+    os.remove(path)
+    assert region.get("a") is None
+    assert "a" not in region
+    assert region.counters.misses == 1
+
+
+def test_resize_recharges_an_entry_and_evicts_others(tmp_path):
+    manager = CacheManager(100, str(tmp_path))
+    region = manager.region("indexes")
+    region.put("a", {}, size=30)
+    region.put("b", {}, size=30)
+    region.resize("b", 90)
+    assert "a" not in region and "b" in region
+    assert manager.stats()["resident_bytes"] == 90
+
+
+def test_stats_reports_hit_rates_per_region(tmp_path):
+    manager = CacheManager(1000, str(tmp_path))
+    region = manager.region("figures")
+    manager.region("images")
+    region.put("a", "A", size=10)
+    region.get("a")
+    region.get("missing")
+    stats = manager.stats()
+    assert stats["budget_bytes"] == 1000
+    assert stats["regions"]["figures"]["hit_rate"] == 0.5
+    assert stats["regions"]["figures"]["entries"] == 1
+    assert stats["regions"]["figures"]["resident_bytes"] == 10
+    assert stats["regions"]["images"]["hit_rate"] is None
@@ -0,0 +1,55 @@
+from aarekha import feedback
+from aarekha.feedback import FakeSheet, FeedbackQueue, FeedbackWorker
+
+
+def _worker(tmp_path, sink, **kwargs):
+    queue = FeedbackQueue(str(tmp_path / "queue.sqlite"))
+    return FeedbackWorker(queue, lambda: sink, **kwargs)
+
+
+def test_rows_are_queued_before_anything_is_written(tmp_path):
+    sink = FakeSheet()
+    worker = _worker(tmp_path, sink)
+    worker.queue.put(["2024-01-01", "a@example.com", 5, "nice"])
+    assert len(worker.queue) == 1
+    assert sink.calls == 0
+    assert worker.flush_once() == 1
+    assert sink.rows == [["2024-01-01", "a@example.com", 5, "nice"]]
+    assert len(worker.queue) == 0
+
+
+def test_flush_sends_batches_in_order(tmp_path):
+    sink = FakeSheet()
+    worker = _worker(tmp_path, sink, batch_size=100)
+    for i in range(250):
+        worker.queue.put([i])
+    assert [worker.flush_once() for _ in range(4)] == [100, 100, 50, 0]
+    assert sink.calls == 3
+    assert sink.rows == [[i] for i in range(250)]
+
+
+def test_failed_batches_stay_queued_and_are_retried(tmp_path, monkeypatch):
+    monkeypatch.setattr(feedback, "BACKOFF_BASE", 0.01)
+    sink = FakeSheet(fail_times=2)
+    worker = _worker(tmp_path, sink, interval=0.01)
+    worker.queue.put(["row"])
+    worker.start()
+    try:
+        assert worker.flush(timeout=10)
+    finally:
+        worker.stop()
+    assert sink.calls == 3
+    assert sink.rows == [["row"]]
+    assert worker.failures == 0
+
+
+def test_rows_left_by_a_previous_process_are_drained_on_start(tmp_path):
+    path = str(tmp_path / "queue.sqlite")
+    FeedbackQueue(path).put(["queued before restart"])
+    sink = FakeSheet()
+    worker = FeedbackWorker(FeedbackQueue(path), lambda: sink, interval=0.01).start()
+    try:
+        assert worker.flush(timeout=10)
+    finally:
+        worker.stop()
+    assert sink.rows == [["queued before restart"]]
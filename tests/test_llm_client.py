@@ -0,0 +1,105 @@
+import json
+
+import pytest
+
+from aarekha import llm_client
+from aarekha.llm_client import JsonArrayParser
+
+
+def _feed_in_pieces(text, size):
+    parser = JsonArrayParser()
+    items = []
+    for i in range(0, len(text), size):
+        items.extend(parser.feed(text[i:i + size]))
+    return parser, items
+
+
+PLANS = [
+    {"chart_type": "Bar", "x": "Region", "y": "Sales", "insight": "- **Key Observation:** {braces} and \"quotes\"\n- done"},
+    {"chart_type": "Pie", "x": "Category", "y": None, "insight": "back\\slash ]"},
+]
+
+
+@pytest.mark.parametrize("size", [1, 7, 10_000])
+def test_parser_yields_each_object_once_it_is_complete(size):
+    parser, items = _feed_in_pieces(json.dumps(PLANS), size)
+    assert items == PLANS
+    assert parser.errors == []
+
+
+def test_parser_ignores_text_before_the_array():
+    text = "```json\n" + json.dumps(PLANS) + "\n```"
+    assert _feed_in_pieces(text, 5)[1] == PLANS
+
+
+def test_parser_returns_an_object_as_soon_as_it_closes():
+    parser = JsonArrayParser()
+    text = json.dumps(PLANS)
+    first_end = text.index("}, {") + 1
+    assert parser.feed(text[:first_end]) == [PLANS[0]]
+    assert parser.feed(text[first_end:]) == [PLANS[1]]
+
+
+def test_parser_skips_malformed_elements():
+    parser, items = _feed_in_pieces('[{"a": 1}, {"b": oops}, {"c": 3}]', 4)
+    assert items == [{"a": 1}, {"c": 3}]
+    assert len(parser.errors) == 1
+
+
+def test_parser_accepts_raw_control_characters_in_strings():
+    parser, items = _feed_in_pieces('[{"insight": "line one\nline\ttwo"}]', 3)
+    assert items == [{"insight": "line one\nline two"}]
+
+
+def _fake_stream(monkeypatch, responses):
+    """Each call to the API streams the next text in ``responses`` (or raises it)."""
+    calls = []
+
+    def create(**kwargs):
+        calls.append(kwargs)
+        response = responses[len(calls) - 1]
+        if isinstance(response, Exception):
+            raise response
+        return iter([{"choices": [{"delta": {"content": response[i:i + 6]}}]} for i in range(0, len(response), 6)])
+
+    monkeypatch.setattr(llm_client.openai.ChatCompletion, "create", create)
+    monkeypatch.setattr(llm_client, "record_usage", lambda *args: {"latency_s": 0.0, "completion_tokens": 0})
+    monkeypatch.setattr(llm_client, "backoff_delay", lambda attempt: 0.0)
+    return calls
+
+
+def test_stream_json_array_retries_a_response_without_objects(monkeypatch):
+    calls = _fake_stream(monkeypatch, ["no json here", json.dumps(PLANS)])
+    items = list(llm_client.stream_json_array([], 0.0, 10))
+    assert items == PLANS
+    assert len(calls) == 2
+
+
+def test_stream_json_array_reports_skipped_elements_and_usage(monkeypatch):
+    _fake_stream(monkeypatch, ['[{"a": 1}, {"b": ?}]'])
+    skipped, usage = [], []
+    items = list(llm_client.stream_json_array([], 0.0, 10, on_skip=skipped.append, on_usage=usage.append))
+    assert items == [{"a": 1}]
+    assert len(skipped) == 1
+    assert len(usage) == 1
+
+
+def test_stream_json_array_does_not_retry_after_yielding(monkeypatch):
+    error = llm_client.openai_error.APIConnectionError("dropped")
+    calls = _fake_stream(monkeypatch, [error])
+
+    def broken(**kwargs):
+        calls.append(kwargs)
+
+        def chunks():
+            yield {"choices": [{"delta": {"content": '[{"a": 1},'}}]}
+            raise error
+        return chunks()
+
+    monkeypatch.setattr(llm_client.openai.ChatCompletion, "create", broken)
+    received = []
+    with pytest.raises(llm_client.openai_error.APIConnectionError):
+        for item in llm_client.stream_json_array([], 0.0, 10):
+            received.append(item)
+    assert received == [{"a": 1}]
+    assert len(calls) == 1
@@ -0,0 +1,119 @@
+import numpy as np
+import pandas as pd
+
+from aarekha import lod
+
+
+def _sales(n=1000):
+    rng = np.random.default_rng(0)
+    return pd.DataFrame({
+        "Date": pd.date_range("2024-01-01", periods=n, freq="h"),
+        "Region": np.resize(["North", "South", "East"], n),
+        "Sales": rng.normal(100, 20, n),
+    })
+
+
+def test_aggregate_sums_per_x_in_order():
+    df = pd.DataFrame({"x": ["b", "a", "b"], "y": [1.0, 2.0, 3.0]})
+    result = lod.aggregate(df, "x", "y")
+    assert result.to_dict("list") == {"x": ["a", "b"], "y": [2.0, 4.0]}
+
+
+def test_aggregate_renames_y_when_it_is_also_x():
+    df = pd.DataFrame({"Sales": [1.0, 1.0, 2.0]})
+    result = lod.aggregate(df, "Sales", "Sales", how="count")
+    assert list(result.columns) == ["Sales", "Sales (value)"]
+    assert result["Sales (value)"].tolist() == [2, 1]
+
+
+def test_lttb_keeps_the_end_points_and_the_output_size():
+    df = _sales()
+    reduced = lod.lttb(df, "Date", "Sales", 100)
+    assert len(reduced) == 100
+    assert reduced.index[0] == 0 and reduced.index[-1] == len(df) - 1
+    assert reduced["Date"].is_monotonic_increasing
+
+
+def test_lttb_keeps_the_peak():
+    df = pd.DataFrame({"x": np.arange(1000), "y": np.zeros(1000)})
+    df.loc[537, "y"] = 50.0
+    assert 537 in lod.lttb(df, "x", "y", 20).index
+
+
+def test_series_points_is_bounded_and_skips_missing_values():
+    df = _sales(20_000)
+    df.loc[::5, "Sales"] = np.nan
+    points = lod.series_points(df, "Date", "Sales", max_points=500)
+    assert len(points) == 500
+    assert points["Sales"].notna().all()
+
+
+def test_series_points_with_y_as_x():
+    df = pd.DataFrame({"Sales": np.arange(10_000) % 700})
+    points = lod.series_points(df, "Sales", "Sales", max_points=100)
+    assert list(points.columns) == ["Sales", "Sales (value)"]
+    assert len(points) == 100
+
+
+def test_box_stats_match_quantiles():
+    df = _sales()
+    stats = lod.box_stats(df, "Region", "Sales").set_index("Region")
+    north = df.loc[df["Region"] == "North", "Sales"]
+    assert np.isclose(stats.loc["North", "median"], north.median())
+    assert np.isclose(stats.loc["North", "q1"], north.quantile(0.25))
+    assert stats.loc["North", "lowerfence"] >= north.min()
+    assert stats.loc["North", "upperfence"] <= north.max()
+
+
+def test_box_stats_with_y_as_x():
+    df = pd.DataFrame({"Sales": [1.0, 1.0, 2.0, None]})
+    stats = lod.box_stats(df, "Sales", "Sales")
+    assert stats["Sales"].tolist() == [1.0, 2.0]
+    assert stats["median"].tolist() == [1.0, 2.0]
+
+
+def test_density_grid_counts_every_row():
+    df = _sales(10_000)
+    df.loc[::10, "Sales"] = np.nan
+    x_centers, y_centers, counts = lod.density_grid(df, "Date", "Sales", max_points=400)
+    assert counts.shape == (20, 20)
+    assert counts.sum() == df["Sales"].notna().sum()
+    assert isinstance(x_centers, pd.DatetimeIndex)
+
+
+def test_density_grid_with_y_as_x():
+    df = pd.DataFrame({"Sales": np.arange(100, dtype=float)})
+    _, _, counts = lod.density_grid(df, "Sales", "Sales", max_points=100)
+    assert counts.sum() == 100
+    # Every point lies on the diagonal
+    assert counts.trace() == 100
+
+
+def test_sample_rows_is_bounded_and_ordered():
+    df = _sales(20_000)
+    sample = lod.sample_rows(df, 1000)
+    assert len(sample) == 1000
+    assert sample.index.is_monotonic_increasing
+    assert len(lod.sample_rows(df.head(10), 1000)) == 10
+
+
+def test_histogram_counts_caps_bins():
+    counts, width = lod.histogram_counts(pd.Series(np.arange(100_000, dtype=float), name="v"), max_bins=50)
+    assert len(counts) <= 50
+    assert counts["count"].sum() == 100_000
+    assert width > 0
+
+
+def test_histogram_counts_skips_missing_dates():
+    dates = pd.Series(pd.date_range("2024-01-01", periods=300, freq="D"), name="Date")
+    dates[::4] = pd.NaT
+    counts, width = lod.histogram_counts(dates)
+    assert counts["count"].sum() == dates.notna().sum()
+    assert counts["Date"].min() >= pd.Timestamp("2024-01-01")
+    assert width > 0
+
+
+def test_histogram_counts_per_value_for_categories():
+    counts, width = lod.histogram_counts(pd.Series(["a", "b", "a", None], name="c"))
+    assert dict(zip(counts["c"], counts["count"])) == {"a": 2, "b": 1}
+    assert width is None